@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XServer GAME 自动续期脚本 - 本地基准测试
+
+所有基准测试都针对 mock_panel.py 启动的本地模拟面板运行，不访问真实服务。
+
+用法:
+    python benchmark.py fleet --accounts 24 --workers 1 2 4 --contexts 3
+    python benchmark.py browser --profiles full lean --rounds 5
+    python benchmark.py stealth --modes off page bundled --rounds 10
+    python benchmark.py queue --accounts 24 --nodes 1 2 4 --contexts 2
+"""
+
+# =====================================================================
+#                          导入依赖
+# =====================================================================
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from mock_panel import start_mock_panel, mock_cloud_mail_config
+
+# =====================================================================
+#                          环境准备
+# =====================================================================
+
+
+def prepare_environment(base_url, delay_scale):
+    """在导入 main 之前设置环境变量（main 在导入时读取配置）"""
+    os.environ.update({
+        "XSERVER_BASE_URL": base_url,
+        "CLOUD_MAIL": json.dumps(mock_cloud_mail_config(base_url), ensure_ascii=False),
+        "XSERVER_EMAIL": "bench@mock.local",
+        "XSERVER_PASSWORD": "bench",
+        "USE_HEADLESS": "true",
+        "DELAY_SCALE": str(delay_scale),
+    })
+    # 截图和报告写入临时目录
+    work_dir = tempfile.mkdtemp(prefix="xserver-bench-")
+    os.chdir(work_dir)
+    os.environ["REPORT_DIR"] = work_dir
+    return work_dir
+
+
+# =====================================================================
+#                          基准测试
+# =====================================================================
+
+
+def bench_fleet(args):
+    """多账号分片运行：比较不同工作进程数下的吞吐"""
+    server, base_url, state = start_mock_panel(
+        remaining_hours=args.remaining_hours,
+        require_2fa=args.require_2fa,
+        fixed_remaining=True,
+        latency_ms=args.latency_ms,
+        servers=args.servers,
+    )
+    prepare_environment(base_url, args.delay_scale)
+    os.environ.update({
+        "RATE_LIMIT_LOGIN": f"{args.login_rate}:1",
+        "RATE_LIMIT_2FA_SEND": "0",
+        "RATE_LIMIT_CLOUDMAIL": "0",
+        "LOGIN_STAGGER_WINDOW": str(args.stagger_window),
+    })
+
+    import main
+
+    accounts = [
+        {"email": f"user{i:03d}@mock.local", "password": "bench",
+         "cloud_mail": {"TO_EMAIL": f"user{i:03d}@mock.local"}}
+        for i in range(args.accounts)
+    ]
+
+    rows = []
+    for workers in args.workers:
+        _, summary = main.run_fleet(accounts, workers=workers, contexts=args.contexts)
+        rows.append((workers, summary))
+
+    print()
+    print(f"📊 多账号基准（{args.accounts} 个账号，每进程 {args.contexts} 个上下文）:")
+    print(f"{'进程数':>6} {'耗时(秒)':>10} {'吞吐(个/分钟)':>14} {'完成':>6}")
+    for workers, summary in rows:
+        print(f"{workers:>6} {summary['elapsed']:>10} {summary['throughput_per_min']:>14} {summary['completed']:>6}")
+    server.shutdown()
+
+
+def bench_queue(args):
+    """多节点工作队列：比较不同节点数下的吞吐（每个节点一个进程，共享同一个SQLite队列）"""
+    server, base_url, state = start_mock_panel(
+        remaining_hours=args.remaining_hours,
+        require_2fa=args.require_2fa,
+        fixed_remaining=True,
+        latency_ms=args.latency_ms,
+        servers=args.servers,
+    )
+    work_dir = prepare_environment(base_url, args.delay_scale)
+    accounts = [
+        {"email": f"user{i:03d}@mock.local", "password": "bench",
+         "cloud_mail": {"TO_EMAIL": f"user{i:03d}@mock.local"}}
+        for i in range(args.accounts)
+    ]
+    os.environ.update({
+        "ACCOUNTS": json.dumps(accounts),
+        "RATE_LIMIT_LOGIN": "0",
+        "RATE_LIMIT_2FA_SEND": "0",
+        "RATE_LIMIT_CLOUDMAIL": "0",
+        "QUEUE_POLL_SECONDS": "0.5",
+    })
+
+    import main
+
+    spawn = multiprocessing.get_context("spawn")
+    rows = []
+    for nodes in args.nodes:
+        db_path = os.path.join(work_dir, f"queue-{nodes}.db")
+        main.WorkQueue(db_path).enqueue(main.queue_jobs(accounts), f"bench-{nodes}")
+        start = time.perf_counter()
+        processes = [spawn.Process(target=main.queue_node, args=(db_path, f"node{i}", args.contexts))
+                     for i in range(nodes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        rows.append((nodes, elapsed, main.WorkQueue(db_path).counts()))
+
+    print()
+    print(f"📊 工作队列基准（{args.accounts} 个账号，每节点 {args.contexts} 个上下文）:")
+    print(f"{'节点数':>6} {'耗时(秒)':>10} {'吞吐(个/分钟)':>14} {'加速比':>7} {'完成':>6} {'失败':>6}")
+    base_rate = None
+    for nodes, elapsed, counts in rows:
+        rate = counts["done"] / elapsed * 60
+        base_rate = base_rate or rate
+        print(f"{nodes:>6} {elapsed:>10.1f} {rate:>14.1f} {rate / base_rate if base_rate else 0:>7.2f} "
+              f"{counts['done']:>6} {counts['failed']:>6}")
+    server.shutdown()
+
+
+def descendant_pids(root_pid):
+    """返回 root_pid 及其所有子孙进程的 PID（依赖 Linux 的 /proc）"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def process_tree_rss(root_pid):
+    """统计 root_pid 及其所有子孙进程的常驻内存（MB，依赖 Linux 的 /proc）"""
+    total_kb = 0
+    for pid in descendant_pids(root_pid):
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+async def measure_launch(main, profile, url):
+    """启动一次浏览器并打开页面，返回 (启动耗时, 首页加载耗时, 浏览器进程树内存增量MB)"""
+    from playwright.async_api import async_playwright
+    
+    playwright = await async_playwright().start()
+    baseline = process_tree_rss(os.getpid())
+    try:
+        start = time.perf_counter()
+        browser = await playwright.chromium.launch(**main.launch_options(profile))
+        launched = time.perf_counter()
+        context = await browser.new_context(**{**main.DEFAULT_FINGERPRINT, **main.context_overrides(profile)})
+        page = await context.new_page()
+        await page.goto(url, wait_until="load")
+        loaded = time.perf_counter()
+        rss = process_tree_rss(os.getpid()) - baseline
+        await browser.close()
+    finally:
+        await playwright.stop()
+    return launched - start, loaded - launched, rss
+
+
+def bench_browser(args):
+    """浏览器启动配置：比较各配置的启动耗时和内存占用"""
+    server, base_url, state = start_mock_panel(latency_ms=args.latency_ms)
+    prepare_environment(base_url, args.delay_scale)
+    
+    import main
+    
+    rows = []
+    for profile in args.profiles:
+        samples = [asyncio.run(measure_launch(main, profile, main.TARGET_URL)) for _ in range(args.rounds)]
+        launch, load, rss = (statistics.median(values) for values in zip(*samples))
+        rows.append((profile, launch, load, rss))
+    
+    print()
+    print(f"📊 浏览器启动配置基准（每个配置 {args.rounds} 轮，取中位数）:")
+    print(f"{'配置':>6} {'启动(毫秒)':>10} {'首页(毫秒)':>10} {'内存(MB)':>9}")
+    for profile, launch, load, rss in rows:
+        print(f"{profile:>6} {launch * 1000:>10.0f} {load * 1000:>10.0f} {rss:>9.1f}")
+    server.shutdown()
+
+
+async def measure_stealth(main, modes, rounds, url):
+    """同一浏览器内比较各 stealth 模式：上下文创建+脚本注册耗时、首次导航耗时"""
+    from playwright.async_api import async_playwright
+    
+    samples = {mode: [] for mode in modes}
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(**main.launch_options())
+        try:
+            for _ in range(rounds):
+                for mode in modes:
+                    start = time.perf_counter()
+                    context = await browser.new_context(**main.DEFAULT_FINGERPRINT)
+                    if mode != "page":
+                        await main.apply_stealth(context, None, mode)
+                    page = await context.new_page()
+                    if mode == "page":
+                        await main.apply_stealth(context, page, mode)
+                    ready = time.perf_counter()
+                    await page.goto(url, wait_until="load")
+                    loaded = time.perf_counter()
+                    await context.close()
+                    samples[mode].append((ready - start, loaded - ready))
+        finally:
+            await browser.close()
+    return samples
+
+
+def bench_stealth(args):
+    """stealth 注入方式：比较上下文准备和首次导航的延迟"""
+    server, base_url, state = start_mock_panel(latency_ms=args.latency_ms)
+    prepare_environment(base_url, args.delay_scale)
+    
+    import main
+    
+    main.stealth_bundle()  # 预先构建（与运行时相同，只构建一次）
+    samples = asyncio.run(measure_stealth(main, args.modes, args.rounds, main.TARGET_URL))
+    
+    print()
+    print(f"📊 stealth 注入基准（每种模式 {args.rounds} 轮，取中位数，脚本版本 {main.stealth_bundle()[0]}）:")
+    print(f"{'模式':>8} {'上下文准备(毫秒)':>16} {'首次导航(毫秒)':>14}")
+    for mode, values in samples.items():
+        ready, load = (statistics.median(v) for v in zip(*values))
+        print(f"{mode:>8} {ready * 1000:>16.1f} {load * 1000:>14.1f}")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XServer GAME 自动续期脚本本地基准测试")
+    parser.add_argument("--delay-scale", type=float, default=0.05, help="固定等待的缩放系数")
+    parser.add_argument("--latency-ms", type=int, default=0, help="模拟面板的响应延迟")
+    parser.add_argument("--remaining-hours", type=float, default=20.0)
+    parser.add_argument("--require-2fa", action="store_true")
+    parser.add_argument("--servers", type=int, default=1, help="每个账号下的游戏服务器数")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fleet = subparsers.add_parser("fleet", help="多账号分片运行吞吐")
+    fleet.add_argument("--accounts", type=int, default=24)
+    fleet.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    fleet.add_argument("--contexts", type=int, default=3)
+    fleet.add_argument("--login-rate", type=float, default=0, help="全局登录速率（次/分钟，0为不限速）")
+    fleet.add_argument("--stagger-window", type=float, default=0, help="启动错峰窗口（秒）")
+    fleet.set_defaults(func=bench_fleet)
+    
+    browser = subparsers.add_parser("browser", help="浏览器启动配置的启动耗时和内存")
+    browser.add_argument("--profiles", nargs="+", default=["full", "lean"])
+    browser.add_argument("--rounds", type=int, default=5)
+    browser.set_defaults(func=bench_browser)
+    
+    stealth = subparsers.add_parser("stealth", help="stealth 注入方式的上下文准备和首次导航延迟")
+    stealth.add_argument("--modes", nargs="+", default=["off", "page", "bundled"])
+    stealth.add_argument("--rounds", type=int, default=10)
+    stealth.set_defaults(func=bench_stealth)
+
+    queue = subparsers.add_parser("queue", help="多节点工作队列的吞吐随节点数的变化")
+    queue.add_argument("--accounts", type=int, default=24)
+    queue.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 4])
+    queue.add_argument("--contexts", type=int, default=2)
+    queue.set_defaults(func=bench_queue)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
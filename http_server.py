@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XServer GAME 自动续期脚本 - 轻量HTTP服务
+
+运行在当前事件循环中的最小HTTP服务，以及基于它的验证码推送接收器；
+状态查询接口也注册在同一种服务上。
+"""
+
+# =====================================================================
+#                          导入依赖
+# =====================================================================
+
+import asyncio
+import json
+import os
+import time
+import urllib.parse
+
+# =====================================================================
+#                          配置区域
+# =====================================================================
+
+CODE_WEBHOOK_PORT = int(os.getenv("CODE_WEBHOOK_PORT", "0"))           # 验证码推送接收端口（0为关闭，只轮询）
+CODE_WEBHOOK_HOST = os.getenv("CODE_WEBHOOK_HOST", "127.0.0.1")         # 默认只监听本机；需要外部推送时显式设为 0.0.0.0
+CODE_WEBHOOK_PATH = os.getenv("CODE_WEBHOOK_PATH", "/hooks/cloudmail")
+CODE_WEBHOOK_TOKEN = os.getenv("CODE_WEBHOOK_TOKEN")                   # 推送方需携带的共享密钥（必填）
+CODE_WEBHOOK_TIMEOUT = float(os.getenv("CODE_WEBHOOK_TIMEOUT", "60"))  # 等待推送的秒数，超时后回退到轮询
+HTTP_MAX_BODY = 1024 * 1024  # 请求体大小上限（字节）
+
+# =====================================================================
+#                          HTTP服务
+# =====================================================================
+
+
+class PayloadTooLarge(Exception):
+    """请求体超过 HTTP_MAX_BODY"""
+
+
+class MiniHttpServer:
+    """基于 asyncio.start_server 的最小HTTP/1.1服务，运行在当前事件循环中
+
+    只支持短连接和 JSON/文本响应，足以承载 webhook 和状态查询接口。
+    处理函数形如 async handler(request) -> (status, payload)，其中 request
+    为 {"method", "path", "query", "headers", "body"}，payload 为 dict/list 时按JSON返回。
+    """
+
+    REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+               404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self.server = None
+
+    def route(self, method, path, handler):
+        self.routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return None
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        if length > HTTP_MAX_BODY:
+            raise PayloadTooLarge("请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        path, _, query = target.partition("?")
+        return {
+            "method": method.upper(),
+            "path": path,
+            "query": {k: v[-1] for k, v in urllib.parse.parse_qs(query).items()},
+            "headers": headers,
+            "body": body,
+        }
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                request = await asyncio.wait_for(self._read_request(reader), timeout=10)
+            except PayloadTooLarge:
+                request, status, payload = None, 413, {"error": "payload too large"}
+            except (ValueError, asyncio.IncompleteReadError):
+                # 请求行、请求头或 Content-Length 格式错误，或请求体不完整
+                request, status, payload = None, 400, {"error": "bad request"}
+            else:
+                status, payload = 400, {"error": "bad request"}
+            
+            if request:
+                handler = self.routes.get((request["method"], request["path"]))
+                if handler:
+                    try:
+                        status, payload = await handler(request)
+                    except Exception as e:
+                        status, payload = 500, {"error": str(e)}
+                elif any(path == request["path"] for _, path in self.routes):
+                    status, payload = 405, {"error": "method not allowed"}
+                else:
+                    status, payload = 404, {"error": "not found"}
+            
+            if isinstance(payload, (dict, list)):
+                body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+            else:
+                body, content_type = str(payload).encode("utf-8"), "text/plain; charset=utf-8"
+            writer.write((
+                f"HTTP/1.1 {status} {self.REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1") + body)
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+
+# =====================================================================
+#                        验证码推送接收器
+# =====================================================================
+
+
+class CodeWebhook:
+    """验证码推送接收器：Cloudmail 转发钩子将新邮件 POST 到本地，立即唤醒等待中的登录流程
+
+    请求体为单封邮件或邮件列表（含 toEmail/subject/text 字段），也可直接推送
+    {"toEmail": ..., "subject": ..., "code": "12345"}。请求需携带 X-Webhook-Token 头或 token 参数。
+    推送早于等待注册到达的邮件会暂存，注册时按时间认领。
+    """
+
+    PENDING_LIMIT = 50
+
+    def __init__(self, server, path=CODE_WEBHOOK_PATH, token=CODE_WEBHOOK_TOKEN):
+        self.token = token
+        self.waiters = {}   # 收件邮箱 -> (future, matcher)
+        self.pending = []   # (接收时间, 收件邮箱, 邮件)
+        self.received = 0
+        server.route("POST", path, self.receive)
+
+    def expect(self, to_email, matcher, since=None):
+        """注册等待：matcher(mail) 返回验证码或 None；返回在收到验证码时完成的 future"""
+        key = (to_email or "*").lower()
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[key] = (future, matcher)
+        for received_at, pending_key, mail in list(self.pending):
+            if since is not None and received_at < since:
+                continue
+            if pending_key in (key, "*") and self._deliver(key, mail):
+                self.pending.remove((received_at, pending_key, mail))
+                break
+        return future
+
+    def _deliver(self, key, mail):
+        future, matcher = self.waiters.get(key, (None, None))
+        if future is None or future.done():
+            return False
+        code = matcher(mail)
+        if not code:
+            return False
+        future.set_result(code)
+        del self.waiters[key]
+        return True
+
+    async def receive(self, request):
+        token = request["headers"].get("x-webhook-token") or request["query"].get("token")
+        if not self.token or token != self.token:
+            return 401, {"error": "unauthorized"}
+        try:
+            payload = json.loads(request["body"] or b"null")
+        except ValueError:
+            return 400, {"error": "invalid json"}
+        mails = payload if isinstance(payload, list) else [payload]
+        
+        delivered = 0
+        for mail in mails:
+            if not isinstance(mail, dict):
+                continue
+            self.received += 1
+            key = (mail.get("toEmail") or "*").lower()
+            targets = list(self.waiters) if key == "*" else [key]
+            if any(self._deliver(target, mail) for target in targets):
+                delivered += 1
+            else:
+                self.pending = (self.pending + [(time.time(), key, mail)])[-self.PENDING_LIMIT:]
+        return 202, {"received": len(mails), "delivered": delivered}
+
+
+async def start_code_webhook():
+    """按配置启动验证码推送接收器，未启用时返回 (None, None)"""
+    if not CODE_WEBHOOK_PORT:
+        return None, None
+    if not CODE_WEBHOOK_TOKEN:
+        print("⚠️ 未设置 CODE_WEBHOOK_TOKEN，不启动验证码推送接收器（仅轮询）")
+        return None, None
+    try:
+        server = MiniHttpServer(CODE_WEBHOOK_HOST, CODE_WEBHOOK_PORT)
+        webhook = CodeWebhook(server)
+        await server.start()
+        print(f"📮 验证码推送接收器已启动: http://{CODE_WEBHOOK_HOST}:{server.port}{CODE_WEBHOOK_PATH}")
+        return server, webhook
+    except Exception as e:
+        print(f"⚠️ 验证码推送接收器启动失败，仅使用轮询: {e}")
+        return None, None
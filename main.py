@@ -9,60 +9,1656 @@ XServer GAME 自动登录和续期脚本
 # =====================================================================
 
 import asyncio
+import collections
+import concurrent.futures
+import cProfile
+import logging
+import multiprocessing
+import queue
 import time
 import re
+import random
 import datetime
 from datetime import timezone, timedelta
 import os
 import json
+import hashlib
+import pstats
+import shutil
+import signal
+import socket
+import sys
+import tarfile
+import tempfile
+import threading
+import unicodedata
+import urllib.parse
+from email.utils import parsedate_to_datetime
 import requests
 from playwright.async_api import async_playwright, Playwright, Browser, BrowserContext, Page
-from playwright_stealth import stealth_async
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+from playwright_stealth import stealth_async, StealthConfig
+
+from http_server import CODE_WEBHOOK_TIMEOUT, MiniHttpServer, start_code_webhook
+from task_graph import TaskGraph
+from work_queue import QUEUE_DB, WorkQueue, queue_owner, renewal_window_id, run_with_lease
+
+try:
+    import zstandard  # 运行产物打包为 .tar.zst（见 requirements.txt；未安装时退回 .tar.gz）
+except ImportError:
+    zstandard = None
 
 # =====================================================================
 #                          配置区域
 # =====================================================================
 
-# 浏览器配置
-IS_GITHUB_ACTIONS = os.getenv("GITHUB_ACTIONS") == "true"
-USE_HEADLESS = IS_GITHUB_ACTIONS or os.getenv("USE_HEADLESS", "false").lower() == "true"
-WAIT_TIMEOUT = 10000     # 页面元素等待超时时间（毫秒）
-PAGE_LOAD_DELAY = 3      # 页面加载延迟时间（秒）
+# 浏览器配置
+IS_GITHUB_ACTIONS = os.getenv("GITHUB_ACTIONS") == "true"
+USE_HEADLESS = IS_GITHUB_ACTIONS or os.getenv("USE_HEADLESS", "false").lower() == "true"
+WAIT_TIMEOUT = 10000     # 页面元素等待超时时间（毫秒）
+PAGE_LOAD_DELAY = 3      # 页面加载延迟时间（秒）
+DELAY_SCALE = float(os.getenv("DELAY_SCALE", "1"))  # 固定等待的缩放系数（本地模拟面板压测时可调小）
+
+# 浏览器启动参数
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-notifications',
+    '--window-size=1920,1080',
+    '--lang=ja-JP',
+    '--accept-lang=ja-JP,ja,en-US,en'
+]
+
+# 浏览器启动配置: full（完整配置，默认）/ lean（精简无头配置，启动更快、内存更少）
+BROWSER_PROFILE = os.getenv("BROWSER_PROFILE", "full").lower()
+ENABLE_SCREENSHOTS = os.getenv("ENABLE_SCREENSHOTS", "true").lower() == "true"  # 关闭后不截图，也无需安装日文字体
+
+# lean 配置额外关闭后台联网、扩展、组件更新和同步等与续期无关的功能
+LEAN_BROWSER_ARGS = [arg for arg in BROWSER_ARGS if not arg.startswith('--window-size')] + [
+    '--window-size=1280,720',
+    '--disable-background-networking',
+    '--disable-extensions',
+    '--disable-component-update',
+    '--disable-sync',
+    '--disable-default-apps',
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--metrics-recording-only',
+    '--no-first-run',
+    '--mute-audio',
+]
+
+LAUNCH_PROFILES = {
+    "full": {"args": BROWSER_ARGS, "headless": None, "viewport": None},
+    "lean": {"args": LEAN_BROWSER_ARGS, "headless": True, "viewport": {"width": 1280, "height": 720}},
+}
+
+
+def launch_options(profile=BROWSER_PROFILE, headless=USE_HEADLESS):
+    """返回 chromium.launch 的参数；lean 配置始终使用无头模式"""
+    config = LAUNCH_PROFILES.get(profile, LAUNCH_PROFILES["full"])
+    return {
+        "headless": headless if config["headless"] is None else config["headless"],
+        "args": config["args"],
+    }
+
+
+def context_overrides(profile=BROWSER_PROFILE):
+    """启动配置对浏览器上下文参数的覆盖（不写入账号档案的指纹）"""
+    viewport = LAUNCH_PROFILES.get(profile, LAUNCH_PROFILES["full"])["viewport"]
+    return {"viewport": viewport} if viewport else {}
+
+# XServer登录配置
+LOGIN_EMAIL = os.getenv("XSERVER_EMAIL")
+LOGIN_PASSWORD = os.getenv("XSERVER_PASSWORD")
+XSERVER_BASE_URL = os.getenv("XSERVER_BASE_URL", "https://secure.xserver.ne.jp").rstrip("/")
+TARGET_URL = f"{XSERVER_BASE_URL}/xapanel/login/xmgame"
+
+# 已知页面地址（导航规划器据此直接跳转，跳过中间点击）
+PAGE_URLS = {
+    "panel_index": f"{XSERVER_BASE_URL}/xapanel/xmgame/index",
+    "game_index": f"{XSERVER_BASE_URL}/xmgame/game/index",
+    "extend_index": f"{XSERVER_BASE_URL}/xmgame/game/freeplan/extend/index",
+    "extend_input": f"{XSERVER_BASE_URL}/xmgame/game/freeplan/extend/input",
+    "extend_conf": f"{XSERVER_BASE_URL}/xmgame/game/freeplan/extend/conf",
+    "extend_do": f"{XSERVER_BASE_URL}/xmgame/game/freeplan/extend/do",
+}
+DIRECT_NAVIGATION = os.getenv("DIRECT_NAVIGATION", "true").lower() == "true"  # 是否优先直接加载目标页面
+MULTI_SERVER = os.getenv("MULTI_SERVER", "true").lower() == "true"  # 账号下有多台游戏服务器时逐台续期
+RENEWAL_WINDOW_HOURS = 24  # 剩余时间低于该值时才允许续期
+
+# 运行模式: renew（默认，完整续期流程）/ probe（只探测到期时间，不进入续期页面）/ fleet（多账号并行）
+#          / standby（提前登录并在续期窗口打开时立即续期）
+#          / enqueue（将账号写入共享任务队列）/ worker（从共享任务队列领取账号并续期，可在多台机器上运行）
+#          / daemon（常驻进程，按可热更新的配置文件定期续期所有账号）
+RUN_MODE = os.getenv("RUN_MODE", "renew").lower()
+PROBE_RESULT_FILE = os.getenv("PROBE_RESULT_FILE", "probe_result.json")
+
+# 预热待命配置（RUN_MODE=standby）
+STANDBY_LEAD_MINUTES = float(os.getenv("STANDBY_LEAD_MINUTES", "5"))          # 在续期窗口打开前多少分钟登录
+STANDBY_MAX_WAIT_MINUTES = float(os.getenv("STANDBY_MAX_WAIT_MINUTES", "40"))  # 最多待命多久（受工作流超时限制）
+STANDBY_POLL_SECONDS = float(os.getenv("STANDBY_POLL_SECONDS", "20"))          # 窗口临近时的探测间隔
+STANDBY_GRACE_MINUTES = 5  # 预计打开时刻之后仍继续探测的时长（剩余时间只精确到分钟）
+
+# =====================================================================
+#                      Cloudmail配置加载模块
+# =====================================================================
+
+def load_cloud_mail_config():
+    """从环境变量加载cloudmail配置"""
+    cloud_mail_env = os.getenv("CLOUD_MAIL")
+    if cloud_mail_env:
+        try:
+            config = json.loads(cloud_mail_env)
+            print("✅ 已从环境变量 CLOUD_MAIL 加载邮箱配置")
+            return config
+        except json.JSONDecodeError as e:
+            print(f"❌ CLOUD_MAIL 环境变量JSON解析失败: {e}")
+            return None
+    else:
+        print("❌ 未找到 CLOUD_MAIL 环境变量")
+        return None
+
+# 加载并提取cloudmail配置
+CLOUD_MAIL_CONFIG = load_cloud_mail_config() or {}
+CLOUDMAIL_API_BASE_URL = CLOUD_MAIL_CONFIG.get("API_BASE_URL")
+CLOUDMAIL_EMAIL = CLOUD_MAIL_CONFIG.get("EMAIL")
+CLOUDMAIL_PASSWORD = CLOUD_MAIL_CONFIG.get("PASSWORD")
+CLOUDMAIL_JWT_SECRET = CLOUD_MAIL_CONFIG.get("JWT_SECRET")
+CLOUDMAIL_SEND_EMAIL = CLOUD_MAIL_CONFIG.get("SEND_EMAIL")
+CLOUDMAIL_TO_EMAIL = CLOUD_MAIL_CONFIG.get("TO_EMAIL")
+CLOUDMAIL_SUBJECT = CLOUD_MAIL_CONFIG.get("SUBJECT")
+CLOUDMAIL_LOCAL_FILTER = os.getenv("CLOUDMAIL_LOCAL_FILTER", "false").lower() == "true"  # 强制只在本地过滤主题
+CLOUDMAIL_FIELDS = CLOUD_MAIL_CONFIG.get("FIELDS")  # 只请求这些字段（需API支持，如 ["emailId", "subject", "text", "createTime"]）
+CLOUDMAIL_PAGE_SIZE = int(os.getenv("CLOUDMAIL_PAGE_SIZE", "20"))  # 邮件列表每页数量
+CLOUDMAIL_MAX_PAGES = int(os.getenv("CLOUDMAIL_MAX_PAGES", "5"))   # 单次查询最多翻页数
+MAIL_CLOCK_SKEW = 120  # 判断邮件是否晚于发送验证码时刻时允许的时钟偏差（秒）
+CLOUDMAIL_TIMEZONE = float(os.getenv("CLOUDMAIL_TIMEZONE", "0"))  # Cloudmail 返回的 createTime 所在时区（相对UTC的小时数，如 8）
+CLOUDMAIL_UNFILTERED_CHECK_AFTER = float(os.getenv("CLOUDMAIL_UNFILTERED_CHECK_AFTER", "45"))  # 发送验证码多少秒后仍未命中时，用不带主题的查询确认一次
+
+
+def normalize_subject(subject):
+    """规范化邮件主题：NFKC 统一全角/半角字符（如【】、全角空格），并合并空白"""
+    return " ".join(unicodedata.normalize("NFKC", subject or "").split())
+
+# =====================================================================
+#                      重试策略与失败分类模块
+# =====================================================================
+
+# 失败分类（最终写入运行状态）
+FAILURE_CATEGORIES = {
+    "timeout": "导航或元素等待超时",
+    "network": "网络连接错误",
+    "server_error": "服务端5xx错误",
+    "mail_pending": "验证码邮件尚未到达",
+    "auth": "凭据错误或认证失败",
+    "page_changed": "页面跳转或结构与预期不符",
+    "config": "配置缺失或无效",
+    "dns": "域名解析失败",
+    "tls": "TLS握手失败",
+    "clock_skew": "本机时钟偏差过大",
+    "lease_lost": "任务租约已被其他节点接管",
+    "unknown": "未知错误",
+}
+
+
+class StepError(Exception):
+    """带失败分类的步骤异常"""
+
+    def __init__(self, category, message=""):
+        super().__init__(message or FAILURE_CATEGORIES.get(category, category))
+        self.category = category if category in FAILURE_CATEGORIES else "unknown"
+
+
+def classify_error(error):
+    """将异常归类到 FAILURE_CATEGORIES 中的某一类"""
+    if isinstance(error, StepError):
+        return error.category
+    if isinstance(error, (PlaywrightTimeoutError, asyncio.TimeoutError, requests.exceptions.Timeout)):
+        return "timeout"
+    if isinstance(error, requests.exceptions.SSLError):
+        return "tls"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        message = str(error)
+        if "NameResolutionError" in message or "Name or service not known" in message or "getaddrinfo" in message:
+            return "dns"
+        return "network"
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        if response is not None and response.status_code >= 500:
+            return "server_error"
+    if isinstance(error, PlaywrightError):
+        message = str(error)
+        if "net::ERR_NAME_NOT_RESOLVED" in message:
+            return "dns"
+        if "net::ERR_SSL_" in message or "net::ERR_CERT_" in message:
+            return "tls"
+        if "net::ERR_" in message:
+            return "network"
+        if "Timeout" in message:
+            return "timeout"
+    return "unknown"
+
+
+class RetryPolicy:
+    """单个步骤的重试策略：可重试的失败分类、退避曲线和最大尝试次数"""
+
+    def __init__(self, max_attempts=1, base_delay=1.0, max_delay=30.0, factor=2.0, jitter=0.2, retry_on=()):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.retry_on = set(retry_on)
+
+    def should_retry(self, category, attempt):
+        """判断第 attempt 次尝试失败后是否继续重试"""
+        return category in self.retry_on and attempt < self.max_attempts
+
+    def delay_for(self, attempt):
+        """计算第 attempt 次失败后的退避时间（秒）"""
+        delay = min(self.base_delay * (self.factor ** (attempt - 1)), self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+# 默认不重试：未声明策略的步骤失败即返回
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+# 各步骤的重试策略（只对廉价、可原地重复的步骤启用）
+# 注意：最终的"期限を延長する"提交按钮不可重复点击，不在此列
+STEP_RETRY_POLICIES = {
+    "navigate_to_login": RetryPolicy(max_attempts=3, base_delay=2, max_delay=10,
+                                     retry_on=("timeout", "network", "dns", "tls", "server_error")),
+    "open_game_page": RetryPolicy(max_attempts=3, base_delay=1, max_delay=8,
+                                  retry_on=("timeout", "network")),
+    "click_upgrade_button": RetryPolicy(max_attempts=3, base_delay=1, max_delay=8,
+                                        retry_on=("timeout", "network")),
+    "click_extension_button": RetryPolicy(max_attempts=2, base_delay=1, max_delay=5,
+                                          retry_on=("timeout",)),
+    "fetch_verification_code": RetryPolicy(max_attempts=6, base_delay=5, max_delay=20, factor=1.5,
+                                           retry_on=("mail_pending", "network", "dns", "tls", "server_error", "timeout")),
+}
+
+# =====================================================================
+#                          网络预检模块
+# =====================================================================
+
+PREFLIGHT = os.getenv("PREFLIGHT", "true").lower() == "true"              # 启动浏览器的同时检查各端点的连通性
+PREFLIGHT_TIMEOUT = float(os.getenv("PREFLIGHT_TIMEOUT", "5"))            # 单个端点的连接超时（秒）
+PREFLIGHT_CACHE_SECONDS = 60  # 同一进程内多个账号共用预检结果的时长
+CLOCK_SKEW_LIMIT = float(os.getenv("CLOCK_SKEW_LIMIT", str(MAIL_CLOCK_SKEW)))  # 本机与 XServer 的最大允许时钟偏差（秒）
+# 通知等附加端点，格式为 "名称=URL,名称=URL"（如 telegram=https://api.telegram.org），不可达时只警告
+PREFLIGHT_URLS = dict(
+    item.split("=", 1) if "=" in item else (urllib.parse.urlsplit(item).hostname or item, item)
+    for item in (part.strip() for part in os.getenv("PREFLIGHT_URLS", "").split(",")) if item
+)
+
+# 进程内共享的HTTP会话：预检建立的连接留在连接池中，供 Cloudmail 查询复用
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16))
+HTTP_SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16))
+
+_preflight_cache = {}
+
+
+def check_endpoint(name, url, timeout=PREFLIGHT_TIMEOUT):
+    """解析域名并通过共享会话发送一次 HEAD 请求，返回检查结果
+
+    TCP/TLS 握手建立的连接保留在 HTTP_SESSION 的连接池中，随后的请求直接复用。
+    只要收到任何HTTP响应即视为可达。
+    """
+    parts = urllib.parse.urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    check = {"name": name, "host": parts.hostname, "ok": False, "category": None,
+             "status": None, "date": None, "dns_ms": None, "connect_ms": None, "error": None}
+    start = time.perf_counter()
+    try:
+        socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        check.update(category="dns", error=str(e))
+        return check
+    resolved = time.perf_counter()
+    check["dns_ms"] = round((resolved - start) * 1000)
+    try:
+        response = HTTP_SESSION.head(url, timeout=timeout, allow_redirects=False)
+        check.update(ok=True, status=response.status_code, date=response.headers.get("Date"))
+    except Exception as e:
+        check.update(category=classify_error(e), error=str(e))
+    check["connect_ms"] = round((time.perf_counter() - resolved) * 1000)
+    return check
+
+
+def clock_skew(date_header):
+    """本机时间减去服务器 Date 响应头的时间（秒），无法解析时返回 None"""
+    try:
+        return time.time() - parsedate_to_datetime(date_header).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+async def run_preflight(targets, optional=()):
+    """并发检查所有端点；必需端点不可达或时钟偏差过大时抛出带分类的 StepError
+
+    targets 为 {名称: URL}，optional 中的端点失败只输出警告。
+    结果在进程内缓存 PREFLIGHT_CACHE_SECONDS 秒，多个账号不会重复预检。
+    """
+    key = tuple(sorted(targets.items()))
+    cached = _preflight_cache.get(key)
+    if cached and time.monotonic() - cached[0] < PREFLIGHT_CACHE_SECONDS:
+        checks = cached[1]
+    else:
+        try:
+            checks = await asyncio.wait_for(
+                asyncio.gather(*(asyncio.to_thread(check_endpoint, name, url) for name, url in targets.items())),
+                PREFLIGHT_TIMEOUT * 2,
+            )
+        except asyncio.TimeoutError:
+            raise StepError("timeout", f"网络预检超过 {PREFLIGHT_TIMEOUT * 2:g} 秒未完成")
+        _preflight_cache[key] = (time.monotonic(), checks)
+        for check in checks:
+            if check["ok"]:
+                print(f"🛫 预检 {check['name']}（{check['host']}）: DNS {check['dns_ms']}ms，"
+                      f"连接 {check['connect_ms']}ms，HTTP {check['status']}")
+            else:
+                print(f"🛫 预检 {check['name']}（{check['host']}）失败: [{check['category']}] {check['error']}")
+    
+    for check in checks:
+        if not check["ok"]:
+            if check["name"] in optional:
+                print(f"⚠️ 附加端点 {check['name']} 不可达，继续运行")
+                continue
+            raise StepError(check["category"] or "network", f"{check['name']}（{check['host']}）: {check['error']}")
+    
+    xserver = next((check for check in checks if check["name"] == "xserver"), None)
+    skew = clock_skew(xserver["date"]) if xserver else None
+    if skew is not None and abs(skew) > CLOCK_SKEW_LIMIT:
+        raise StepError("clock_skew", f"本机时钟与 XServer 相差 {skew:+.0f} 秒（上限 {CLOCK_SKEW_LIMIT:g} 秒）")
+    return checks
+
+# =====================================================================
+#                        选择器注册表模块
+# =====================================================================
+
+# 选择器统计文件（可选，设置后跨运行累计命中率）
+SELECTOR_STATS_FILE = os.getenv("SELECTOR_STATS_FILE")
+
+# 每个逻辑元素对应一组有序候选选择器，第一个为主选择器
+SELECTOR_REGISTRY = {
+    "login.email": [
+        "input[name='memberid']",
+        "input#memberid",
+        "form input[type='email']",
+    ],
+    "login.password": [
+        "input[name='user_password']",
+        "form input[type='password']",
+    ],
+    "login.submit": [
+        "input[value='ログインする']",
+        "button:has-text('ログインする')",
+    ],
+    "auth.send_code": [
+        "input[value*='送信']",
+        "button:has-text('送信')",
+    ],
+    "auth.code_input": [
+        "input[id='auth_code'][name='auth_code']",
+        "input[name='auth_code']",
+    ],
+    "auth.submit": [
+        "input[type='submit'][value='ログイン']",
+        "button[type='submit']:has-text('ログイン')",
+    ],
+    "game.manage": [
+        "a:has-text('ゲーム管理')",
+        "a[href*='xmgame/game/index']",
+    ],
+    "panel.server_links": [
+        "a[href*='jumpvps']",
+        "a:has-text('ゲーム管理')",
+    ],
+    "game.upgrade": [
+        "a:has-text('アップグレード・期限延長')",
+        "a[href*='freeplan/extend/index']",
+    ],
+    "extend.start": [
+        "a:has-text('期限を延長する')",
+        "a[href*='freeplan/extend/input']",
+    ],
+    "extend.confirm": [
+        "button[type='submit']:has-text('確認画面に進む')",
+        "input[type='submit'][value*='確認画面に進む']",
+    ],
+    "extend.new_expiry": [
+        "tr:has(th:has-text('延長後の期限'))",
+        "tr:has-text('延長後の期限')",
+    ],
+    "extend.submit": [
+        "button[type='submit']:has-text('期限を延長する')",
+        "input[type='submit'][value*='期限を延長する']",
+    ],
+}
+
+
+class SelectorRegistry:
+    """选择器注册表：并发竞速候选选择器，并记录命中情况和耗时"""
+
+    def __init__(self, registry=None, stats_file=SELECTOR_STATS_FILE):
+        self.registry = registry or SELECTOR_REGISTRY
+        self.stats_file = stats_file
+        self.stats = {}     # key -> {"hits": {selector: 次数}, "misses": 次数, "elapsed_ms": [..]}
+        self.warnings = []  # 主选择器未命中的逻辑元素
+
+    def _entry(self, key):
+        return self.stats.setdefault(key, {"hits": {}, "misses": 0, "elapsed_ms": []})
+
+    async def wait_for(self, page, key, timeout):
+        """同时等待 key 的所有候选选择器，返回 (命中的选择器, 元素)
+
+        多个候选同时命中时优先返回排序靠前的候选；全部失败时抛出主选择器的异常。
+        """
+        candidates = self.registry[key]
+        start = time.monotonic()
+        tasks = {
+            asyncio.ensure_future(page.wait_for_selector(selector, timeout=timeout)): index
+            for index, selector in enumerate(candidates)
+        }
+        pending = set(tasks)
+        errors = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: tasks[t]):
+                    if task.exception() is None and task.result() is not None:
+                        index, element = tasks[task], task.result()
+                        if index > 0:
+                            # 候选先完成不代表主选择器失效：立即（不等待）复查主选择器
+                            primary = await self._match_now(page, candidates[0])
+                            if primary is not None:
+                                index, element = 0, primary
+                        self._record_hit(key, index, (time.monotonic() - start) * 1000)
+                        return candidates[index], element
+                    errors[tasks[task]] = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self._entry(key)["misses"] += 1
+        primary_error = errors.get(0)
+        raise primary_error or StepError("page_changed", f"选择器 {key} 的所有候选均未命中")
+
+    @staticmethod
+    async def _match_now(page, selector):
+        """不等待地检查选择器当前是否命中，命中时返回第一个元素"""
+        try:
+            if await page.locator(selector).count() > 0:
+                return await page.query_selector(selector)
+        except PlaywrightError:
+            pass
+        return None
+
+    def _record_hit(self, key, index, elapsed_ms):
+        """记录命中的候选及耗时，主选择器失效时发出预警"""
+        entry = self._entry(key)
+        selector = self.registry[key][index]
+        entry["hits"][selector] = entry["hits"].get(selector, 0) + 1
+        entry["elapsed_ms"].append(round(elapsed_ms, 1))
+        if index > 0:
+            print(f"⚠️ 主选择器失效: {key} -> 使用候选 #{index}: {selector}")
+            if key not in self.warnings:
+                self.warnings.append(key)
+
+    def report(self):
+        """输出本次运行的选择器命中统计，并在配置时累计写入统计文件"""
+        if not self.stats:
+            return
+        print("📊 选择器命中统计:")
+        for key, entry in self.stats.items():
+            primary = self.registry[key][0]
+            primary_hits = entry["hits"].get(primary, 0)
+            total = sum(entry["hits"].values()) + entry["misses"]
+            elapsed = entry["elapsed_ms"]
+            avg_ms = sum(elapsed) / len(elapsed) if elapsed else 0
+            print(f"   {key}: 主选择器 {primary_hits}/{total}，平均耗时 {avg_ms:.0f}ms")
+        if self.warnings:
+            print(f"⚠️ 以下元素的主选择器已失效，请更新注册表: {', '.join(self.warnings)}")
+        if self.stats_file:
+            self._save_stats()
+
+    def _save_stats(self):
+        """将本次统计累加到统计文件中"""
+        try:
+            history = {}
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+            for key, entry in self.stats.items():
+                saved = history.setdefault(key, {"hits": {}, "misses": 0, "runs": 0})
+                for selector, count in entry["hits"].items():
+                    saved["hits"][selector] = saved["hits"].get(selector, 0) + count
+                saved["misses"] += entry["misses"]
+                saved["runs"] += 1
+                saved["last_elapsed_ms"] = entry["elapsed_ms"][-1] if entry["elapsed_ms"] else None
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump(history, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"⚠️ 保存选择器统计失败: {e}")
+
+# =====================================================================
+#                       限速与登录错峰模块
+# =====================================================================
+
+def _rate_config(name, default_per_minute, default_burst):
+    """读取限速配置，格式为 "每分钟次数[:突发容量]"，如 RATE_LIMIT_LOGIN=6:2"""
+    value = os.getenv(f"RATE_LIMIT_{name}", f"{default_per_minute}:{default_burst}")
+    per_minute, _, burst = value.partition(":")
+    return float(per_minute), float(burst or default_burst)
+
+
+# 各类操作的令牌桶: (每分钟补充的令牌数, 桶容量)
+RATE_LIMITS = {
+    "login": _rate_config("LOGIN", 6, 1),          # XServer 登录
+    "2fa_send": _rate_config("2FA_SEND", 3, 1),    # 发送新环境验证码
+    "cloudmail": _rate_config("CLOUDMAIL", 60, 5), # Cloudmail API 查询
+}
+LOGIN_STAGGER_WINDOW = float(os.getenv("LOGIN_STAGGER_WINDOW", "60"))  # 多账号启动时刻的分散窗口（秒）
+ACCOUNT_STATS_FILE = os.getenv("ACCOUNT_STATS_FILE", ".account_stats.json")  # 账号运行统计（2FA触发率）
+ACCOUNT_STATS_RECENT = 50  # 每个账号保留的最近运行记录数
+
+
+class RateLimiter:
+    """令牌桶限速器：按操作类别限制速率，允许预约（令牌为负表示排队中）
+
+    状态保存在 dict 中并由锁保护；多账号运行时传入 multiprocessing.Manager
+    的 dict 和 Lock 即可跨进程共享。代理调用是阻塞的进程间通信，
+    因此在线程中执行以免阻塞事件循环。
+    """
+
+    def __init__(self, state=None, lock=None, buckets=None):
+        self.state = {} if state is None else state
+        self.lock = lock or threading.Lock()
+        self.buckets = buckets or RATE_LIMITS
+
+    def _reserve(self, name):
+        """取出一个令牌，返回需要等待的秒数"""
+        per_minute, capacity = self.buckets[name]
+        rate = per_minute / 60
+        with self.lock:
+            now = time.time()
+            tokens, updated = self.state.get(name, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate) - 1
+            self.state[name] = (tokens, now)
+        return 0 if tokens >= 0 else -tokens / rate
+
+    async def acquire(self, name):
+        """等待直到 name 类操作有可用令牌"""
+        per_minute, _ = self.buckets.get(name, (0, 0))
+        if per_minute <= 0:
+            return
+        wait = await asyncio.to_thread(self._reserve, name)
+        if wait > 0:
+            print(f"🚦 限速: {name} 等待 {wait:.1f}秒")
+            await asyncio.sleep(wait)
+
+
+def stagger_offsets(count, window=LOGIN_STAGGER_WINDOW):
+    """将 count 个账号的启动时刻均匀分散到窗口内，并在各自的时间槽内加入随机抖动"""
+    if count <= 1 or window <= 0:
+        return [0.0] * count
+    slot = window / count
+    return [(index + random.random()) * slot for index in range(count)]
+
+
+def account_key(email):
+    """账号统计使用的稳定键（不直接保存邮箱）"""
+    return hashlib.sha256((email or "").lower().encode("utf-8")).hexdigest()[:16]
+
+
+def pacing_signature():
+    """当前的限速与错峰配置，记录在每次运行中以便比较调整前后的2FA触发率"""
+    login_rate, login_burst = RATE_LIMITS["login"]
+    return f"login={login_rate:g}/min:{login_burst:g},stagger={LOGIN_STAGGER_WINDOW:g}s"
+
+
+def record_account_runs(runs, stats_file=ACCOUNT_STATS_FILE):
+    """将一批运行结果写入账号统计文件，返回更新后的统计
+
+    runs 中每项为 {"email", "label", "twofa_triggered", "status", "profile"}，
+    profile 表示本次是否加载了已保存的浏览器档案。
+    统计文件只由单个进程（单账号运行或多账号协调者）写入。
+    """
+    try:
+        with open(stats_file, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        stats = {}
+    
+    now = datetime.datetime.now(timezone(timedelta(hours=8))).isoformat(timespec="seconds")
+    pacing = pacing_signature()
+    for run in runs:
+        entry = stats.setdefault(account_key(run["email"]), {"label": run["label"], "runs": 0, "twofa_triggers": 0, "recent": []})
+        entry["runs"] += 1
+        entry["twofa_triggers"] += 1 if run["twofa_triggered"] else 0
+        entry["recent"] = (entry["recent"] + [{
+            "time": now,
+            "twofa": run["twofa_triggered"],
+            "status": run["status"],
+            "profile": run.get("profile", False),
+            "pacing": pacing,
+        }])[-ACCOUNT_STATS_RECENT:]
+    
+    try:
+        atomic_write(stats_file, json.dumps(stats, ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(f"⚠️ 保存账号统计失败: {e}")
+    return stats
+
+
+def twofa_rate(entry, pacing=None):
+    """计算账号的2FA触发率；指定 pacing 时只统计该配置下的最近运行"""
+    recent = [r for r in entry["recent"] if pacing is None or r["pacing"] == pacing]
+    if pacing is None:
+        return entry["twofa_triggers"] / entry["runs"] if entry["runs"] else None
+    return sum(1 for r in recent if r["twofa"]) / len(recent) if recent else None
+
+
+def twofa_skip_rate(entry, profile=None):
+    """计算最近运行中跳过2FA的比例；指定 profile 时只统计加载过（或未加载）浏览器档案的运行"""
+    recent = [r for r in entry["recent"] if profile is None or r.get("profile") == profile]
+    return sum(1 for r in recent if not r["twofa"]) / len(recent) if recent else None
+
+
+# =====================================================================
+#                       浏览器档案存储模块
+# =====================================================================
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".profiles")        # 各账号浏览器档案目录（为空则不持久化）
+PROFILE_ARCHIVE = os.getenv("PROFILE_ARCHIVE")             # 档案压缩包路径（含会话Cookie，放入共享缓存前须加密）
+
+# 新建档案时使用的浏览器指纹；写入档案后保持不变，避免每次运行都被识别为新环境
+DEFAULT_FINGERPRINT = {
+    "viewport": {"width": 1920, "height": 1080},
+    "locale": "ja-JP",
+    "timezone_id": "Asia/Tokyo",
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+}
+
+
+class ProfileStore:
+    """按账号保存浏览器档案：固定的指纹 + storage_state（Cookie 和 localStorage）
+
+    XServer 通过设备 Cookie 识别已验证过的环境，保留这些状态后
+    再次登录通常不会触发 loginauth 新环境验证。档案目录可打包为
+    tar.gz 压缩包，在不同运行器之间导出/导入。
+    """
+
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = profile_dir
+
+    def path_for(self, email):
+        return os.path.join(self.profile_dir, f"{account_key(email)}.json")
+
+    def load(self, email):
+        """读取账号档案，不存在或损坏时返回 None"""
+        if not self.profile_dir:
+            return None
+        try:
+            with open(self.path_for(email), "r", encoding="utf-8") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(profile.get("storage_state"), dict):
+            return None
+        profile["fingerprint"] = {**DEFAULT_FINGERPRINT, **profile.get("fingerprint", {})}
+        return profile
+
+    def save(self, email, storage_state, fingerprint):
+        """原子写入账号档案"""
+        if not self.profile_dir:
+            return False
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profile = {
+            "saved_at": datetime.datetime.now(timezone(timedelta(hours=8))).isoformat(timespec="seconds"),
+            "fingerprint": fingerprint,
+            "storage_state": storage_state,
+        }
+        atomic_write(self.path_for(email), json.dumps(profile, ensure_ascii=False))
+        return True
+
+    def discard(self, email):
+        """删除账号档案（凭据变更后旧会话不再可信）"""
+        try:
+            os.unlink(self.path_for(email))
+            return True
+        except OSError:
+            return False
+
+    def export_archive(self, archive_path):
+        """将档案目录打包为 tar.gz 压缩包，返回打包的档案数"""
+        if not self.profile_dir or not os.path.isdir(self.profile_dir):
+            return 0
+        names = sorted(n for n in os.listdir(self.profile_dir) if n.endswith(".json"))
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(archive_path)), suffix=".tmp")
+        os.close(fd)
+        try:
+            with tarfile.open(temp_path, "w:gz") as tar:
+                for name in names:
+                    tar.add(os.path.join(self.profile_dir, name), arcname=name)
+            os.replace(temp_path, archive_path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return len(names)
+
+    def import_archive(self, archive_path):
+        """从压缩包恢复档案，只接受顶层的 .json 文件；返回导入的档案数"""
+        if not self.profile_dir or not os.path.isfile(archive_path):
+            return 0
+        os.makedirs(self.profile_dir, exist_ok=True)
+        count = 0
+        with tarfile.open(archive_path, "r:gz") as tar:
+            for member in tar.getmembers():
+                name = os.path.basename(member.name)
+                if not member.isfile() or name != member.name or not name.endswith(".json"):
+                    continue
+                content = tar.extractfile(member).read().decode("utf-8")
+                atomic_write(os.path.join(self.profile_dir, name), content)
+                count += 1
+        return count
+
+
+def import_profiles(store=None):
+    """运行开始前从 PROFILE_ARCHIVE 导入档案（未配置或不存在时跳过）"""
+    if not PROFILE_ARCHIVE:
+        return
+    try:
+        count = (store or ProfileStore()).import_archive(PROFILE_ARCHIVE)
+        if count:
+            print(f"🗂️ 已从 {PROFILE_ARCHIVE} 导入 {count} 个浏览器档案")
+    except Exception as e:
+        print(f"⚠️ 导入浏览器档案失败: {e}")
+
+
+def export_profiles(store=None):
+    """运行结束后将档案导出到 PROFILE_ARCHIVE"""
+    if not PROFILE_ARCHIVE:
+        return
+    try:
+        count = (store or ProfileStore()).export_archive(PROFILE_ARCHIVE)
+        print(f"🗂️ 已导出 {count} 个浏览器档案到 {PROFILE_ARCHIVE}")
+    except Exception as e:
+        print(f"⚠️ 导出浏览器档案失败: {e}")
+
+
+# =====================================================================
+#                       运行产物存储模块
+# =====================================================================
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")                      # 截图等运行产物的根目录（每次运行一个子目录）
+ARTIFACT_MAX_MB = float(os.getenv("ARTIFACT_MAX_MB", "200"))               # 所有运行产物的总大小上限
+ARTIFACT_MAX_AGE_DAYS = float(os.getenv("ARTIFACT_MAX_AGE_DAYS", "7"))     # 超过该天数的运行产物会被删除
+ARTIFACT_ACTIVE_MINUTES = float(os.getenv("ARTIFACT_ACTIVE_MINUTES", "30"))  # 该时间内修改过的运行产物可能仍在运行（其他进程或节点），清理时跳过
+ARTIFACT_BUNDLE = os.getenv("ARTIFACT_BUNDLE", "none").lower()             # none / zstd：运行结束后打包为单个文件
+
+
+class ArtifactStore:
+    """按运行划分目录的产物存储，带大小/时间配额和LRU清理
+
+    运行目录在第一次写入时才创建。运行结束时可将目录打包为 .tar.zst
+    （未安装 zstandard 时退回 .tar.gz），然后按最近修改时间淘汰旧的运行，
+    使总大小不超过 ARTIFACT_MAX_MB。多账号运行时各账号只打包不清理，由协调者
+    在所有运行结束后调用 prune_artifacts() 统一清理。
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, label="run"):
+        self.root = root
+        timestamp = datetime.datetime.now(timezone(timedelta(hours=8))).strftime("%Y%m%d-%H%M%S")
+        safe_label = re.sub(r"[^\w.-]", "_", label)
+        self.run_name = f"{timestamp}-{safe_label}-{random.randint(0, 0xffff):04x}"
+        self.run_dir = os.path.join(root, self.run_name)
+
+    def path(self, filename):
+        """返回本次运行中某个产物的路径（按需创建运行目录）"""
+        os.makedirs(self.run_dir, exist_ok=True)
+        return os.path.join(self.run_dir, filename)
+
+    def bundle(self):
+        """将本次运行目录打包为单个压缩文件并删除原目录，返回压缩包路径"""
+        if not os.path.isdir(self.run_dir) or not os.listdir(self.run_dir):
+            return None
+        if zstandard:
+            archive = f"{self.run_dir}.tar.zst"
+            with open(archive, "wb") as raw:
+                with zstandard.ZstdCompressor(level=10).stream_writer(raw) as compressed:
+                    with tarfile.open(fileobj=compressed, mode="w|") as tar:
+                        tar.add(self.run_dir, arcname=self.run_name)
+        else:
+            print("ℹ️ 未安装 zstandard，运行产物改用 tar.gz 打包")
+            archive = f"{self.run_dir}.tar.gz"
+            with tarfile.open(archive, "w:gz") as tar:
+                tar.add(self.run_dir, arcname=self.run_name)
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+        return archive
+
+    @staticmethod
+    def _entry_size(path):
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        total = 0
+        for directory, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return total
+
+    def prune(self, max_mb=ARTIFACT_MAX_MB, max_age_days=ARTIFACT_MAX_AGE_DAYS, active_minutes=ARTIFACT_ACTIVE_MINUTES):
+        """删除过期的运行产物，并按最近修改时间淘汰，直到总大小不超过上限
+
+        最近 active_minutes 内修改过的条目可能属于仍在运行的其他进程，不会被删除。
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                entries.append((os.path.getmtime(path), path, self._entry_size(path)))
+            except OSError:
+                continue
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        cutoff = time.time() - max_age_days * 86400
+        active_cutoff = time.time() - active_minutes * 60
+        removed = 0
+        for mtime, path, size in entries:
+            if path.startswith(self.run_dir) or mtime >= active_cutoff:
+                continue  # 不删除本次运行和可能仍在运行的产物
+            if mtime >= cutoff and total <= max_mb * 1024 * 1024:
+                break
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+            total -= size
+            removed += 1
+        if removed:
+            print(f"🧹 已清理 {removed} 个旧的运行产物（剩余 {total / 1024 / 1024:.1f}MB）")
+        return removed
+
+    def finalize(self, prune=True):
+        """运行结束：按配置打包本次产物，prune 为真时执行配额清理"""
+        try:
+            if ARTIFACT_BUNDLE == "zstd":
+                archive = self.bundle()
+                if archive:
+                    print(f"📦 运行产物已打包: {archive}")
+            if prune:
+                self.prune()
+        except Exception as e:
+            print(f"⚠️ 整理运行产物失败: {e}")
+
+
+def prune_artifacts(root=ARTIFACT_DIR):
+    """多账号运行结束后由协调者统一执行配额清理"""
+    try:
+        ArtifactStore(root, label="prune").prune()
+    except Exception as e:
+        print(f"⚠️ 清理运行产物失败: {e}")
+
+
+# =====================================================================
+#                       Stealth 脚本模块
+# =====================================================================
+
+# bundled（默认）：所有规避脚本合并为一个初始化脚本，每个上下文注册一次
+# page：沿用 stealth_async，逐个脚本注入到每个页面
+# off：不应用（仅用于基准测试对比）
+STEALTH_MODE = os.getenv("STEALTH_MODE", "bundled").lower()
+STEALTH_DISABLED = [name.strip() for name in os.getenv("STEALTH_DISABLED", "").split(",") if name.strip()]  # 关闭的规避项
+STEALTH_BUNDLE_VERSION = 2  # 合并方式变化时递增，使缓存的脚本失效
+STEALTH_SHARED_SCRIPTS = 3  # enabled_scripts 开头的共享定义：opts 常量、utils、generate_magic_arrays
+
+_stealth_bundles = {}
+
+
+def stealth_config(disabled=None):
+    """按 STEALTH_DISABLED 构建 StealthConfig（项名即 StealthConfig 的布尔字段，如 chrome_csi,hairline）"""
+    disabled = STEALTH_DISABLED if disabled is None else disabled
+    unknown = [name for name in disabled if not isinstance(getattr(StealthConfig, name, None), bool)]
+    if unknown:
+        print(f"⚠️ 未知的 stealth 规避项，已忽略: {', '.join(unknown)}")
+    return StealthConfig(**{name: False for name in disabled if name not in unknown})
+
+
+def stealth_bundle(disabled=None):
+    """返回合并后的 stealth 初始化脚本及其版本号 (version, script)，同一配置只构建一次
+
+    各脚本共享 opts/utils 等顶层常量，合并后包在同一个函数作用域内，
+    避免这些辅助变量泄露到页面的全局作用域；每项伪装各自包在 try 中，
+    与逐个注入时一样，一项出错不影响后面的伪装。
+    """
+    key = tuple(sorted(STEALTH_DISABLED if disabled is None else disabled))
+    if key not in _stealth_bundles:
+        scripts = list(stealth_config(list(key)).enabled_scripts)
+        shared, evasions = scripts[:STEALTH_SHARED_SCRIPTS], scripts[STEALTH_SHARED_SCRIPTS:]
+        body = ";\n".join(shared + [f"try {{\n{script}\n}} catch (e) {{}}" for script in evasions])
+        digest = hashlib.sha256(body.encode("utf-8")).hexdigest()[:12]
+        version = f"v{STEALTH_BUNDLE_VERSION}-{digest}"
+        script = f"// stealth bundle {version}\n(() => {{\n{body};\n}})();\n"
+        _stealth_bundles[key] = (version, script)
+    return _stealth_bundles[key]
+
+
+async def apply_stealth(context, page, mode=STEALTH_MODE):
+    """按 STEALTH_MODE 应用 stealth：bundled 在上下文上注册一次，page 模式逐页注入"""
+    if mode == "page":
+        await stealth_async(page, stealth_config())
+        return "page"
+    if mode == "off":
+        return "off"
+    version, script = stealth_bundle()
+    await context.add_init_script(script=script)
+    return version
+
+
+# =====================================================================
+#                       页面事件桥模块
+# =====================================================================
+
+PAGE_EVENTS = os.getenv("PAGE_EVENTS", "true").lower() == "true"       # 是否启用页面事件桥（false 则沿用选择器等待）
+PAGE_EVENT_TIMEOUT = float(os.getenv("PAGE_EVENT_TIMEOUT", "5"))        # 等待页面结果事件的最长秒数
+PAGE_EVENT_BINDING = "__xsPageEvent"                                     # 暴露给页面的回调函数名
+
+# 已知的页面结果：文本包含任一 text 或存在任一 selector 即视为出现
+PAGE_OUTCOMES = {
+    "success": {"text": ["期限を延長しました"]},
+    "restriction": {"text": ["残り契約時間が24時間を切るまで"]},
+    "error": {"text": ["エラーが発生しました", "不正な操作", "有効期限が切れ"], "selector": [".errorMessage", ".alert-danger"]},
+    "auth_code": {"selector": ["input[name='auth_code']"]},
+}
+
+
+def page_event_script(outcomes=None):
+    """生成页面事件桥的初始化脚本
+
+    每个顶层文档在 DOMContentLoaded 时扫描一次，推送已出现的结果，随后推送
+    ready（附带已匹配的结果名）；之后由 MutationObserver 在DOM变化时重新扫描，
+    每种结果每个文档最多推送一次。
+    """
+    outcomes = json.dumps(outcomes or PAGE_OUTCOMES, ensure_ascii=False)
+    return f"""(() => {{
+  if (window !== window.top) return;
+  const emit = (name, detail) => window["{PAGE_EVENT_BINDING}"](name, detail);
+  const outcomes = {outcomes};
+  const reported = new Set();
+  const scan = () => {{
+    const text = document.body ? document.body.textContent || "" : "";
+    const matched = [];
+    for (const [name, rule] of Object.entries(outcomes)) {{
+      if (reported.has(name)) continue;
+      const hit = (rule.text || []).find((t) => text.includes(t))
+        || (rule.selector || []).find((s) => document.querySelector(s));
+      if (hit) {{
+        reported.add(name);
+        matched.push(name);
+        emit(name, hit);
+      }}
+    }}
+    return matched;
+  }};
+  let scheduled = false;
+  const rescan = () => {{
+    if (scheduled) return;
+    scheduled = true;
+    setTimeout(() => {{ scheduled = false; scan(); }}, 50);
+  }};
+  const start = () => {{
+    emit("ready", scan().join(","));
+    new MutationObserver(rescan).observe(document.documentElement,
+      {{childList: true, subtree: true, characterData: true}});
+  }};
+  if (document.readyState === "loading") document.addEventListener("DOMContentLoaded", start, {{once: true}});
+  else start();
+}})();
+"""
+
+
+class PageEvents:
+    """页面事件桥：接收初始化脚本推送的结果事件，步骤等待最先出现的结果
+
+    只保留当前主框架文档的事件（主框架导航时清空），
+    因此 wait_for 不会误用上一个页面的结果。
+    """
+
+    def __init__(self):
+        self.page = None
+        self.events = []     # 当前文档的事件: {"name", "detail", "matched", "url"}
+        self.waiters = []    # (事件名集合, future)
+
+    async def install(self, context):
+        """在上下文上注册回调和初始化脚本（须在创建页面前调用）"""
+        await context.expose_binding(PAGE_EVENT_BINDING, self._on_event)
+        await context.add_init_script(script=page_event_script())
+
+    def attach(self, page):
+        self.page = page
+        page.on("framenavigated", self._on_navigated)
+
+    def _on_navigated(self, frame):
+        if frame.parent_frame is None:
+            self.events.clear()
+
+    def _on_event(self, source, name, detail=""):
+        event = {
+            "name": name,
+            "detail": detail,
+            "matched": detail.split(",") if name == "ready" and detail else [],
+            "url": source["frame"].url,
+        }
+        self.events.append(event)
+        for names, future in self.waiters:
+            if name in names and not future.done():
+                future.set_result(event)
+
+    async def wait_for(self, names, timeout=PAGE_EVENT_TIMEOUT):
+        """返回当前文档中最先出现的指定事件，超时返回 None"""
+        event = next((e for e in self.events if e["name"] in names), None)
+        if event:
+            return event
+        waiter = (tuple(names), asyncio.get_running_loop().create_future())
+        self.waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.waiters.remove(waiter)
+
+
+# =====================================================================
+#                       静态资源缓存模块
+# =====================================================================
+
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", ".asset_cache")              # 静态资源磁盘缓存目录（为空则不缓存）
+ASSET_CACHE_MAX_MB = float(os.getenv("ASSET_CACHE_MAX_MB", "50"))          # 缓存总大小上限（MB），超出按LRU淘汰
+ASSET_CACHE_TYPES = {"stylesheet", "script", "image", "font"}              # 参与缓存的资源类型
+ASSET_CACHE_DEFAULT_TTL = 3600  # 响应未声明 max-age 时视为新鲜的秒数（过期后带 ETag 重新验证）
+
+# 回放缓存时不转发的响应头（正文已由 Playwright 解码）
+ASSET_SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "date", "set-cookie"}
+
+
+class AssetCache:
+    """按 URL 缓存静态资源的磁盘缓存，通过 context.route 拦截请求
+
+    新鲜的缓存直接回放，不访问网络；过期的缓存带 If-None-Match 重新验证，
+    服务器返回 304 时仍使用本地内容。索引记录 ETag、过期时间和最近使用
+    时间，总大小超过上限时淘汰最久未使用的条目。注意：注册路由后
+    Playwright 会关闭浏览器自身的HTTP缓存，同一次运行内的重复请求也由本缓存提供。
+    """
+
+    def __init__(self, cache_dir=ASSET_CACHE_DIR, max_mb=ASSET_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = self._load_index()
+        self.stats = {"hit": 0, "revalidated": 0, "miss": 0, "uncacheable": 0, "error": 0}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    @staticmethod
+    def cache_key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def max_age(headers):
+        """从 Cache-Control 解析可缓存秒数；no-store/private 返回 None"""
+        cache_control = headers.get("cache-control", "").lower()
+        if "no-store" in cache_control or "private" in cache_control:
+            return None
+        match = re.search(r"max-age=(\d+)", cache_control)
+        return int(match.group(1)) if match else ASSET_CACHE_DEFAULT_TTL
+
+    async def handle(self, route, request):
+        """context.route 的处理函数：非静态资源直接放行"""
+        if request.method != "GET" or request.resource_type not in ASSET_CACHE_TYPES:
+            await route.continue_()
+            return
+        
+        key = self.cache_key(request.url)
+        entry = self.index.get(key)
+        try:
+            body = None
+            if entry:
+                body = await asyncio.to_thread(self._read_body, key)
+            
+            if body is not None and entry["expires"] > time.time():
+                self.stats["hit"] += 1
+                entry["last_used"] = time.time()
+                await route.fulfill(status=200, headers=entry["headers"], body=body)
+                return
+            
+            headers = dict(request.headers)
+            if body is not None and entry.get("etag"):
+                headers["if-none-match"] = entry["etag"]
+            response = await route.fetch(headers=headers)
+            
+            if response.status == 304 and body is not None:
+                self.stats["revalidated"] += 1
+                entry["expires"] = time.time() + (self.max_age(response.headers) or 0)
+                entry["last_used"] = time.time()
+                await route.fulfill(status=200, headers=entry["headers"], body=body)
+                return
+            
+            body = await response.body()
+            ttl = self.max_age(response.headers)
+            if response.status == 200 and ttl is not None:
+                self.stats["miss"] += 1
+                await asyncio.to_thread(self._store, key, request.url, response.headers, body, ttl)
+            else:
+                self.stats["uncacheable"] += 1
+            await route.fulfill(response=response, body=body)
+        except Exception as e:
+            # 缓存出错不影响页面加载（路由已处理时再次放行会抛出，忽略即可）
+            self.stats["error"] += 1
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+            print(f"⚠️ 资源缓存出错（{request.url}）: {e}")
+
+    def _read_body(self, key):
+        try:
+            with open(self._body_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _store(self, key, url, headers, body, ttl):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(temp_path, self._body_path(key))
+        now = time.time()
+        self.index[key] = {
+            "url": url,
+            "etag": headers.get("etag"),
+            "headers": {k: v for k, v in headers.items() if k.lower() not in ASSET_SKIP_HEADERS},
+            "size": len(body),
+            "expires": now + ttl,
+            "last_used": now,
+        }
+
+    def save(self):
+        """合并磁盘上的索引（多进程共用同一目录），按LRU淘汰超出上限的条目后写回"""
+        if not self.cache_dir or not self.index:
+            return
+        try:
+            merged = self._load_index()
+            for key, entry in self.index.items():
+                if key not in merged or merged[key]["last_used"] <= entry["last_used"]:
+                    merged[key] = entry
+            
+            total = sum(entry["size"] for entry in merged.values())
+            for key in sorted(merged, key=lambda k: merged[k]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                total -= merged.pop(key)["size"]
+                try:
+                    os.unlink(self._body_path(key))
+                except OSError:
+                    pass
+            
+            self.index = merged
+            atomic_write(self.index_path, json.dumps(merged, ensure_ascii=False))
+        except Exception as e:
+            print(f"⚠️ 保存资源缓存索引失败: {e}")
+
+    def hit_rate(self):
+        """本地提供（新鲜命中 + 304重新验证）的比例"""
+        cacheable = self.stats["hit"] + self.stats["revalidated"] + self.stats["miss"]
+        return (self.stats["hit"] + self.stats["revalidated"]) / cacheable if cacheable else None
+
+    def report(self):
+        rate = self.hit_rate()
+        if rate is None:
+            return
+        size_mb = sum(entry["size"] for entry in self.index.values()) / 1024 / 1024
+        print(f"📦 资源缓存: 命中 {self.stats['hit']}，重新验证 {self.stats['revalidated']}，"
+              f"未命中 {self.stats['miss']}，命中率 {rate:.0%}（{len(self.index)} 个条目，{size_mb:.1f}MB）")
+
+
+# =====================================================================
+#                          运行状态模块
+# =====================================================================
+
+STATUS_PORT = int(os.getenv("STATUS_PORT", "0"))        # 状态查询服务端口（0为关闭）
+STATUS_HOST = os.getenv("STATUS_HOST", "127.0.0.1")
+STATUS_RESULTS_LIMIT = 20  # 保留最近N个账号结果
+
+
+class RunStatus:
+    """进程内的实时运行状态，供状态查询服务读取
+
+    写入方为登录流程（单账号）或多账号协调者线程，读取方为事件循环中的
+    HTTP 处理函数，所有读写都在锁内完成，快照只做浅拷贝，轮询开销很小。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.mode = RUN_MODE
+        self.accounts = {}   # 账号 -> {"step", "since", "state"}
+        self.last_step = None  # 最近一次进入的步骤（账号, 步骤），供慢回调日志定位
+        self.results = []    # 最近完成的账号结果
+        self.next_run = None # 下一次计划运行的时间戳
+        self.pool = {"workers": 0, "contexts_per_worker": 0, "active": 0}
+        self.queue = {"pending": 0, "total": 0}
+
+    def set_step(self, account, step):
+        with self.lock:
+            self.accounts[account] = {"step": step, "since": time.time(), "state": "running"}
+            self.last_step = (account, step)
+
+    def account_done(self, account, result):
+        with self.lock:
+            entry = self.accounts.setdefault(account, {"step": None, "since": time.time()})
+            entry.update(state="done", since=time.time())
+            self.results = (self.results + [result])[-STATUS_RESULTS_LIMIT:]
+
+    def update(self, **fields):
+        """更新 next_run / pool / queue 等字段（dict 字段按键合并）"""
+        with self.lock:
+            for key, value in fields.items():
+                current = getattr(self, key)
+                setattr(self, key, {**current, **value} if isinstance(current, dict) else value)
+
+    def adjust_active(self, delta):
+        """原子地增减占用中的上下文数（读改写在同一次加锁内完成）"""
+        with self.lock:
+            self.pool = {**self.pool, "active": max(0, self.pool["active"] + delta)}
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            accounts = {
+                account: {**entry, "elapsed": round(now - entry["since"], 1)}
+                for account, entry in self.accounts.items()
+            }
+            pool = dict(self.pool)
+            capacity = pool["workers"] * pool["contexts_per_worker"]
+            return {
+                "mode": self.mode,
+                "uptime": round(now - self.started_at, 1),
+                "accounts": accounts,
+                "results": list(self.results),
+                "schedule": {
+                    "next_run": self.next_run,
+                    "next_run_in": round(self.next_run - now, 1) if self.next_run else None,
+                },
+                "pool": {**pool, "utilization": round(pool["active"] / capacity, 2) if capacity else None},
+                "queue": dict(self.queue),
+            }
+
+
+class FleetStatusProxy:
+    """工作进程中的状态代理：把步骤变化和账号事件转发给协调者
+
+    Manager 队列的 put 是阻塞的进程间通信，不能直接在事件循环中调用；
+    事件先放入本地队列，由后台线程按顺序转发。
+    """
+
+    def __init__(self, events, worker_id):
+        self.events = events
+        self.worker_id = worker_id
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._forward, name=f"status-proxy-{worker_id}", daemon=True)
+        self.thread.start()
+
+    def _forward(self):
+        while True:
+            event = self.pending.get()
+            if event is None:
+                return
+            try:
+                self.events.put(event)
+            except Exception:
+                pass
+
+    def send(self, event):
+        """非阻塞地排队一个事件（与步骤事件保持先后顺序）"""
+        self.pending.put_nowait({"worker": self.worker_id, **event})
+
+    def set_step(self, account, step):
+        self.send({"type": "step", "account": account, "step": step})
+
+    def close(self):
+        """等待已排队的事件全部转发后停止后台线程"""
+        self.pending.put_nowait(None)
+        self.thread.join()
+
+
+RUN_STATUS = RunStatus()
+
+
+async def start_status_server(status=RUN_STATUS):
+    """按配置启动状态查询服务，未启用时返回 None"""
+    if not STATUS_PORT:
+        return None
+    
+    def section(name):
+        async def handler(request):
+            snapshot = status.snapshot()
+            return 200, snapshot if name is None else snapshot[name]
+        return handler
+    
+    async def health(request):
+        return 200, {"ok": True, "uptime": round(time.time() - status.started_at, 1)}
+    
+    try:
+        server = MiniHttpServer(STATUS_HOST, STATUS_PORT)
+        server.route("GET", "/health", health)
+        server.route("GET", "/status", section(None))
+        for name in ("accounts", "results", "schedule", "pool", "queue"):
+            server.route("GET", f"/status/{name}", section(name))
+        await server.start()
+        print(f"🩺 状态查询服务已启动: http://{STATUS_HOST}:{server.port}/status")
+        return server
+    except Exception as e:
+        print(f"⚠️ 状态查询服务启动失败: {e}")
+        return None
+
+
+# =====================================================================
+#                          性能剖析模块
+# =====================================================================
+
+PROFILING = os.getenv("PROFILING", "false").lower() == "true"            # 开启后剖析整个运行过程
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiling")                  # pstats / 折叠栈 / 慢回调输出目录
+PROFILING_SAMPLE_MS = float(os.getenv("PROFILING_SAMPLE_MS", "10"))      # 栈采样间隔（毫秒）
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "100"))           # 阻塞事件循环超过该时长的回调会被记录
+
+
+class SlowCallbackHandler(logging.Handler):
+    """接收 asyncio 调试模式的慢回调日志，附上当时所在的步骤"""
+
+    PATTERN = re.compile(r"Executing (.+) took ([\d.]+) seconds")
+
+    def __init__(self, status):
+        super().__init__(logging.WARNING)
+        self.status = status
+        self.records = []
+
+    def emit(self, record):
+        match = self.PATTERN.search(record.getMessage())
+        if not match:
+            return
+        account, step = self.status.last_step or (None, None)
+        entry = {
+            "time": round(time.time(), 3),
+            "ms": round(float(match.group(2)) * 1000, 1),
+            "step": step,
+            "account": account,
+            "callback": match.group(1)[:300],
+        }
+        self.records.append(entry)
+        print(f"🐢 事件循环被阻塞 {entry['ms']}毫秒（步骤: {step or '-'}）: {entry['callback'][:120]}")
+
+
+class RunProfiler:
+    """可选的运行剖析：cProfile + 线程栈采样 + asyncio 慢回调检测
+
+    输出到 PROFILING_DIR：
+    - <name>.pstats       cProfile 统计（python -m pstats / snakeviz 查看）
+    - <name>.collapsed    折叠栈（flamegraph.pl / speedscope 可直接读取，格式与 py-spy 相同）
+    - <name>.slow.json    阻塞事件循环的回调及其所在步骤
+    Playwright 驱动运行在独立的 node 进程中，其耗时在采样中表现为等待IO的栈。
+    """
+
+    def __init__(self, name="run", status=RUN_STATUS, output_dir=PROFILING_DIR):
+        self.name = name
+        self.output_dir = output_dir
+        self.profile = cProfile.Profile()
+        self.stacks = collections.Counter()
+        self.slow_handler = SlowCallbackHandler(status)
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+
+    def _sample(self):
+        """定期采样所有线程的调用栈（排除采样线程自身）"""
+        interval = PROFILING_SAMPLE_MS / 1000
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(f"thread:{names.get(thread_id, thread_id)}")
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def attach_loop(self, loop):
+        """开启事件循环的调试模式和慢回调检测"""
+        loop.set_debug(True)
+        loop.slow_callback_duration = SLOW_CALLBACK_MS / 1000
+
+    def start(self, loop=None):
+        if loop:
+            self.attach_loop(loop)
+        logging.getLogger("asyncio").addHandler(self.slow_handler)
+        self.sampler.start()
+        self.profile.enable()
+        print(f"🔬 性能剖析已开启（采样间隔 {PROFILING_SAMPLE_MS:g}毫秒，慢回调阈值 {SLOW_CALLBACK_MS:g}毫秒）")
+        return self
+
+    def stop(self):
+        self.profile.disable()
+        self.stop_event.set()
+        self.sampler.join(timeout=1)
+        logging.getLogger("asyncio").removeHandler(self.slow_handler)
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            base = os.path.join(self.output_dir, self.name)
+            self.profile.dump_stats(f"{base}.pstats")
+            atomic_write(f"{base}.collapsed", "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+            atomic_write(f"{base}.slow.json", json.dumps(self.slow_handler.records, ensure_ascii=False, indent=2))
+            print(f"🔬 剖析结果已写入 {base}.pstats / .collapsed / .slow.json"
+                  f"（{sum(self.stacks.values())} 个采样，{len(self.slow_handler.records)} 次慢回调）")
+            pstats.Stats(self.profile).sort_stats("cumulative").print_stats(15)
+        except Exception as e:
+            print(f"⚠️ 写入剖析结果失败: {e}")
 
-# XServer登录配置
-LOGIN_EMAIL = os.getenv("XSERVER_EMAIL")
-LOGIN_PASSWORD = os.getenv("XSERVER_PASSWORD")
-TARGET_URL = "https://secure.xserver.ne.jp/xapanel/login/xmgame"
 
 # =====================================================================
-#                      Cloudmail配置加载模块
+#                          报告输出模块
 # =====================================================================
 
-def load_cloud_mail_config():
-    """从环境变量加载cloudmail配置"""
-    cloud_mail_env = os.getenv("CLOUD_MAIL")
-    if cloud_mail_env:
+REPORT_DIR = os.getenv("REPORT_DIR", ".")                            # 报告输出目录
+REPORT_FORMATS = os.getenv("REPORT_FORMATS", "markdown,json,badge")  # 输出格式（逗号分隔）
+REPORT_HISTORY_LIMIT = int(os.getenv("REPORT_HISTORY_LIMIT", "30"))  # 保留最近N次运行记录
+
+# 各格式对应的输出文件
+REPORT_FILES = {
+    "markdown": "README.md",
+    "json": "status.json",
+    "badge": "status-badge.json",
+}
+REPORT_HISTORY_FILE = ".report_history.json"
+
+# 续期状态的展示样式: (README图标, 徽章颜色)
+STATUS_STYLES = {
+    "Success": ("✅", "brightgreen"),
+    "Unexpired": ("ℹ️", "blue"),
+    "Failed": ("❌", "red"),
+    "Unknown": ("❓", "lightgrey"),
+}
+
+
+def atomic_write(path, content):
+    """通过临时文件+重命名原子写入文件，避免崩溃时留下半截内容"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ReportWriter:
+    """从同一个结果对象输出 markdown / JSON / 状态徽章，并维护滚动运行历史
+
+    结果内容（忽略运行时间）与上次相同时跳过写入，避免每天产生无意义的提交。
+    """
+
+    def __init__(self, report_dir=REPORT_DIR, formats=REPORT_FORMATS, history_limit=REPORT_HISTORY_LIMIT):
+        self.report_dir = report_dir
+        self.formats = [fmt.strip() for fmt in formats.split(",") if fmt.strip() in REPORT_FILES]
+        self.history_limit = history_limit
+        self.history_path = os.path.join(report_dir, REPORT_HISTORY_FILE)
+
+    @staticmethod
+    def signature(result):
+        """结果的比较键：去掉运行时间后的内容"""
+        return json.dumps({k: v for k, v in result.items() if k != "run_time"}, sort_keys=True, ensure_ascii=False)
+
+    def render_markdown(self, result):
+        """渲染README.md内容（格式与工作流中的grep提取保持一致）"""
+        status = result["status"] if result["status"] in STATUS_STYLES else "Unknown"
+        icon = STATUS_STYLES[status][0]
+        
+        content = f"**最后运行时间**: `{result['run_time']}`\n\n"
+        content += "**运行结果**: <br>\n"
+        content += f"🖥️服务器：`{result['server']}`<br>\n"
+        content += f"📊续期结果：{icon}{status}<br>\n"
+        content += f"🕛️旧到期时间: `{result['old_expiry'] or 'Unknown'}`<br>\n"
+        if status == "Success":
+            content += f"🕡️新到期时间: `{result['new_expiry'] or 'Unknown'}`<br>\n"
+        if result.get("failure") and status != "Success":
+            content += f"🧩失败分类: `{result['failure']}`<br>\n"
+        if result.get("servers"):
+            content += "\n| 服务器 | 续期结果 | 旧到期时间 | 新到期时间 | 失败分类 |\n"
+            content += "|---|---|---|---|---|\n"
+            for server in result["servers"]:
+                server_icon = STATUS_STYLES.get(server["status"], STATUS_STYLES["Unknown"])[0]
+                content += (f"| {server['name']} | {server_icon}{server['status']} | {server['old_expiry'] or 'Unknown'} | "
+                            f"{server['new_expiry'] or '-'} | {server['failure'] or '-'} |\n")
+        return content
+
+    def render_json(self, result):
+        """渲染机器可读的状态JSON"""
+        return json.dumps(result, ensure_ascii=False, indent=2) + "\n"
+
+    def render_badge(self, result):
+        """渲染 shields.io endpoint 格式的状态徽章"""
+        status = result["status"] if result["status"] in STATUS_STYLES else "Unknown"
+        message = status
+        expiry = result["new_expiry"] if status == "Success" else result["old_expiry"]
+        if expiry:
+            message += f" · {expiry}"
+        badge = {
+            "schemaVersion": 1,
+            "label": "XServer GAME",
+            "message": message,
+            "color": STATUS_STYLES[status][1],
+        }
+        return json.dumps(badge, ensure_ascii=False) + "\n"
+
+    def load_history(self):
+        """读取滚动运行历史"""
         try:
-            config = json.loads(cloud_mail_env)
-            print("✅ 已从环境变量 CLOUD_MAIL 加载邮箱配置")
-            return config
-        except json.JSONDecodeError as e:
-            print(f"❌ CLOUD_MAIL 环境变量JSON解析失败: {e}")
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+            return history if isinstance(history, list) else []
+        except (OSError, ValueError):
+            return []
+
+    def load_previous(self, history):
+        """取上一次的结果：优先历史记录，其次已提交的 status.json"""
+        if history:
+            return history[-1]
+        try:
+            with open(os.path.join(self.report_dir, REPORT_FILES["json"]), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
             return None
-    else:
-        print("❌ 未找到 CLOUD_MAIL 环境变量")
-        return None
 
-# 加载并提取cloudmail配置
-CLOUD_MAIL_CONFIG = load_cloud_mail_config() or {}
-CLOUDMAIL_API_BASE_URL = CLOUD_MAIL_CONFIG.get("API_BASE_URL")
-CLOUDMAIL_EMAIL = CLOUD_MAIL_CONFIG.get("EMAIL")
-CLOUDMAIL_PASSWORD = CLOUD_MAIL_CONFIG.get("PASSWORD")
-CLOUDMAIL_JWT_SECRET = CLOUD_MAIL_CONFIG.get("JWT_SECRET")
-CLOUDMAIL_SEND_EMAIL = CLOUD_MAIL_CONFIG.get("SEND_EMAIL")
-CLOUDMAIL_TO_EMAIL = CLOUD_MAIL_CONFIG.get("TO_EMAIL")
-CLOUDMAIL_SUBJECT = CLOUD_MAIL_CONFIG.get("SUBJECT")
-CLOUDMAIL_LOCAL_FILTER = True  # 启用本地过滤（避免日文主题在API中识别失败）
+    def write(self, result):
+        """写入所有格式的报告，返回实际写入的文件列表"""
+        history = self.load_history()
+        previous = self.load_previous(history)
+        changed = previous is None or self.signature(previous) != self.signature(result)
+        
+        written = []
+        for fmt in self.formats:
+            path = os.path.join(self.report_dir, REPORT_FILES[fmt])
+            if not changed and os.path.exists(path):
+                continue
+            renderer = getattr(self, f"render_{fmt}")
+            atomic_write(path, renderer(result))
+            written.append(path)
+        
+        # 历史记录每次运行都追加，只保留最近N条
+        history.append(result)
+        atomic_write(self.history_path, json.dumps(history[-self.history_limit:], ensure_ascii=False, indent=2))
+        
+        return written
+
+
+FLEET_REPORT_FILES = {
+    "markdown": "FLEET_REPORT.md",
+    "json": "fleet_report.json",
+}
+
+
+def write_fleet_report(results, summary, report_dir=REPORT_DIR):
+    """写入多账号运行的汇总报告（markdown表格 + JSON）"""
+    try:
+        rows = sorted(results, key=lambda r: r["account"])
+        content = f"**最后运行时间**: `{datetime.datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S')}`\n\n"
+        content += f"**账号数**: {summary['accounts']}，**耗时**: {summary['elapsed']}秒，"
+        content += f"**吞吐**: {summary['throughput_per_min']} 个/分钟，"
+        content += f"**2FA跳过**: {summary['twofa_skipped']}/{summary['login_attempts']}\n\n"
+        content += "| 账号 | 续期结果 | 旧到期时间 | 新到期时间 | 失败分类 | 耗时(秒) |\n"
+        content += "|---|---|---|---|---|---|\n"
+        for r in rows:
+            icon = STATUS_STYLES.get(r["status"], STATUS_STYLES["Unknown"])[0]
+            content += (f"| {r['account']} | {icon}{r['status']} | {r['old_expiry'] or 'Unknown'} | "
+                        f"{r['new_expiry'] or '-'} | {r['failure'] or '-'} | {r['duration']} |\n")
+        
+        atomic_write(os.path.join(report_dir, FLEET_REPORT_FILES["markdown"]), content)
+        atomic_write(os.path.join(report_dir, FLEET_REPORT_FILES["json"]),
+                     json.dumps({"summary": summary, "results": rows}, ensure_ascii=False, indent=2) + "\n")
+        print(f"✅ 多账号报告已写入: {', '.join(FLEET_REPORT_FILES.values())}")
+    except Exception as e:
+        print(f"❌ 写入多账号报告失败: {e}")
+
 
 # =====================================================================
 #                        XServer 自动登录类
@@ -71,37 +1667,80 @@ CLOUDMAIL_LOCAL_FILTER = True  # 启用本地过滤（避免日文主题在API
 class XServerAutoLogin:
     """XServer GAME 自动登录主类 - Playwright版本"""
     
-    def __init__(self):
+    def __init__(self, email=None, password=None, cloud_mail_config=None,
+                 shared_browser=None, rate_limiter=None, write_report=True, asset_cache=None,
+                 code_webhook=None, status=None, lease_guard=None):
         """
         初始化 XServer GAME 自动登录器
-        使用配置区域的设置
+        默认使用配置区域的设置；多账号运行时可传入单个账号的凭据和邮箱配置，
+        以及共享的浏览器实例、全局限速器和进程内共用的资源缓存；
+        传入 code_webhook 时优先等待推送的验证码；status 接收当前步骤（默认为进程内的 RUN_STATUS）；
+        lease_guard 为队列模式下的租约确认协程，最终提交前调用，返回假值时放弃提交
         """
+        self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
-        self.headless = USE_HEADLESS
-        self.email = LOGIN_EMAIL
-        self.password = LOGIN_PASSWORD
+        self.page_events = None               # 页面事件桥（PAGE_EVENTS=false 时为 None）
+        self.shared_browser = shared_browser  # 多账号运行时共享的浏览器（只创建上下文）
+        self.rate_limiter = rate_limiter      # 全局限速器（多账号运行时跨进程共享）
+        self.write_report = write_report      # 是否写入README等报告文件
+        self.owns_asset_cache = asset_cache is None and bool(ASSET_CACHE_DIR)
+        self.asset_cache = AssetCache() if self.owns_asset_cache else asset_cache  # 静态资源磁盘缓存
+        self.code_webhook = code_webhook      # 验证码推送接收器（未启用时为 None）
+        self.status = status or RUN_STATUS    # 实时运行状态
+        self.lease_guard = lease_guard        # 队列任务的租约确认（非队列模式为 None）
+        self.current_step = None
+        self.launch_options = launch_options()
+        self.headless = self.launch_options["headless"]
+        self.email = email or LOGIN_EMAIL
+        self.password = password or LOGIN_PASSWORD
         self.target_url = TARGET_URL
         self.wait_timeout = WAIT_TIMEOUT
         self.page_load_delay = PAGE_LOAD_DELAY
         self.screenshot_count = 0  # 截图计数器
+        self.artifacts = ArtifactStore(label=account_key(self.email)[:8])  # 本次运行的截图等产物
+        self.selectors = SelectorRegistry()  # 选择器注册表
+        self.profiles = ProfileStore()       # 按账号持久化的浏览器档案
+        self.fingerprint = dict(DEFAULT_FINGERPRINT)
         
         # 邮箱API配置
-        self.cloudmail_api_base_url = CLOUDMAIL_API_BASE_URL
-        self.cloudmail_email = CLOUDMAIL_EMAIL
-        self.cloudmail_password = CLOUDMAIL_PASSWORD
-        self.cloudmail_jwt_secret = CLOUDMAIL_JWT_SECRET
-        self.cloudmail_send_email = CLOUDMAIL_SEND_EMAIL
-        self.cloudmail_to_email = CLOUDMAIL_TO_EMAIL
-        self.cloudmail_subject = CLOUDMAIL_SUBJECT
+        mail_config = CLOUD_MAIL_CONFIG if cloud_mail_config is None else cloud_mail_config
+        self.cloudmail_api_base_url = mail_config.get("API_BASE_URL")
+        self.cloudmail_email = mail_config.get("EMAIL")
+        self.cloudmail_password = mail_config.get("PASSWORD")
+        self.cloudmail_jwt_secret = mail_config.get("JWT_SECRET")
+        self.cloudmail_send_email = mail_config.get("SEND_EMAIL")
+        self.cloudmail_to_email = mail_config.get("TO_EMAIL")
+        self.cloudmail_subject = mail_config.get("SUBJECT")
+        self.cloudmail_fields = mail_config.get("FIELDS", CLOUDMAIL_FIELDS)
         self.cloudmail_local_filter = CLOUDMAIL_LOCAL_FILTER
+        self.unfiltered_checked = False  # 本次运行是否已用不带主题的查询确认过API过滤
+        self.subject_key = normalize_subject(self.cloudmail_subject)
         
         # 续期状态跟踪
         self.old_expiry_time = None      # 原到期时间
+        self.remaining_time = None       # 剩余时间（原始文本）
+        self.remaining_minutes = None    # 剩余时间（分钟）
+        self.session_reused = False      # 是否复用了已有会话
+        self.twofa_triggered = False     # 本次登录是否触发了新环境验证
+        self.profile_loaded = False      # 是否加载了已保存的浏览器档案
+        self.logged_in = False           # 是否已成功进入管理面板（成功后才保存档案）
         self.new_expiry_time = None      # 新到期时间
         self.renewal_status = "Unknown"  # 续期状态: Success/Unexpired/Failed/Unknown
-    
+        self.server_results = []         # 多服务器账号的逐台续期结果
+
+        # cloudmail 并发预取状态
+        self.cloudmail_token = None      # 缓存的邮箱API Token
+        self.mail_baseline_ids = set()   # 发送验证码前已存在的验证码邮件ID
+        self.code_sent_at = None         # 点击发送验证码的时间戳
+        self.code_future = None          # 等待推送验证码的 future
+        self.graph = None                # 当前运行的任务依赖图
+        
+        # 失败分类跟踪
+        self.failures = []               # 所有步骤失败记录
+        self.last_failure = None         # 最近一次失败记录
+
     
     # =================================================================
     #                       1. 浏览器管理模块
@@ -110,49 +1749,73 @@ class XServerAutoLogin:
     async def setup_browser(self):
         """设置并启动 Playwright 浏览器"""
         try:
-            playwright = await async_playwright().start()
-            
-            # 配置浏览器选项
-            browser_args = [
-                '--no-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-gpu',
-                '--disable-notifications',
-                '--window-size=1920,1080',
-                '--lang=ja-JP',
-                '--accept-lang=ja-JP,ja,en-US,en'
-            ]
-            
-            # 启动浏览器
-            self.browser = await playwright.chromium.launch(
-                headless=self.headless,
-                args=browser_args
-            )
+            if self.shared_browser:
+                # 复用共享浏览器，只创建独立的上下文
+                self.browser = self.shared_browser
+            else:
+                self.playwright = await async_playwright().start()
+                
+                # 启动浏览器（按 BROWSER_PROFILE 选择完整或精简配置）
+                self.browser = await self.playwright.chromium.launch(**self.launch_options)
+            
+            # 加载账号档案：沿用保存的指纹和设备Cookie，避免被识别为新环境
+            profile = self.profiles.load(self.email)
+            storage_state = None
+            if profile:
+                self.fingerprint = profile["fingerprint"]
+                storage_state = profile["storage_state"]
+                self.profile_loaded = True
+                print(f"🗂️ 已加载浏览器档案（保存于 {profile.get('saved_at', '未知')}）")
             
             # 创建浏览器上下文
             self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                locale='ja-JP',
-                timezone_id='Asia/Tokyo',
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+                storage_state=storage_state,
+                **{**self.fingerprint, **context_overrides()}
             )
             
+            # 静态资源走磁盘缓存，跨运行复用
+            if self.asset_cache:
+                await self.context.route("**/*", self.asset_cache.handle)
+            
+            # 应用stealth插件（bundled 模式在上下文上注册，须在创建页面前完成）
+            if STEALTH_MODE != "page":
+                stealth_version = await apply_stealth(self.context, None)
+            
+            # 页面事件桥：结果文本出现时由页面主动推送，无需逐个等待超时
+            if PAGE_EVENTS:
+                self.page_events = PageEvents()
+                await self.page_events.install(self.context)
+            
             # 创建页面
             self.page = await self.context.new_page()
+            if self.page_events:
+                self.page_events.attach(self.page)
             
-            # 应用stealth插件
-            await stealth_async(self.page)
-            print("✅ Stealth 插件已应用")
+            if STEALTH_MODE == "page":
+                stealth_version = await apply_stealth(self.context, self.page)
+            print(f"✅ Stealth 插件已应用（{stealth_version}）")
             
             print("✅ Playwright 浏览器初始化成功")
             return True
             
         except Exception as e:
             print(f"❌ Playwright 浏览器初始化失败: {e}")
+            self._record_failure("setup_browser", e)
             return False
     
+    async def rate_limit(self, name):
+        """在访问外部服务前申请全局限速配额（未配置限速器时直接返回）"""
+        if self.rate_limiter:
+            await self.rate_limiter.acquire(name)
+    
+    async def pause(self, seconds):
+        """固定等待（按 DELAY_SCALE 缩放，便于在本地模拟面板上压测）"""
+        await asyncio.sleep(seconds * DELAY_SCALE)
+    
     async def take_screenshot(self, step_name=""):
-        """截图功能 - 用于可视化调试"""
+        """截图功能 - 用于可视化调试（ENABLE_SCREENSHOTS=false 时跳过）"""
+        if not ENABLE_SCREENSHOTS:
+            return
         try:
             if self.page:
                 self.screenshot_count += 1
@@ -164,8 +1827,9 @@ class XServerAutoLogin:
                 # 确保文件名安全
                 filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
                 
-                await self.page.screenshot(path=filename, full_page=True)
-                print(f"📸 截图已保存: {filename}")
+                path = self.artifacts.path(filename)
+                await self.page.screenshot(path=path, full_page=True)
+                print(f"📸 截图已保存: {path}")
                 
         except Exception as e:
             print(f"⚠️ 截图失败: {e}")
@@ -174,21 +1838,43 @@ class XServerAutoLogin:
         """验证配置信息"""
         if not self.email or not self.password:
             print("❌ 邮箱或密码未设置！")
+            self._record_failure("validate_config", StepError("config", "邮箱或密码未设置"))
             return False
         
         print("✅ 配置信息验证通过")
         return True
     
+    async def save_profile(self):
+        """登录成功后保存浏览器档案（包含设备Cookie）"""
+        if not self.logged_in or not self.context:
+            return
+        try:
+            storage_state = await self.context.storage_state()
+            if self.profiles.save(self.email, storage_state, self.fingerprint):
+                print(f"🗂️ 浏览器档案已保存（{len(storage_state.get('cookies', []))} 个Cookie）")
+        except Exception as e:
+            print(f"⚠️ 保存浏览器档案失败: {e}")
+    
     async def cleanup(self):
-        """清理资源"""
+        """清理资源（自行启动的 Playwright 驱动进程也一并停止，实例可重复使用）"""
         try:
             if self.context:
                 await self.context.close()
-            if self.browser:
+            if self.browser and not self.shared_browser:
                 await self.browser.close()
             print("🧹 浏览器已关闭")
         except Exception as e:
             print(f"⚠️ 清理资源时出错: {e}")
+        finally:
+            if self.playwright:
+                try:
+                    await self.playwright.stop()
+                except Exception as e:
+                    print(f"⚠️ 停止 Playwright 时出错: {e}")
+            self.playwright = None
+            self.browser = None
+            self.context = None
+            self.page = None
     
     # =================================================================
     #                       2. 页面导航模块
@@ -198,7 +1884,10 @@ class XServerAutoLogin:
         """导航到登录页面"""
         try:
             print(f"🌐 正在访问: {self.target_url}")
-            await self.page.goto(self.target_url, wait_until='load')
+            response = await self.page.goto(self.target_url, wait_until='load')
+            # page.goto 不会因 5xx 抛出异常，需自行检查状态码，才能触发 server_error 重试
+            if response and response.status >= 500:
+                raise StepError("server_error", f"登录页返回 HTTP {response.status}")
             
             # 等待页面加载
             await self.page.wait_for_selector("body", timeout=self.wait_timeout)
@@ -209,7 +1898,40 @@ class XServerAutoLogin:
             
         except Exception as e:
             print(f"❌ 导航失败: {e}")
+            self._record_failure("navigate_to_login", e)
+            return False
+    
+    
+    async def navigate_direct(self, page_key):
+        """直接加载 PAGE_URLS 中的目标页面
+        
+        会话允许时省去中间的点击和固定等待；被重定向时返回原页面并返回 False，
+        由调用方回退到点击导航。
+        """
+        if not DIRECT_NAVIGATION:
             return False
+        
+        target_url = PAGE_URLS[page_key]
+        origin_url = self.page.url
+        try:
+            print(f"⚡ 直接访问: {target_url}")
+            await self.page.goto(target_url, wait_until='load')
+            
+            if target_url in self.page.url:
+                print(f"✅ 已直接到达: {page_key}")
+                return True
+            
+            print(f"↩️ 直接访问被重定向到 {self.page.url}，回退到点击导航")
+        except Exception as e:
+            print(f"⚠️ 直接访问 {page_key} 失败: {e}，回退到点击导航")
+        
+        # 返回原页面，保证点击导航的起点不变
+        try:
+            if origin_url and self.page.url != origin_url:
+                await self.page.goto(origin_url, wait_until='load')
+        except Exception as e:
+            print(f"⚠️ 返回原页面失败: {e}")
+        return False
     
     
     # =================================================================
@@ -222,34 +1944,32 @@ class XServerAutoLogin:
             print("🔍 正在查找登录表单...")
             
             # 等待页面加载完成
-            await asyncio.sleep(self.page_load_delay)
+            await self.pause(self.page_load_delay)
             
             # 查找邮箱输入框
-            email_selector = "input[name='memberid']"
-            await self.page.wait_for_selector(email_selector, timeout=self.wait_timeout)
+            email_selector, _ = await self.selectors.wait_for(self.page, "login.email", self.wait_timeout)
             print("✅ 找到邮箱输入框")
 
             # 查找密码输入框
-            password_selector = "input[name='user_password']"
-            await self.page.wait_for_selector(password_selector, timeout=self.wait_timeout)
+            password_selector, _ = await self.selectors.wait_for(self.page, "login.password", self.wait_timeout)
             print("✅ 找到密码输入框")
 
             # 查找登录按钮
-            login_button_selector = "input[value='ログインする']"
-            await self.page.wait_for_selector(login_button_selector, timeout=self.wait_timeout)
+            login_button_selector, _ = await self.selectors.wait_for(self.page, "login.submit", self.wait_timeout)
             print("✅ 找到登录按钮")
             
             return email_selector, password_selector, login_button_selector
             
         except Exception as e:
             print(f"❌ 查找登录表单时出错: {e}")
+            self._record_failure("find_login_form", e)
             return None, None, None
     
     async def human_type(self, selector, text):
         """模拟人类输入行为"""
         for char in text:
-            await self.page.type(selector, char, delay=100)  # 100ms delay between characters
-            await asyncio.sleep(0.05)  # Additional small delay
+            await self.page.type(selector, char, delay=100 * DELAY_SCALE)  # 100ms delay between characters
+            await self.pause(0.05)  # Additional small delay
     
     async def perform_login(self):
         """执行登录操作"""
@@ -270,7 +1990,7 @@ class XServerAutoLogin:
             print("✅ 邮箱已填写")
             
             # 等待一下，模拟人类思考时间
-            await asyncio.sleep(2)
+            await self.pause(2)
             
             # 模拟人类行为：慢速输入密码
             await self.page.fill(password_selector, "")  # 清空
@@ -278,7 +1998,7 @@ class XServerAutoLogin:
             print("✅ 密码已填写")
             
             # 等待一下，模拟人类操作
-            await asyncio.sleep(2)
+            await self.pause(2)
             
             # 提交表单
             if login_button_selector:
@@ -291,11 +2011,12 @@ class XServerAutoLogin:
             print("✅ 登录表单已提交")
             
             # 等待页面响应
-            await asyncio.sleep(5)
+            await self.pause(5)
             return True
             
         except Exception as e:
             print(f"❌ 登录操作失败: {e}")
+            self._record_failure("perform_login", e)
             return False
     
     
@@ -310,38 +2031,47 @@ class XServerAutoLogin:
             await self.take_screenshot("checking_verification_page")
             
             # 等待页面稳定
-            await asyncio.sleep(3)
+            await self.pause(3)
             
             current_url = self.page.url
             print(f"📍 当前URL: {current_url}")
             
             # 检查是否跳转到验证页面
             if "loginauth/index" in current_url:
+                self.twofa_triggered = True
                 print("🔐 检测到XServer新环境验证页面！")
                 print("⚠️ 这是XServer的安全机制，检测到新环境登录")
                 
                 # 查找发送验证码按钮
                 print("🔍 正在查找发送验证码按钮...")
-                selector = "input[value*='送信']"
-                
                 try:
-                    await self.page.wait_for_selector(selector, timeout=self.wait_timeout)
+                    selector, _ = await self.selectors.wait_for(self.page, "auth.send_code", self.wait_timeout)
                     print("✅ 找到发送验证码按钮")
+                    await self.rate_limit("2fa_send")
+                    if self.code_webhook:
+                        # 点击前注册等待，避免推送先于注册到达
+                        self.code_future = self.code_webhook.expect(
+                            self.cloudmail_to_email, self._code_from_pushed_mail, since=time.time())
                     print("📧 点击发送验证码按钮，验证码将发送到您的邮箱")
                     await self.page.click(selector)
+                    self.code_sent_at = time.time()
                     print("✅ 已点击发送验证码按钮")
                 except Exception as e:
                     print(f"❌ 查找发送验证码按钮失败: {e}")
                     return False
                 
-                # 等待跳转到验证码输入页面
-                await asyncio.sleep(5)
+                # 等待跳转到验证码输入页面（事件桥在输入框出现时即返回）
+                if self.page_events:
+                    await self.page_events.wait_for(("auth_code", "error"), max(PAGE_EVENT_TIMEOUT, self.wait_timeout / 1000))
+                else:
+                    await self.pause(5)
                 return await self.handle_code_input_page()
             
             return True
             
         except Exception as e:
             print(f"❌ 处理验证页面时出错: {e}")
+            self._record_failure("handle_verification_page", e)
             return False
     
     async def handle_code_input_page(self):
@@ -357,10 +2087,8 @@ class XServerAutoLogin:
                 
                 # 查找验证码输入框
                 print("🔍 正在查找验证码输入框...")
-                code_input_selector = "input[id='auth_code'][name='auth_code']"
-                
                 try:
-                    await self.page.wait_for_selector(code_input_selector, timeout=self.wait_timeout)
+                    await self.selectors.wait_for(self.page, "auth.code_input", self.wait_timeout)
                     print("✅ 找到验证码输入框")
                     
                     # 自动从cloudmail API获取验证码
@@ -390,126 +2118,227 @@ class XServerAutoLogin:
             print(f"🔑 正在输入验证码: {verification_code}")
             
             # 等待页面稳定
-            await asyncio.sleep(2)
+            await self.pause(2)
             
             # 查找验证码输入框
-            code_input_selector = "input[id='auth_code'][name='auth_code']"
+            code_input_selector, _ = await self.selectors.wait_for(self.page, "auth.code_input", self.wait_timeout)
             
             # 清空并输入验证码
             await self.page.fill(code_input_selector, "")
-            await asyncio.sleep(1)
+            await self.pause(1)
             await self.human_type(code_input_selector, verification_code)
             print("✅ 验证码已输入")
             
             # 等待输入完成
-            await asyncio.sleep(2)
+            await self.pause(2)
             
             # 查找并点击登录按钮
             print("🔍 正在查找ログイン按钮...")
-            login_submit_selector = "input[type='submit'][value='ログイン']"
-            await self.page.wait_for_selector(login_submit_selector, timeout=self.wait_timeout)
+            login_submit_selector, _ = await self.selectors.wait_for(self.page, "auth.submit", self.wait_timeout)
             print("✅ 找到ログイン按钮")
             
             # 等待按钮可点击
-            await asyncio.sleep(1)
+            await self.pause(1)
             await self.page.click(login_submit_selector)
             print("✅ 验证码已提交")
             
             # 等待验证结果
-            await asyncio.sleep(8)
+            await self.pause(8)
             return True
             
         except Exception as e:
             print(f"❌ 输入验证码失败: {e}")
+            self._record_failure("input_verification_code", e)
             await self.take_screenshot("verification_input_failed")
             return False
     
     async def get_verification_code_from_cloudmail(self):
-        """从cloudmail API获取验证码"""
-        try:
-            print("📧 开始从cloudmail API获取验证码...")
-            
-            # 等待邮件发送（验证码邮件需要时间）
+        """从cloudmail API获取验证码（邮件未到达时按重试策略轮询）"""
+        # 推送模式：验证码邮件到达即返回，超时后回退到轮询
+        if self.code_future:
+            print(f"📮 等待验证码推送（最多{CODE_WEBHOOK_TIMEOUT:g}秒）...")
+            try:
+                verification_code = await asyncio.wait_for(asyncio.shield(self.code_future), CODE_WEBHOOK_TIMEOUT)
+                print(f"🎉 收到推送的验证码: {verification_code}")
+                return verification_code
+            except asyncio.TimeoutError:
+                print("⚠️ 未收到推送，回退到轮询cloudmail")
+        
+        print("📧 开始从cloudmail API获取验证码...")
+        
+        # 等待邮件发送（验证码邮件需要时间；已等待过推送时跳过）
+        if not self.code_future:
             print("⏰ 等待验证码邮件发送（15秒）...")
-            await asyncio.sleep(15)
-            
-            # 步骤1：获取Token
-            print("🔑 正在获取邮箱API Token...")
-            token_result = self._get_mail_api_token()
-            
-            if token_result.get("code") != 200:
-                print(f"❌ Token获取失败: {token_result.get('message')}")
-                return None
-            
-            token = token_result.get("data", {}).get("token")
-            print("✅ Token获取成功")
-            
-            # 步骤2：查询邮件列表
-            print(f"📬 正在查询邮箱 {self.cloudmail_to_email} 的最新验证码邮件...")
-            
-            # 根据LOCAL_FILTER决定是否在API中过滤主题
-            if self.cloudmail_local_filter:
-                # 本地过滤：不传递主题到API，获取所有邮件后在本地过滤
-                mail_result = self._get_mail_list(
-                    token=token,
-                    target_email=self.cloudmail_to_email,
-                    sender_email=self.cloudmail_send_email,
-                    subject=None
-                )
-            else:
-                # API过滤：直接在API请求中过滤主题
-                mail_result = self._get_mail_list(
-                    token=token,
-                    target_email=self.cloudmail_to_email,
-                    sender_email=self.cloudmail_send_email,
-                    subject=self.cloudmail_subject
-                )
-            
+            await self.pause(15)
+        
+        verification_code = await self.run_step("fetch_verification_code", self._fetch_verification_code_once)
+        return verification_code or None
+    
+    async def _fetch_verification_code_once(self):
+        """单次查询cloudmail并提取验证码，失败时抛出带分类的 StepError"""
+        # 步骤1：获取Token（优先复用登录期间并发预取的Token）
+        if self.graph and "cloudmail_prefetch" in self.graph.tasks:
+            await self.graph.wait("cloudmail_prefetch")
+        token = self.cloudmail_token or await self._request_cloudmail_token()
+        
+        # 步骤2：逐页查询邮件列表，找到第一封新的验证码邮件即停止翻页
+        print(f"📬 正在查询邮箱 {self.cloudmail_to_email} 的最新验证码邮件...")
+        latest_mail = await self.find_code_mail(token)
+        
+        if latest_mail is None and self._should_check_unfiltered():
+            # API主题过滤迟迟没有结果时，用不带主题的查询确认一次，避免API端匹配失败导致一直等待；
+            # 每次运行只确认一次，结果沿用到之后的轮询，不让每次轮询的请求数翻倍
+            self.unfiltered_checked = True
+            latest_mail = await self.find_code_mail(token, api_filter=False)
+            if latest_mail is not None:
+                print("⚠️ API主题过滤未命中，后续改为本地过滤")
+                self.cloudmail_local_filter = True
+        
+        if latest_mail is None:
+            print(f"❌ 未找到主题为 '{self.cloudmail_subject}' 的新邮件")
+            raise StepError("mail_pending", f"未找到主题为 '{self.cloudmail_subject}' 的新邮件")
+        
+        # 步骤3：只保留最新的一封邮件
+        latest_mail = [latest_mail]
+        print(f"✅ 找到最新验证码邮件")
+        
+        # 步骤4：保存到JSON文件
+        json_filename = self._save_mail_to_json(latest_mail)
+        print(f"💾 邮件已保存到: {json_filename}")
+        
+        # 步骤5：从JSON文件读取并提取验证码，随后立即删除含完整邮件正文的文件
+        try:
+            verification_code = self._extract_code_from_json(json_filename)
+        finally:
+            self._purge_mail_dump(json_filename)
+        
+        if verification_code:
+            print(f"🎉 成功提取验证码: {verification_code}")
+            return verification_code
+        
+        print("❌ 未能从邮件中提取验证码")
+        raise StepError("page_changed", "邮件格式与预期不符，未能提取验证码")
+    
+    def _should_check_unfiltered(self):
+        """是否该用不带主题的查询确认API过滤：未确认过，且邮件应已送达（发送验证码已超过一段时间）"""
+        if self.cloudmail_local_filter or self.unfiltered_checked:
+            return False
+        return self.code_sent_at is None or time.time() - self.code_sent_at >= CLOUDMAIL_UNFILTERED_CHECK_AFTER
+    
+    async def iter_mails(self, token, api_filter=True, max_pages=CLOUDMAIL_MAX_PAGES):
+        """按时间倒序逐页流式返回邮件（异步生成器）
+
+        调用方找到目标邮件后停止迭代即不再请求后续页面；翻到基线快照中的邮件
+        （发送验证码前已存在）、最后一页或达到 max_pages 时自动结束。没有基线时
+        才按 createTime 判断是否已早于发送时刻，createTime 的时区由 CLOUDMAIL_TIMEZONE 指定。
+        """
+        subject = self.cloudmail_subject if api_filter and not self.cloudmail_local_filter else None
+        for page in range(1, max_pages + 1):
+            await self.rate_limit("cloudmail")
+            mail_result = await asyncio.to_thread(
+                self._get_mail_list,
+                token=token,
+                target_email=self.cloudmail_to_email,
+                sender_email=self.cloudmail_send_email,
+                subject=subject,
+                page=page,
+            )
             if mail_result.get("code") != 200:
                 print(f"❌ 邮件查询失败: {mail_result.get('message')}")
-                return None
+                self.cloudmail_token = None  # Token可能已失效，重试时重新获取
+                raise StepError(mail_result.get("category", "unknown"), f"邮件查询失败: {mail_result.get('message')}")
             
-            # 步骤3：提取邮件列表
             data_content = mail_result.get("data", [])
             mail_list = data_content if isinstance(data_content, list) else data_content.get("list", [])
-            
-            if not mail_list:
-                print("❌ 未找到邮件")
-                return None
-            
-            # 步骤4：过滤XServer验证码邮件（精确匹配主题）
-            xserver_mails = [
-                mail for mail in mail_list 
-                if mail.get('subject', '').strip() == self.cloudmail_subject
-            ]
-            
-            if not xserver_mails:
-                print(f"❌ 未找到主题为 '{self.cloudmail_subject}' 的邮件")
-                return None
-            
-            # 步骤5：只保留最新的一封邮件
-            latest_mail = [xserver_mails[0]]
-            print(f"✅ 找到最新验证码邮件")
-            
-            # 步骤6：保存到JSON文件
-            json_filename = self._save_mail_to_json(latest_mail)
-            print(f"💾 邮件已保存到: {json_filename}")
-            
-            # 步骤7：从JSON文件读取并提取验证码
-            verification_code = self._extract_code_from_json(json_filename)
-            
-            if verification_code:
-                print(f"🎉 成功提取验证码: {verification_code}")
-                return verification_code
+            for mail in mail_list:
+                if self.mail_baseline_ids:
+                    if self._mail_id(mail) in self.mail_baseline_ids:
+                        return  # 之后的邮件都在发送验证码之前就已存在
+                elif self.code_sent_at:
+                    sent_time = self._mail_time(mail)
+                    if sent_time and sent_time < self.code_sent_at - MAIL_CLOCK_SKEW:
+                        return  # 之后的邮件都早于发送验证码的时刻
+                yield mail
+            
+            if len(mail_list) < CLOUDMAIL_PAGE_SIZE:
+                return
+    
+    async def find_code_mail(self, token, api_filter=True):
+        """返回第一封晚于发送时刻、且不在基线快照中的验证码邮件，没有则返回 None"""
+        async for mail in self.iter_mails(token, api_filter=api_filter):
+            if self._is_code_mail(mail) and self._mail_id(mail) not in self.mail_baseline_ids:
+                return mail
+        return None
+    
+    def _code_from_pushed_mail(self, mail):
+        """从推送的邮件中取出验证码；不是发给本账号邮箱的新验证码邮件时返回 None
+
+        直接推送的 code 字段同样要经过收件人、主题和基线快照校验，
+        过期或其他来源的推送不会被当作本次的验证码。
+        """
+        if not self.cloudmail_to_email or (mail.get("toEmail") or "").lower() != self.cloudmail_to_email.lower():
+            return None
+        if not self._is_code_mail(mail):
+            return None
+        if self._mail_id(mail) and self._mail_id(mail) in self.mail_baseline_ids:
+            return None
+        if mail.get("code"):
+            return str(mail["code"])
+        return self._extract_verification_code(mail.get("text") or mail.get("content") or "")
+    
+    def _is_code_mail(self, mail):
+        """按规范化后的主题判断是否为验证码邮件"""
+        return normalize_subject(mail.get("subject")) == self.subject_key
+    
+    def _mail_time(self, mail):
+        """解析邮件的 createTime（时区为 CLOUDMAIL_TIMEZONE，默认UTC），失败时返回 None"""
+        try:
+            created = datetime.datetime.strptime(mail.get("createTime", ""), "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            return None
+        return created.replace(tzinfo=timezone(timedelta(hours=CLOUDMAIL_TIMEZONE))).timestamp()
+    
+    async def _request_cloudmail_token(self):
+        """获取并缓存邮箱API Token"""
+        print("🔑 正在获取邮箱API Token...")
+        await self.rate_limit("cloudmail")
+        token_result = await asyncio.to_thread(self._get_mail_api_token)
+        
+        if token_result.get("code") != 200:
+            print(f"❌ Token获取失败: {token_result.get('message')}")
+            raise StepError(token_result.get("category", "auth"), f"Token获取失败: {token_result.get('message')}")
+        
+        self.cloudmail_token = token_result.get("data", {}).get("token")
+        print("✅ Token获取成功")
+        return self.cloudmail_token
+    
+    async def prefetch_cloudmail(self):
+        """登录期间并发获取Token，并记录现有验证码邮件作为基线快照"""
+        if not self.cloudmail_api_base_url:
+            print("ℹ️ 未配置cloudmail，跳过Token预取")
+            return True
+        
+        try:
+            token = self.cloudmail_token or await self._request_cloudmail_token()
+            baseline_ids = {
+                self._mail_id(mail) async for mail in self.iter_mails(token, max_pages=1)
+                if self._is_code_mail(mail) and self._mail_id(mail)
+            }
+            if self.code_sent_at is not None:
+                # 验证码已经发出，快照可能包含新邮件，放弃基线
+                print("ℹ️ 验证码已发送，放弃邮件基线快照")
             else:
-                print("❌ 未能从邮件中提取验证码")
-                return None
-            
+                self.mail_baseline_ids = baseline_ids
+                print(f"📸 已记录 {len(self.mail_baseline_ids)} 封旧验证码邮件作为基线")
         except Exception as e:
-            print(f"❌ 从cloudmail获取验证码失败: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+            # 预取失败不影响登录，获取验证码时会重新请求（传入的缓存Token可能已过期）
+            print(f"⚠️ cloudmail预取失败: {e}")
+            self.cloudmail_token = None
+        return True
+    
+    def _mail_id(self, mail):
+        """返回邮件的唯一ID"""
+        return mail.get("emailId") or mail.get("id")
     
     def _get_mail_api_token(self):
         """获取邮箱API Token"""
@@ -521,13 +2350,15 @@ class XServerAutoLogin:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = HTTP_SESSION.post(url, json=payload, headers=headers, timeout=10)
+            if response.status_code >= 500:
+                response.raise_for_status()
             return response.json()
         except Exception as e:
-            return {"code": -1, "message": str(e)}
+            return {"code": -1, "message": str(e), "category": classify_error(e)}
     
-    def _get_mail_list(self, token: str, target_email: str, sender_email: str = None, subject: str = None):
-        """查询邮件列表"""
+    def _get_mail_list(self, token: str, target_email: str, sender_email: str = None, subject: str = None, page: int = 1):
+        """查询一页邮件列表"""
         url = f"{self.cloudmail_api_base_url}/api/public/emailList"
         headers = {"Authorization": token}
         
@@ -535,23 +2366,29 @@ class XServerAutoLogin:
             "toEmail": target_email,
             "timeSort": "desc",
             "type": 0,
-            "num": 1,
-            "size": 20
+            "num": page,
+            "size": CLOUDMAIL_PAGE_SIZE
         }
         
         # 添加发件人过滤
         if sender_email:
             payload["sendEmail"] = sender_email
         
-        # 添加主题过滤（仅当不使用本地过滤时）
+        # 添加主题过滤（仅当不使用本地过滤时；返回结果仍会在本地按规范化主题复核）
         if subject:
             payload["subject"] = subject
         
+        # 只请求需要的字段，减少每次轮询下载的邮件正文
+        if self.cloudmail_fields:
+            payload["fields"] = self.cloudmail_fields
+        
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = HTTP_SESSION.post(url, json=payload, headers=headers, timeout=10)
+            if response.status_code >= 500:
+                response.raise_for_status()
             return response.json()
         except Exception as e:
-            return {"code": -1, "message": str(e)}
+            return {"code": -1, "message": str(e), "category": classify_error(e)}
     
     def _extract_verification_code(self, mail_content: str):
         """从邮件内容中提取验证码"""
@@ -577,16 +2414,23 @@ class XServerAutoLogin:
         return None
     
     def _save_mail_to_json(self, mail_list):
-        """保存邮件到JSON文件"""
-        import datetime
+        """保存邮件到本次运行的产物目录"""
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"xserver_verification_{timestamp}.json"
+        filename = self.artifacts.path(f"xserver_verification_{timestamp}.json")
         
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(mail_list, f, ensure_ascii=False, indent=2)
         
         return filename
     
+    def _purge_mail_dump(self, json_filename):
+        """删除邮件JSON文件（包含完整邮件正文，提取验证码后不再保留）"""
+        try:
+            os.unlink(json_filename)
+            print(f"🧹 已删除邮件文件: {json_filename}")
+        except OSError as e:
+            print(f"⚠️ 删除邮件文件失败: {e}")
+    
     def _extract_code_from_json(self, json_filename):
         """从JSON文件中读取并提取验证码"""
         try:
@@ -629,118 +2473,255 @@ class XServerAutoLogin:
             print("🔍 正在检查登录结果...")
             
             # 等待页面加载
-            await asyncio.sleep(3)
+            await self.pause(3)
             
             current_url = self.page.url
             print(f"📍 当前URL: {current_url}")
             
             # 简单直接：只判断是否跳转到成功页面
-            success_url = "https://secure.xserver.ne.jp/xapanel/xmgame/index"
+            success_url = PAGE_URLS["panel_index"]
             
             if current_url == success_url:
                 print("✅ 登录成功！已跳转到XServer GAME管理页面")
-                
-                # 等待页面加载完成
-                print("⏰ 等待页面加载完成...")
-                await asyncio.sleep(3)
-                
-                # 查找并点击"ゲーム管理"按钮
-                print("🔍 正在查找ゲーム管理按钮...")
-                try:
-                    game_button_selector = "a:has-text('ゲーム管理')"
-                    await self.page.wait_for_selector(game_button_selector, timeout=self.wait_timeout)
-                    print("✅ 找到ゲーム管理按钮")
-                    
-                    # 点击ゲーム管理按钮
-                    print("🖱️ 正在点击ゲーム管理按钮...")
-                    await self.page.click(game_button_selector)
-                    print("✅ 已点击ゲーム管理按钮")
-                    
-                    # 等待页面跳转
-                    await asyncio.sleep(5)
-                    
-                    # 验证是否跳转到游戏管理页面
-                    final_url = self.page.url
-                    print(f"📍 最终页面URL: {final_url}")
-                    
-                    expected_game_url = "https://secure.xserver.ne.jp/xmgame/game/index"
-                    if expected_game_url in final_url:
-                        print("✅ 成功点击ゲーム管理按钮并跳转到游戏管理页面")
-                        await self.take_screenshot("game_page_loaded")
-                        
-                        # 获取服务器时间信息
-                        await self.get_server_time_info()
-                    else:
-                        print(f"⚠️ 跳转到游戏页面可能失败")
-                        print(f"   预期包含: {expected_game_url}")
-                        print(f"   实际URL: {final_url}")
-                        await self.take_screenshot("game_page_redirect_failed")
-                        
-                except Exception as e:
-                    print(f"❌ 查找或点击ゲーム管理按钮时出错: {e}")
-                    await self.take_screenshot("game_button_error")
-                
                 return True
             else:
                 print(f"❌ 登录失败！当前URL不是预期的成功页面")
                 print(f"   预期URL: {success_url}")
                 print(f"   实际URL: {current_url}")
+                # 仍停留在登录页通常意味着邮箱或密码错误，不可重试
+                category = "auth" if "login" in current_url or "loginauth" in current_url else "page_changed"
+                self._record_failure("handle_login_result", StepError(category, f"登录后停留在 {current_url}"))
                 return False
             
         except Exception as e:
             print(f"❌ 检查登录结果时出错: {e}")
+            self._record_failure("handle_login_result", e)
+            return False
+    
+    async def resume_session(self):
+        """已有会话Cookie时尝试直接进入管理页面，跳过登录和2FA
+        
+        每次运行都从新的浏览器上下文开始，会话Cookie只可能来自已加载的
+        浏览器档案（PROFILE_DIR），未加载档案时直接执行完整登录。
+        """
+        if not self.profile_loaded:
+            return False
+        try:
+            if not self.context or not await self.context.cookies():
+                return False
+        except Exception:
+            return False
+        
+        print("🍪 检测到已有会话，尝试直接进入管理页面...")
+        if await self.navigate_direct("panel_index"):
+            print("✅ 会话仍然有效，跳过登录")
+            self.session_reused = True
+            self.logged_in = True
+            return True
+        
+        print("ℹ️ 会话已失效，执行完整登录")
+        return False
+    
+    async def open_game_index(self):
+        """进入游戏管理页面：优先直接加载，被重定向时回退到点击ゲーム管理按钮"""
+        if await self.navigate_direct("game_index"):
+            return True
+        
+        # 等待页面加载完成
+        print("⏰ 等待页面加载完成...")
+        await self.pause(3)
+        
+        # 查找并点击"ゲーム管理"按钮（超时等可重试错误原地重试）
+        return await self.run_step("open_game_page", self.open_game_page)
+    
+    async def open_game_page(self):
+        """点击ゲーム管理按钮并验证跳转到游戏管理页面"""
+        print("🔍 正在查找ゲーム管理按钮...")
+        try:
+            game_button_selector, _ = await self.selectors.wait_for(self.page, "game.manage", self.wait_timeout)
+            print("✅ 找到ゲーム管理按钮")
+            
+            # 点击ゲーム管理按钮
+            print("🖱️ 正在点击ゲーム管理按钮...")
+            await self.page.click(game_button_selector)
+            print("✅ 已点击ゲーム管理按钮")
+            
+            # 等待页面跳转
+            await self.pause(5)
+            
+            # 验证是否跳转到游戏管理页面
+            final_url = self.page.url
+            print(f"📍 最终页面URL: {final_url}")
+            
+            expected_game_url = PAGE_URLS["game_index"]
+            if expected_game_url in final_url:
+                print("✅ 成功点击ゲーム管理按钮并跳转到游戏管理页面")
+                await self.take_screenshot("game_page_loaded")
+                return True
+            
+            print(f"⚠️ 跳转到游戏页面可能失败")
+            print(f"   预期包含: {expected_game_url}")
+            print(f"   实际URL: {final_url}")
+            await self.take_screenshot("game_page_redirect_failed")
+            self._record_failure("open_game_page", StepError("page_changed", f"跳转到 {final_url}"))
+            return False
+            
+        except Exception as e:
+            print(f"❌ 查找或点击ゲーム管理按钮时出错: {e}")
+            self._record_failure("open_game_page", e)
+            await self.take_screenshot("game_button_error")
             return False
             
+    async def list_servers(self):
+        """解析管理面板首页的服务器列表：每台服务器的ID、名称、进入地址和（如有）剩余时间"""
+        if PAGE_URLS["panel_index"] not in self.page.url and not await self.navigate_direct("panel_index"):
+            return []
+        try:
+            selector, _ = await self.selectors.wait_for(self.page, "panel.server_links", self.wait_timeout)
+        except Exception:
+            return []
+        
+        servers = []
+        for index, link in enumerate(await self.page.locator(selector).all()):
+            href = urllib.parse.urljoin(self.page.url, await link.get_attribute("href") or "")
+            if not href or any(server["href"] == href for server in servers):
+                continue
+            row_text = await link.evaluate("el => (el.closest('tr') || el.parentElement).innerText") or ""
+            id_match = re.search(r"[?&]id=([\w-]+)", href)
+            remaining_match = re.search(r"残り(\d+時間\d+分)", row_text)
+            expiry_match = re.search(r"(\d{4}-\d{2}-\d{2})", row_text)
+            servers.append({
+                "id": id_match.group(1) if id_match else str(index + 1),
+                "name": row_text.replace("ゲーム管理", "").split("\n")[0].strip()[:40] or f"server-{index + 1}",
+                "href": href,
+                "remaining": remaining_match.group(1) if remaining_match else None,
+                "expiry": expiry_match.group(1) if expiry_match else None,
+            })
+        return servers
+    
+    def reset_server_state(self):
+        """切换服务器前清空上一台服务器的续期状态"""
+        self.old_expiry_time = None
+        self.remaining_time = None
+        self.remaining_minutes = None
+        self.new_expiry_time = None
+        self.renewal_status = "Unknown"
+        self.last_failure = None
+    
+    async def renew_servers(self, servers):
+        """在同一登录会话中逐台续期：只在服务器之间重新导航，复用浏览器上下文"""
+        print(f"🗄️ 账号下共有 {len(servers)} 台游戏服务器，逐台处理")
+        for number, server in enumerate(servers, 1):
+            print(f"\n🖥️ [{number}/{len(servers)}] {server['name']} (ID: {server['id']})")
+            self.reset_server_state()
+            failures_before = len(self.failures)
+            self.set_step(f"server:{server['id']}")
+            
+            try:
+                # 通过服务器自己的入口进入游戏管理页面（面板会切换当前服务器）
+                await self.page.goto(server["href"], wait_until="load")
+                if PAGE_URLS["game_index"] in self.page.url:
+                    if await self.read_server_time_info():
+                        await self.open_extend_page()
+                else:
+                    self._record_failure("open_server", StepError("page_changed", f"进入服务器后停留在 {self.page.url}"))
+            except Exception as e:
+                print(f"❌ 处理服务器 {server['name']} 时出错: {e}")
+                self._record_failure("open_server", e)
+            
+            if self.renewal_status == "Unknown" and len(self.failures) > failures_before:
+                self.renewal_status = "Failed"
+            failure = next((f for f in reversed(self.failures[failures_before:]) if not f["recovered"]), None)
+            self.server_results.append({
+                "id": server["id"],
+                "name": server["name"],
+                "status": self.renewal_status,
+                "old_expiry": self.old_expiry_time or server["expiry"],
+                "new_expiry": self.new_expiry_time,
+                "failure": f"{failure['category']}@{failure['step']}" if failure else None,
+            })
+            print(f"📋 {server['name']}: {self.renewal_status}")
+        
+        # 汇总为账号级结果：任一失败即失败，否则任一成功即成功
+        statuses = {result["status"] for result in self.server_results}
+        for status in ("Failed", "Success", "Unknown", "Unexpired"):
+            if status in statuses:
+                self.renewal_status = status
+                break
+        old_expiries = [r["old_expiry"] for r in self.server_results if r["old_expiry"]]
+        new_expiries = [r["new_expiry"] for r in self.server_results if r["new_expiry"]]
+        self.old_expiry_time = min(old_expiries) if old_expiries else None
+        self.new_expiry_time = min(new_expiries) if new_expiries else None
+    
     # =================================================================
     #                    6A. 服务器信息获取模块
     # =================================================================
     
     async def get_server_time_info(self):
-        """获取服务器时间信息"""
+        """获取服务器时间信息并进入续期页面"""
         try:
-            print("🕒 正在获取服务器时间信息...")
+            await self.read_server_time_info()
             
-            # 等待页面加载完成
-            await asyncio.sleep(3)
+            # 进入续期页面
+            await self.open_extend_page()
             
-            # 使用已验证有效的选择器
-            try:
-                elements = await self.page.locator("text=/残り\\d+時間\\d+分/").all()
+        except Exception as e:
+            print(f"❌ 获取服务器时间信息失败: {e}")
+            self._record_failure("get_server_time_info", e)
+    
+    async def read_server_time_info(self):
+        """从游戏管理页面读取剩余时间和到期时间，找到时返回 True"""
+        print("🕒 正在获取服务器时间信息...")
+        
+        # 等待页面加载完成
+        await self.pause(3)
+        
+        # 使用已验证有效的选择器
+        try:
+            elements = await self.page.locator("text=/残り\\d+時間\\d+分/").all()
+            
+            for element in elements:
+                element_text = await element.text_content()
+                element_text = element_text.strip() if element_text else ""
                 
-                for element in elements:
-                    element_text = await element.text_content()
-                    element_text = element_text.strip() if element_text else ""
+                # 只处理包含时间信息且文本不太长的元素
+                if element_text and len(element_text) < 200 and "残り" in element_text and "時間" in element_text:
+                    print(f"✅ 找到时间元素: {element_text}")
                     
-                    # 只处理包含时间信息且文本不太长的元素
-                    if element_text and len(element_text) < 200 and "残り" in element_text and "時間" in element_text:
-                        print(f"✅ 找到时间元素: {element_text}")
-                        
-                        # 提取剩余时间
-                        remaining_match = re.search(r'残り(\d+時間\d+分)', element_text)
-                        if remaining_match:
-                            remaining_raw = remaining_match.group(1)
-                            remaining_formatted = self.format_remaining_time(remaining_raw)
-                            print(f"⏰ 剩余时间: {remaining_formatted}")
-                        
-                        # 提取到期时间
-                        expiry_match = re.search(r'\((\d{4}-\d{2}-\d{2})まで\)', element_text)
-                        if expiry_match:
-                            expiry_raw = expiry_match.group(1)
-                            expiry_formatted = self.format_expiry_date(expiry_raw)
-                            print(f"📅 到期时间: {expiry_formatted}")
-                            # 记录原到期时间
-                            self.old_expiry_time = expiry_formatted
-                        
-                        break
-                        
-            except Exception as e:
-                print(f"❌ 获取时间信息时出错: {e}")
-            
-            # 点击升级按钮
-            await self.click_upgrade_button()
+                    # 提取剩余时间
+                    remaining_match = re.search(r'残り(\d+時間\d+分)', element_text)
+                    if remaining_match:
+                        remaining_raw = remaining_match.group(1)
+                        remaining_formatted = self.format_remaining_time(remaining_raw)
+                        print(f"⏰ 剩余时间: {remaining_formatted}")
+                        self.remaining_time = remaining_formatted
+                        self.remaining_minutes = self.parse_remaining_minutes(remaining_raw)
+                    
+                    # 提取到期时间
+                    expiry_match = re.search(r'\((\d{4}-\d{2}-\d{2})まで\)', element_text)
+                    if expiry_match:
+                        expiry_raw = expiry_match.group(1)
+                        expiry_formatted = self.format_expiry_date(expiry_raw)
+                        print(f"📅 到期时间: {expiry_formatted}")
+                        # 记录原到期时间
+                        self.old_expiry_time = expiry_formatted
+                    
+                    return True
             
+            print("❌ 未找到剩余时间信息")
+            self._record_failure("read_server_time_info", StepError("page_changed", "游戏管理页面中未找到剩余时间"))
+                    
         except Exception as e:
-            print(f"❌ 获取服务器时间信息失败: {e}")
+            print(f"❌ 获取时间信息时出错: {e}")
+            self._record_failure("read_server_time_info", e)
+        
+        return False
+    
+    def window_opens_in(self):
+        """距离续期窗口打开的秒数（剩余时间降到 RENEWAL_WINDOW_HOURS 以下的时刻），未知时返回 None"""
+        if self.remaining_minutes is None:
+            return None
+        return (self.remaining_minutes - RENEWAL_WINDOW_HOURS * 60) * 60
     
     def format_remaining_time(self, time_str):
         """格式化剩余时间"""
@@ -752,17 +2733,41 @@ class XServerAutoLogin:
         # 直接返回日期，移除括号和"まで"
         return date_str  # 例如: "2025-09-24"
     
+    def parse_remaining_minutes(self, time_str):
+        """将剩余时间（如"30時間57分"）转换为分钟数"""
+        match = re.search(r'(\d+)時間(\d+)分', time_str or "")
+        if not match:
+            return None
+        return int(match.group(1)) * 60 + int(match.group(2))
+    
     # =================================================================
     #                    6B. 续期页面导航模块
     # =================================================================
     
+    async def open_extend_page(self):
+        """进入续期页面：优先直接加载可达的最深页面，被重定向时回退到点击导航"""
+        in_window = (self.remaining_minutes is not None
+                     and self.remaining_minutes < RENEWAL_WINDOW_HOURS * 60)
+        
+        # 已进入续期窗口：跳过限制检查页，直接进入期限延长输入页面
+        if in_window and await self.navigate_direct("extend_input"):
+            await self.verify_extension_input_page()
+            return
+        
+        # 直接进入升级・期限延长页面检查限制信息
+        if await self.navigate_direct("extend_index"):
+            await self.verify_upgrade_page()
+            return
+        
+        # 回退：点击升级按钮（超时等可重试错误原地重试）
+        await self.run_step("click_upgrade_button", self.click_upgrade_button)
+    
     async def click_upgrade_button(self):
         """点击升级延长按钮"""
         try:
             print("🔄 正在查找アップグレード・期限延長按钮...")
             
-            upgrade_selector = "a:has-text('アップグレード・期限延長')"
-            await self.page.wait_for_selector(upgrade_selector, timeout=self.wait_timeout)
+            upgrade_selector, _ = await self.selectors.wait_for(self.page, "game.upgrade", self.wait_timeout)
             print("✅ 找到アップグレード・期限延長按钮")
             
             # 点击按钮
@@ -770,19 +2775,22 @@ class XServerAutoLogin:
             print("✅ 已点击アップグレード・期限延長按钮")
             
             # 等待页面跳转
-            await asyncio.sleep(5)
+            await self.pause(5)
             
             # 验证URL和检查限制信息
             await self.verify_upgrade_page()
+            return True
             
         except Exception as e:
             print(f"❌ 点击升级按钮失败: {e}")
+            self._record_failure("click_upgrade_button", e)
+            return False
     
     async def verify_upgrade_page(self):
         """验证升级页面"""
         try:
             current_url = self.page.url
-            expected_url = "https://secure.xserver.ne.jp/xmgame/game/freeplan/extend/index"
+            expected_url = PAGE_URLS["extend_index"]
             
             print(f"📍 升级页面URL: {current_url}")
             
@@ -795,9 +2803,34 @@ class XServerAutoLogin:
                 print(f"❌ 升级页面跳转失败")
                 print(f"   预期URL: {expected_url}")
                 print(f"   实际URL: {current_url}")
+                self._record_failure("verify_upgrade_page", StepError("page_changed", f"跳转到 {current_url}"))
                 
         except Exception as e:
             print(f"❌ 验证升级页面失败: {e}")
+            self._record_failure("verify_upgrade_page", e)
+    
+    async def extension_restricted(self):
+        """轻量探测：刷新升级・期限延长页面并检查限制提示是否仍在
+
+        返回 True（仍受限）/ False（窗口已打开）/ None（会话失效被重定向）
+        """
+        await self.page.reload(wait_until="load")
+        if PAGE_URLS["extend_index"] not in self.page.url:
+            return None
+        return await self.page.locator("text=/残り契約時間が24時間を切るまで/").count() > 0
+    
+    async def restriction_present(self, selector):
+        """限制提示是否存在：事件桥在页面初始扫描后即给出结论，未启用时等待选择器（最多5秒）"""
+        if self.page_events:
+            event = await self.page_events.wait_for(("restriction", "ready"))
+            if event:
+                return event["name"] == "restriction" or "restriction" in event["matched"]
+            return await self.page.locator(selector).count() > 0
+        try:
+            await self.page.wait_for_selector(selector, timeout=5000)
+            return True
+        except Exception:
+            return False
     
     async def check_extension_restriction(self):
         """检查期限延长限制信息"""
@@ -807,20 +2840,18 @@ class XServerAutoLogin:
             # 查找限制信息
             restriction_selector = "text=/残り契約時間が24時間を切るまで、期限の延長は行えません/"
             
-            try:
-                element = await self.page.wait_for_selector(restriction_selector, timeout=5000)
-                restriction_text = await element.text_content()
+            if await self.restriction_present(restriction_selector):
+                restriction_text = await self.page.locator(restriction_selector).first.text_content()
                 print(f"✅ 找到期限延长限制信息")
                 print(f"📝 限制信息: {restriction_text}")
                 # 设置状态为未到期
                 self.renewal_status = "Unexpired"
                 return True  # 有限制，不能续期
-                
-            except Exception:
-                print("ℹ️ 未找到期限延长限制信息，可以进行延长操作")
-                # 没有限制信息，执行续期操作
-                await self.perform_extension_operation()
-                return False  # 无限制，可以续期
+            
+            print("ℹ️ 未找到期限延长限制信息，可以进行延长操作")
+            # 没有限制信息，执行续期操作
+            await self.perform_extension_operation()
+            return False  # 无限制，可以续期
                 
         except Exception as e:
             print(f"❌ 检测期限延长限制失败: {e}")
@@ -835,22 +2866,20 @@ class XServerAutoLogin:
         try:
             print("🔄 开始执行期限延长操作...")
             
-            # 查找"期限を延長する"按钮
-            await self.click_extension_button()
+            # 查找"期限を延長する"按钮（超时时原地重试）
+            await self.run_step("click_extension_button", self.click_extension_button)
             
         except Exception as e:
             print(f"❌ 执行期限延长操作失败: {e}")
+            self._record_failure("perform_extension_operation", e)
     
     async def click_extension_button(self):
         """点击期限延长按钮"""
         try:
             print("🔍 正在查找'期限を延長する'按钮...")
             
-            # 使用有效的选择器
-            extension_selector = "a:has-text('期限を延長する')"
-            
             # 等待并点击按钮
-            await self.page.wait_for_selector(extension_selector, timeout=self.wait_timeout)
+            extension_selector, _ = await self.selectors.wait_for(self.page, "extend.start", self.wait_timeout)
             print("✅ 找到'期限を延長する'按钮")
             
             # 点击按钮
@@ -859,7 +2888,7 @@ class XServerAutoLogin:
             
             # 等待页面跳转
             print("⏰ 等待页面跳转...")
-            await asyncio.sleep(5)
+            await self.pause(5)
             
             # 验证是否跳转到input页面
             await self.verify_extension_input_page()
@@ -867,13 +2896,14 @@ class XServerAutoLogin:
             
         except Exception as e:
             print(f"❌ 点击期限延长按钮失败: {e}")
+            self._record_failure("click_extension_button", e)
             return False
     
     async def verify_extension_input_page(self):
         """验证是否成功跳转到期限延长输入页面"""
         try:
             current_url = self.page.url
-            expected_url = "https://secure.xserver.ne.jp/xmgame/game/freeplan/extend/input"
+            expected_url = PAGE_URLS["extend_input"]
             
             print(f"📍 当前页面URL: {current_url}")
             
@@ -888,6 +2918,7 @@ class XServerAutoLogin:
                 print(f"❌ 页面跳转失败")
                 print(f"   预期URL: {expected_url}")
                 print(f"   实际URL: {current_url}")
+                self._record_failure("verify_extension_input_page", StepError("page_changed", f"跳转到 {current_url}"))
                 return False
             
         except Exception as e:
@@ -899,11 +2930,8 @@ class XServerAutoLogin:
         try:
             print("🔍 正在查找'確認画面に進む'按钮...")
             
-            # 使用button元素的选择器
-            confirmation_selector = "button[type='submit']:has-text('確認画面に進む')"
-            
             # 等待并点击按钮
-            await self.page.wait_for_selector(confirmation_selector, timeout=self.wait_timeout)
+            confirmation_selector, _ = await self.selectors.wait_for(self.page, "extend.confirm", self.wait_timeout)
             print("✅ 找到'確認画面に進む'按钮")
             
             # 点击按钮
@@ -912,7 +2940,7 @@ class XServerAutoLogin:
             
             # 等待页面跳转
             print("⏰ 等待页面跳转...")
-            await asyncio.sleep(5)
+            await self.pause(5)
             
             # 验证是否跳转到conf页面
             await self.verify_extension_conf_page()
@@ -920,13 +2948,14 @@ class XServerAutoLogin:
             
         except Exception as e:
             print(f"❌ 点击確認画面に進む按钮失败: {e}")
+            self._record_failure("click_confirmation_button", e)
             return False
             
     async def verify_extension_conf_page(self):
         """验证是否成功跳转到期限延长确认页面"""
         try:
             current_url = self.page.url
-            expected_url = "https://secure.xserver.ne.jp/xmgame/game/freeplan/extend/conf"
+            expected_url = PAGE_URLS["extend_conf"]
             
             print(f"📍 当前页面URL: {current_url}")
             
@@ -945,6 +2974,7 @@ class XServerAutoLogin:
                 print(f"❌ 页面跳转失败")
                 print(f"   预期URL: {expected_url}")
                 print(f"   实际URL: {current_url}")
+                self._record_failure("verify_extension_conf_page", StepError("page_changed", f"跳转到 {current_url}"))
                 return False
             
         except Exception as e:
@@ -956,11 +2986,8 @@ class XServerAutoLogin:
         try:
             print("📅 正在获取续期后的时间信息...")
             
-            # 使用有效的选择器
-            time_selector = "tr:has(th:has-text('延長後の期限'))"
-            
             # 等待并获取时间信息
-            time_element = await self.page.wait_for_selector(time_selector, timeout=self.wait_timeout)
+            _, time_element = await self.selectors.wait_for(self.page, "extend.new_expiry", self.wait_timeout)
             print("✅ 找到续期后时间信息")
             
             # 获取整行，然后提取td内容
@@ -982,20 +3009,22 @@ class XServerAutoLogin:
         try:
             print("🔍 正在查找最终的'期限を延長する'按钮...")
             
-            # 基于HTML属性查找按钮
-            final_button_selector = "button[type='submit']:has-text('期限を延長する')"
-            
             # 等待按钮出现
-            await self.page.wait_for_selector(final_button_selector, timeout=self.wait_timeout)
+            final_button_selector, _ = await self.selectors.wait_for(self.page, "extend.submit", self.wait_timeout)
             print("✅ 找到最终的'期限を延長する'按钮")
             
+            # 队列模式：提交不可重复，先确认任务租约仍由本节点持有
+            if self.lease_guard and not await self.lease_guard():
+                raise StepError("lease_lost", "任务租约已被其他节点接管，放弃提交")
+            
             # 点击按钮执行最终续期
             await self.page.click(final_button_selector)
             print("✅ 已点击最终续期按钮")
             
-            # 等待页面跳转
+            # 等待页面跳转（启用事件桥时由 verify_extension_success 等待结果事件）
             print("⏰ 等待续期操作完成...")
-            await asyncio.sleep(5)
+            if not self.page_events:
+                await self.pause(5)
             
             # 验证续期结果
             await self.verify_extension_success()
@@ -1004,6 +3033,7 @@ class XServerAutoLogin:
             
         except Exception as e:
             print(f"❌ 执行最终期限延长操作失败: {e}")
+            self._record_failure("find_final_extension_button", e)
             return False
             
     async def verify_extension_success(self):
@@ -1011,26 +3041,38 @@ class XServerAutoLogin:
         try:
             print("🔍 正在验证续期操作结果...")
             
+            # 启用事件桥时先等待成功或错误提示（先出现者即为结果），再读取跳转后的URL
+            text_success = False
+            if self.page_events:
+                event = await self.page_events.wait_for(("success", "error"))
+                if event and event["name"] == "success":
+                    print(f"✅ 找到成功提示文字: {event['detail']}")
+                    text_success = True
+                elif event:
+                    print(f"⚠️ 页面出现错误提示: {event['detail']}")
+                else:
+                    print("ℹ️ 未找到成功提示文字")
+            
             current_url = self.page.url
-            expected_url = "https://secure.xserver.ne.jp/xmgame/game/freeplan/extend/do"
+            expected_url = PAGE_URLS["extend_do"]
             
             print(f"📍 当前页面URL: {current_url}")
             
             # 检查条件1：URL是否跳转到do页面
             url_success = expected_url in current_url
             
-            # 检查条件2：是否有成功提示文字
-            text_success = False
-            try:
-                success_text_selector = "p:has-text('期限を延長しました。')"
-                await self.page.wait_for_selector(success_text_selector, timeout=5000)
-                success_text = await self.page.query_selector(success_text_selector)
-                if success_text:
-                    text_content = await success_text.text_content()
-                    print(f"✅ 找到成功提示文字: {text_content.strip()}")
-                    text_success = True
-            except Exception:
-                print("ℹ️ 未找到成功提示文字")
+            # 检查条件2：是否有成功提示文字（未启用事件桥时等待选择器）
+            if not self.page_events:
+                try:
+                    success_text_selector = "p:has-text('期限を延長しました。')"
+                    await self.page.wait_for_selector(success_text_selector, timeout=5000)
+                    success_text = await self.page.query_selector(success_text_selector)
+                    if success_text:
+                        text_content = await success_text.text_content()
+                        print(f"✅ 找到成功提示文字: {text_content.strip()}")
+                        text_success = True
+                except Exception:
+                    print("ℹ️ 未找到成功提示文字")
             
             # 任意一项满足即为成功
             if url_success or text_success:
@@ -1050,11 +3092,13 @@ class XServerAutoLogin:
                 print(f"   期望URL: {expected_url}")
                 # 设置状态为失败
                 self.renewal_status = "Failed"
+                self._record_failure("verify_extension_success", StepError("page_changed", f"续期后停留在 {current_url}"))
                 await self.take_screenshot("extension_failed")
                 return False
             
         except Exception as e:
             print(f"❌ 验证续期结果失败: {e}")
+            self._record_failure("verify_extension_success", e)
             # 设置状态为失败
             self.renewal_status = "Failed"
             return False
@@ -1063,107 +3107,1058 @@ class XServerAutoLogin:
     #                    6D. 结果记录与报告模块
     # =================================================================
     
+    def build_report_result(self):
+        """构建报告结果对象（README / JSON / 徽章共用）"""
+        # 使用北京时间（UTC+8）
+        beijing_time = datetime.datetime.now(timezone(timedelta(hours=8)))
+        failure = self.get_final_failure()
+        
+        result = {
+            "run_time": beijing_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "server": "🇯🇵Xserver(Mc)",
+            "status": self.renewal_status,
+            "old_expiry": self.old_expiry_time,
+            "new_expiry": self.new_expiry_time,
+            "failure": f"{failure['category']}@{failure['step']}" if failure else None,
+        }
+        if self.server_results:
+            result["servers"] = self.server_results
+        return result
+    
     def generate_readme(self):
-        """生成README.md文件记录续期情况"""
-        try:
-            print("📝 正在生成README.md文件...")
-            
-            # 获取当前时间
-            # 使用北京时间（UTC+8）
-            beijing_time = datetime.datetime.now(timezone(timedelta(hours=8)))
-            current_time = beijing_time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 根据状态生成不同的内容
-            readme_content = f"**最后运行时间**: `{current_time}`\n\n"
-            readme_content += "**运行结果**: <br>\n"
-            readme_content += "🖥️服务器：`🇯🇵Xserver(Mc)`<br>\n"
-            
-            # 根据续期状态生成对应的结果
-            if self.renewal_status == "Success":
-                readme_content += "📊续期结果：✅Success<br>\n"
-                readme_content += f"🕛️旧到期时间: `{self.old_expiry_time or 'Unknown'}`<br>\n"
-                readme_content += f"🕡️新到期时间: `{self.new_expiry_time or 'Unknown'}`<br>\n"
-            elif self.renewal_status == "Unexpired":
-                readme_content += "📊续期结果：ℹ️Unexpired<br>\n"
-                readme_content += f"🕛️旧到期时间: `{self.old_expiry_time or 'Unknown'}`<br>\n"
-            elif self.renewal_status == "Failed":
-                readme_content += "📊续期结果：❌Failed<br>\n"
-                readme_content += f"🕛️旧到期时间: `{self.old_expiry_time or 'Unknown'}`<br>\n"
-            else:
-                readme_content += "📊续期结果：❓Unknown<br>\n"
-                readme_content += f"🕛️旧到期时间: `{self.old_expiry_time or 'Unknown'}`<br>\n"
+        """生成README.md等报告文件记录续期情况"""
+        try:
+            print("📝 正在生成续期报告...")
             
-            # 写入README.md文件
-            with open("README.md", "w", encoding="utf-8") as f:
-                f.write(readme_content)
+            result = self.build_report_result()
+            written = ReportWriter().write(result)
             
-            print("✅ README.md文件生成成功")
+            if written:
+                print(f"✅ 报告文件已更新: {', '.join(os.path.basename(path) for path in written)}")
+            else:
+                print("ℹ️ 续期结果与上次相同，报告文件保持不变")
             print(f"📄 续期状态: {self.renewal_status}")
             print(f"📅 原到期时间: {self.old_expiry_time or 'Unknown'}")
             if self.new_expiry_time:
                 print(f"📅 新到期时间: {self.new_expiry_time}")
+            failure = self.get_final_failure()
+            if failure:
+                print(f"🧩 失败分类: {failure['category']} ({FAILURE_CATEGORIES[failure['category']]}) @ {failure['step']}")
+            
+        except Exception as e:
+            print(f"❌ 生成报告文件失败: {e}")
+    
+    def build_probe_result(self):
+        """构建探测模式的机器可读结果"""
+        failure = self.get_final_failure()
+        renewal_allowed = None
+        if self.remaining_minutes is not None:
+            renewal_allowed = self.remaining_minutes < RENEWAL_WINDOW_HOURS * 60
+        
+        return {
+            "timestamp": datetime.datetime.now(timezone(timedelta(hours=8))).isoformat(timespec="seconds"),
+            "ok": self.remaining_minutes is not None,
+            "remaining": self.remaining_time,
+            "hours_remaining": round(self.remaining_minutes / 60, 2) if self.remaining_minutes is not None else None,
+            "expiry_date": self.old_expiry_time,
+            "renewal_allowed": renewal_allowed,
+            "session_reused": self.session_reused,
+            "failure": f"{failure['category']}@{failure['step']}" if failure else None,
+        }
+    
+    def write_probe_result(self):
+        """输出探测结果：写入 PROBE_RESULT_FILE、打印单行JSON，并在Actions中写入步骤输出"""
+        try:
+            result = self.build_probe_result()
+            
+            with open(PROBE_RESULT_FILE, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            
+            print(f"PROBE_RESULT {json.dumps(result, ensure_ascii=False)}")
+            
+            # GitHub Actions 步骤输出，便于后续步骤按条件触发续期
+            github_output = os.getenv("GITHUB_OUTPUT")
+            if github_output:
+                with open(github_output, "a", encoding="utf-8") as f:
+                    f.write(f"renewal_allowed={str(result['renewal_allowed']).lower()}\n")
+                    f.write(f"hours_remaining={result['hours_remaining']}\n")
+                    f.write(f"expiry_date={result['expiry_date'] or ''}\n")
+            
+            print(f"💾 探测结果已保存到: {PROBE_RESULT_FILE}")
             
         except Exception as e:
-            print(f"❌ 生成README.md文件失败: {e}")
+            print(f"❌ 写入探测结果失败: {e}")
     
     # =================================================================
     #                       7. 主流程控制模块
     # =================================================================
     
-    async def run(self):
-        """运行自动登录流程"""
+    def _record_failure(self, step_name, error):
+        """记录一次步骤失败及其分类"""
+        category = classify_error(error)
+        self.last_failure = {
+            "step": step_name,
+            "category": category,
+            "message": str(error),
+            "recovered": False,
+        }
+        self.failures.append(self.last_failure)
+    
+    def get_final_failure(self):
+        """返回最后一次未被重试恢复的失败记录"""
+        for failure in reversed(self.failures):
+            if not failure["recovered"]:
+                return failure
+        return None
+    
+    def set_step(self, step_name):
+        """记录当前步骤，供状态查询服务展示"""
+        self.current_step = step_name
+        self.status.set_step(status_label(self.email), step_name)
+    
+    async def run_step(self, step_name, step_func, *args, **kwargs):
+        """按 STEP_RETRY_POLICIES 执行步骤，对可重试的失败原地退避重试
+        
+        步骤以返回假值表示失败，并通过 _record_failure 记录失败分类；
+        只有失败发生在该步骤自身（而非其调用的后续步骤）时才会重试。
+        """
+        policy = STEP_RETRY_POLICIES.get(step_name, DEFAULT_RETRY_POLICY)
+        self.set_step(step_name)
+        attempt = 0
+        own_failures = []
+        
+        while True:
+            attempt += 1
+            self.last_failure = None
+            try:
+                result = await step_func(*args, **kwargs)
+            except Exception as e:
+                print(f"❌ 步骤 {step_name} 出错: {e}")
+                self._record_failure(step_name, e)
+                result = None
+            
+            if result:
+                # 重试成功后，将之前的失败标记为已恢复
+                for failure in own_failures:
+                    failure["recovered"] = True
+                if own_failures:
+                    print(f"✅ 步骤 {step_name} 在第{attempt}次尝试时成功")
+                return result
+            
+            failure = self.last_failure
+            if not failure or failure["step"] != step_name:
+                # 失败发生在后续步骤中，不重复执行本步骤
+                return result
+            
+            failure["attempts"] = attempt
+            own_failures.append(failure)
+            if not policy.should_retry(failure["category"], attempt):
+                if attempt > 1:
+                    print(f"❌ 步骤 {step_name} 在{attempt}次尝试后仍失败（{failure['category']}）")
+                return result
+            
+            delay = policy.delay_for(attempt)
+            print(f"🔁 步骤 {step_name} 失败（{failure['category']}），{delay:.1f}秒后进行第{attempt + 1}次尝试...")
+            await self.pause(delay)
+    
+    async def preflight(self):
+        """网络预检：与浏览器启动并发执行，端点不可达时登录被跳过，而不是等到页面超时"""
+        if not PREFLIGHT:
+            return True
+        targets = {"xserver": XSERVER_BASE_URL, **PREFLIGHT_URLS}
+        if self.cloudmail_api_base_url:
+            targets["cloudmail"] = self.cloudmail_api_base_url
+        await run_preflight(targets, optional=tuple(PREFLIGHT_URLS))
+        return True
+    
+    async def login(self):
+        """登录XServer GAME管理面板（会话仍有效时直接复用）"""
+        if await self.resume_session():
+            return True
+        
+        # 多账号运行时错开登录时刻，避免同一IP同时登录
+        await self.rate_limit("login")
+        
+        # 步骤3：导航到登录页面
+        if not await self.run_step("navigate_to_login", self.navigate_to_login):
+            return False
+        
+        # 步骤4：执行登录操作
+        self.set_step("perform_login")
+        if not await self.perform_login():
+            return False
+        
+        # 步骤5：检查是否需要验证
+        self.set_step("handle_verification_page")
+        verification_result = await self.handle_verification_page()
+        if verification_result:
+            print("✅ 验证流程已处理")
+            await self.pause(3)  # 等待验证完成后的页面跳转
+        else:
+            print("⚠️ 验证流程未完成，可能需要手动处理")
+        
+        # 步骤6：检查登录结果
+        self.set_step("handle_login_result")
+        if not await self.handle_login_result():
+            print("⚠️ 登录可能失败，请检查邮箱和密码是否正确")
+            return False
+        
+        self.logged_in = True
+        return True
+    
+    async def probe(self):
+        """探测模式：登录后只读取剩余时间和到期时间，不进入续期页面"""
         try:
-            print("🚀 开始 XServer GAME 自动登录流程...")
+            print("🔎 开始 XServer GAME 到期探测...")
             
-            # 步骤1：验证配置
             if not self.validate_config():
                 return False
             
-            # 步骤2：设置浏览器
             if not await self.setup_browser():
                 return False
             
-            # 步骤3：导航到登录页面
-            if not await self.navigate_to_login():
+            if not await self.login():
                 return False
             
-            # 步骤4：执行登录操作
-            if not await self.perform_login():
+            if not await self.open_game_index():
                 return False
             
-            # 步骤5：检查是否需要验证
-            verification_result = await self.handle_verification_page()
-            if verification_result:
-                print("✅ 验证流程已处理")
-                await asyncio.sleep(3)  # 等待验证完成后的页面跳转
-            else:
-                print("⚠️ 验证流程未完成，可能需要手动处理")
+            return await self.read_server_time_info()
+            
+        except Exception as e:
+            print(f"❌ 到期探测出错: {e}")
+            self._record_failure("probe", e)
+            return False
+        
+        finally:
+            self.write_probe_result()
+            await self.shutdown()
+    
+    async def hold_until_window(self, opens_in):
+        """停留在升级・期限延长页面，按递减的间隔探测，窗口打开时立即执行延长操作"""
+        expected_at = time.time() + opens_in
+        deadline = expected_at + STANDBY_GRACE_MINUTES * 60
+        print(f"⏳ 续期窗口预计 {datetime.datetime.fromtimestamp(expected_at, timezone(timedelta(hours=8))):%H:%M:%S} 打开，保持会话待命...")
+        
+        while True:
+            # 距离越近探测越频繁；远离窗口时每次最多等待5分钟，同时起到会话保活的作用
+            remaining_wait = expected_at - time.time()
+            interval = STANDBY_POLL_SECONDS if remaining_wait <= STANDBY_POLL_SECONDS * 2 else min(300, remaining_wait / 2)
+            self.set_step("standby")
+            self.status.update(next_run=time.time() + interval)
+            await asyncio.sleep(interval)
+            
+            restricted = await self.extension_restricted()
+            if restricted is None:
+                print("🍪 待命期间会话失效，重新登录...")
+                if not await self.login() or not await self.navigate_direct("extend_index"):
+                    return False
+                continue
+            
+            if not restricted:
+                print("🔔 续期窗口已打开，立即执行期限延长！")
+                self.set_step("extend")
+                await self.perform_extension_operation()
+                return True
+            
+            if time.time() > deadline:
+                print("❌ 待命超时，续期窗口仍未打开")
+                self.renewal_status = "Failed"
+                self._record_failure("standby", StepError("timeout", "预计时刻之后续期窗口仍未打开"))
+                return False
+    
+    async def standby(self):
+        """预热待命模式：提前登录（包括2FA），在续期窗口打开的瞬间续期"""
+        try:
+            print("🛎️ 开始 XServer GAME 预热待命...")
             
-            # 步骤6：检查登录结果
-            if not await self.handle_login_result():
-                print("⚠️ 登录可能失败，请检查邮箱和密码是否正确")
+            # 根据上一次探测结果推算窗口时刻，推迟到窗口打开前几分钟再登录
+            open_at = planned_window_open()
+            if open_at:
+                wait = open_at - STANDBY_LEAD_MINUTES * 60 - time.time()
+                if 0 < wait <= STANDBY_MAX_WAIT_MINUTES * 60:
+                    print(f"💤 根据探测结果，{wait / 60:.1f} 分钟后登录")
+                    self.status.update(next_run=time.time() + wait)
+                    await asyncio.sleep(wait)
+            
+            if not self.validate_config():
+                return False
+            if not await self.setup_browser():
+                return False
+            if not await self.login():
+                return False
+            if not await self.open_game_index():
+                return False
+            if not await self.read_server_time_info():
                 return False
             
-            print("🎉 XServer GAME 自动登录流程完成！")
-            await self.take_screenshot("login_completed")
+            opens_in = self.window_opens_in()
+            if opens_in is None:
+                # 剩余时间格式无法解析（如只有"時間"没有"分"），无法推算窗口，交给正常流程判断
+                print(f"⚠️ 无法从剩余时间 {self.remaining_time!r} 推算续期窗口，回退到正常续期流程")
+                await self.open_extend_page()
+                return True
+            if opens_in <= 0:
+                # 窗口已经打开，按正常流程续期
+                await self.open_extend_page()
+                return True
             
-            # 生成README.md文件
-            self.generate_readme()
+            if opens_in > STANDBY_MAX_WAIT_MINUTES * 60:
+                print(f"ℹ️ 续期窗口还有 {opens_in / 3600:.1f} 小时才打开，超过待命上限，本次不续期")
+                self.renewal_status = "Unexpired"
+                return True
             
-            # 保持浏览器打开一段时间以便查看结果
-            print("⏰ 浏览器将在 10 秒后关闭...")
-            await asyncio.sleep(10)
+            if not await self.navigate_direct("extend_index"):
+                # 无法直接停留在延长页面时回退到正常流程
+                print("⚠️ 无法直接进入升级・期限延长页面，回退到正常续期流程")
+                await self.open_extend_page()
+                return True
             
-            return True
+            return await self.hold_until_window(opens_in)
             
         except Exception as e:
-            print(f"❌ 自动登录流程出错: {e}")
-            # 即使出错也生成README文件
-            self.generate_readme()
+            print(f"❌ 预热待命出错: {e}")
+            self._record_failure("standby", e)
             return False
+        
+        finally:
+            if self.write_report:
+                self.generate_readme()
+                self.record_run_stats()
+            await self.shutdown()
+    
+    async def renew(self):
+        """进入游戏管理页面，获取时间信息并续期"""
+        # 步骤7：多服务器账号在同一会话中逐台续期
+        servers = []
+        if MULTI_SERVER:
+            self.set_step("list_servers")
+            servers = await self.list_servers()
+        
+        if len(servers) > 1:
+            await self.renew_servers(servers)
+        else:
+            # 单台服务器：进入游戏管理页面，获取时间信息并续期
+            self.set_step("open_game_index")
+            if await self.open_game_index():
+                self.set_step("get_server_time_info")
+                await self.get_server_time_info()
+        
+        print("🎉 XServer GAME 自动登录流程完成！")
+        await self.take_screenshot("login_completed")
+        
+        # 有界面时保持浏览器打开一段时间以便查看结果
+        if not self.headless:
+            print("⏰ 浏览器将在 10 秒后关闭...")
+            await self.pause(10)
+        
+        return True
+    
+    async def shutdown(self):
+        """输出统计，保存浏览器档案，关闭浏览器并整理运行产物"""
+        # 输出选择器命中统计
+        self.selectors.report()
+        await self.save_profile()
+        await self.cleanup()
+        if self.owns_asset_cache:
+            self.asset_cache.report()
+            self.asset_cache.save()
+        # 多账号运行时兄弟账号可能仍在写入产物，配额清理交给协调者
+        self.artifacts.finalize(prune=self.write_report)
+        return True
+    
+    def record_run_stats(self):
+        """记录本账号的运行统计并输出2FA触发率（多账号运行时由协调者统一记录）"""
+        # 未尝试登录（浏览器启动或预检失败等）的运行不计入，否则会被误记为"跳过2FA"
+        if not self.login_attempted():
+            return
+        stats = record_account_runs([{
+            "email": self.email,
+            "label": mask_email(self.email),
+            "twofa_triggered": self.twofa_triggered,
+            "status": self.renewal_status,
+            "profile": self.profile_loaded,
+        }])
+        entry = stats.get(account_key(self.email))
+        if entry:
+            print(f"🔐 2FA触发率: {entry['twofa_triggers']}/{entry['runs']}（本次{'触发' if self.twofa_triggered else '未触发'}）")
+            skip, skip_with_profile = twofa_skip_rate(entry), twofa_skip_rate(entry, profile=True)
+            print(f"🗂️ 2FA跳过率: 最近 {skip:.0%}，加载档案时 "
+                  f"{f'{skip_with_profile:.0%}' if skip_with_profile is not None else '-'}")
+    
+    def login_attempted(self):
+        """本次运行是否真正走到了登录（登录成功或触发了2FA）"""
+        return self.logged_in or self.twofa_triggered
+    
+    async def run(self):
+        """运行自动登录流程：按任务依赖图并发执行相互独立的步骤"""
+        print("🚀 开始 XServer GAME 自动登录流程...")
+        
+        self.graph = graph = TaskGraph(on_error=self._record_failure, on_start=self.set_step)
+        
+        # 步骤1-2：配置验证、网络预检与浏览器启动互不依赖，并发执行
+        graph.add("validate_config", self.validate_config)
+        graph.add("preflight", self.preflight)
+        graph.add("setup_browser", self.setup_browser)
+        
+        # cloudmail Token和邮件基线快照在登录输入期间预取（复用预检建立的连接）
+        graph.add("cloudmail_prefetch", self.prefetch_cloudmail, deps=("validate_config", "preflight"))
+        
+        # 步骤3-6：登录（会话仍有效时直接复用）
+        # 登录在2FA时通过 graph.wait 等待 cloudmail_prefetch（运行时记录为依赖边）
+        graph.add("login", self.login, deps=("validate_config", "preflight", "setup_browser"))
+        
+        # 步骤7：获取时间信息并续期
+        graph.add("renew", self.renew, deps=("login",))
+        
+        # 报告生成与浏览器关闭并发执行（无论前面成功与否都会执行）
+        if self.write_report:
+            graph.add("report", self.generate_readme, deps=("renew",), always=True)
+            graph.add("run_stats", self.record_run_stats, deps=("renew",), always=True)
+        graph.add("shutdown", self.shutdown, deps=("renew",), always=True)
+        
+        try:
+            results = await graph.run()
+        finally:
+            graph.report()
+        
+        return bool(results.get("renew"))
+
+
+# =====================================================================
+#                       多账号分片并行运行模块
+# =====================================================================
+
+FLEET_WORKERS = int(os.getenv("FLEET_WORKERS", "0")) or (os.cpu_count() or 1)  # 工作进程数
+FLEET_CONTEXTS_PER_WORKER = int(os.getenv("FLEET_CONTEXTS_PER_WORKER", "3"))      # 每个进程的并发上下文数
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE")  # 账号列表JSON文件（或使用 ACCOUNTS 环境变量）
+
+def load_accounts():
+    """从 ACCOUNTS_FILE 或 ACCOUNTS 环境变量加载账号列表
+
+    每个账号形如 {"email": ..., "password": ..., "cloud_mail": {...}}，
+    cloud_mail 中的字段覆盖全局 CLOUD_MAIL 配置（通常只需指定 TO_EMAIL）。
+    """
+    try:
+        if ACCOUNTS_FILE:
+            with open(ACCOUNTS_FILE, "r", encoding="utf-8") as f:
+                accounts = json.load(f)
+        else:
+            accounts = json.loads(os.getenv("ACCOUNTS") or "[]")
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ 账号列表加载失败: {e}")
+        return []
+    
+    valid = [a for a in accounts if a.get("email") and a.get("password")]
+    if len(valid) != len(accounts):
+        print(f"⚠️ 已忽略 {len(accounts) - len(valid)} 个缺少邮箱或密码的账号")
+    return valid
+
+
+def mask_email(email):
+    """邮箱脱敏，用于日志和报告"""
+    name, _, domain = (email or "").partition("@")
+    return f"{name[:2]}***@{domain}" if domain else "***"
+
+
+def planned_window_open(probe_file=PROBE_RESULT_FILE):
+    """根据上一次探测结果推算续期窗口打开的时间戳，结果不可用时返回 None"""
+    try:
+        with open(probe_file, "r", encoding="utf-8") as f:
+            probe = json.load(f)
+        probed_at = datetime.datetime.fromisoformat(probe["timestamp"]).timestamp()
+        return probed_at + (probe["hours_remaining"] - RENEWAL_WINDOW_HOURS) * 3600
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def status_label(email):
+    """状态查询中的账号标识：脱敏邮箱加短哈希，避免脱敏后重名"""
+    return f"{mask_email(email)}#{account_key(email)[:6]}"
+
+
+def shard_accounts(accounts, shard_count):
+    """按轮询方式将账号分配到各工作进程"""
+    shards = [[] for _ in range(max(1, shard_count))]
+    for index, account in enumerate(accounts):
+        shards[index % len(shards)].append(account)
+    return [shard for shard in shards if shard]
+
+
+async def _fleet_worker_main(worker_id, accounts, contexts, limiter, events, asset_cache=None):
+    """工作进程内的事件循环：一个浏览器，最多 contexts 个并发上下文，共用一个资源缓存"""
+    profiler = RunProfiler(f"worker{worker_id}").start(asyncio.get_running_loop()) if PROFILING else None
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch(**launch_options())
+    semaphore = asyncio.Semaphore(contexts)
+    status = FleetStatusProxy(events, worker_id)
+    
+    async def run_account(account):
+        # 按协调者分配的时刻错峰启动
+        delay = account.get("start_at", 0) - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        async with semaphore:
+            label = mask_email(account["email"])
+            status.send({"type": "started", "account": label, "key": status_label(account["email"])})
+            
+            auto_login = XServerAutoLogin(
+                email=account["email"],
+                password=account["password"],
+                cloud_mail_config={**CLOUD_MAIL_CONFIG, **account.get("cloud_mail", {})},
+                shared_browser=browser,
+                rate_limiter=limiter,
+                write_report=False,
+                asset_cache=asset_cache,
+                status=status,
+            )
+            start = time.monotonic()
+            try:
+                ok = await auto_login.run()
+            except Exception as e:
+                print(f"❌ 账号 {label} 运行出错: {e}")
+                auto_login._record_failure("run", e)
+                ok = False
+            
+            result = auto_login.build_report_result()
+            result.update({
+                "account": label,
+                "email": account["email"],
+                "twofa_triggered": auto_login.twofa_triggered,
+                "profile_loaded": auto_login.profile_loaded,
+                "login_attempted": auto_login.login_attempted(),
+                "ok": ok,
+                "worker": worker_id,
+                "duration": round(time.monotonic() - start, 2),
+            })
+            status.send({"type": "result", **result})
+    
+    try:
+        await asyncio.gather(*(run_account(account) for account in accounts))
+    finally:
+        await browser.close()
+        await playwright.stop()
+        await asyncio.to_thread(status.close)
+        if profiler:
+            profiler.stop()
+
+
+def _fleet_worker(worker_id, accounts, contexts, limiter_state, limiter_lock, events):
+    """工作进程入口（需为模块级函数以便被子进程导入）"""
+    limiter = RateLimiter(limiter_state, limiter_lock)
+    asset_cache = AssetCache() if ASSET_CACHE_DIR else None
+    start = time.monotonic()
+    error = None
+    try:
+        asyncio.run(_fleet_worker_main(worker_id, accounts, contexts, limiter, events, asset_cache))
+    except Exception as e:
+        error = str(e)
+    finally:
+        if asset_cache:
+            asset_cache.save()
+        events.put({
+            "type": "worker_done",
+            "worker": worker_id,
+            "accounts": len(accounts),
+            "duration": round(time.monotonic() - start, 2),
+            "error": error,
+            "asset_cache": asset_cache.stats if asset_cache else None,
+        })
+
+
+def run_fleet(accounts, workers=FLEET_WORKERS, contexts=FLEET_CONTEXTS_PER_WORKER):
+    """将账号分片到多个工作进程并行运行，由协调者汇总结果和指标"""
+    # 启动时刻在窗口内均匀分散并加入抖动，避免同一IP同时登录
+    wall_start = time.time()
+    offsets = stagger_offsets(len(accounts))
+    accounts = [{**account, "start_at": wall_start + offset} for account, offset in zip(accounts, offsets)]
+    
+    shards = shard_accounts(accounts, min(workers, len(accounts)))
+    print(f"🚚 多账号运行: {len(accounts)} 个账号，{len(shards)} 个工作进程，每进程 {contexts} 个并发上下文")
+    print(f"🚦 限速配置: {pacing_signature()}")
+    
+    results = []
+    worker_metrics = []
+    start = time.monotonic()
+    
+    # 实时状态：待启动账号的计划时刻、上下文池占用和队列深度
+    scheduled = {status_label(a["email"]): a["start_at"] for a in accounts}
+    RUN_STATUS.update(
+        pool={"workers": len(shards), "contexts_per_worker": contexts, "active": 0},
+        queue={"pending": len(accounts), "total": len(accounts)},
+        next_run=min(scheduled.values(), default=None),
+    )
+    
+    def track(event):
+        if event["type"] == "started":
+            scheduled.pop(event["key"], None)
+            RUN_STATUS.set_step(event["key"], "started")
+            RUN_STATUS.adjust_active(1)
+            RUN_STATUS.update(
+                queue={"pending": len(scheduled)},
+                next_run=min(scheduled.values(), default=None),
+            )
+        elif event["type"] == "step":
+            RUN_STATUS.set_step(event["account"], event["step"])
+        elif event["type"] == "result":
+            RUN_STATUS.account_done(status_label(event["email"]), {
+                key: event[key] for key in ("account", "status", "old_expiry", "new_expiry", "failure", "duration")
+            })
+            RUN_STATUS.adjust_active(-1)
+    
+    # 使用 spawn 启动子进程，避免 fork 复制 Playwright 的驱动连接
+    mp_context = multiprocessing.get_context("spawn")
+    with mp_context.Manager() as manager:
+        events = manager.Queue()
+        limiter_state = manager.dict()
+        limiter_lock = manager.Lock()
+        
+        with concurrent.futures.ProcessPoolExecutor(max_workers=len(shards), mp_context=mp_context) as pool:
+            futures = [
+                pool.submit(_fleet_worker, worker_id, shard, contexts, limiter_state, limiter_lock, events)
+                for worker_id, shard in enumerate(shards)
+            ]
+            
+            # 协调者：流式接收各进程的结果和指标
+            while len(worker_metrics) < len(shards):
+                try:
+                    event = events.get(timeout=1)
+                except queue.Empty:
+                    crashed = [f for f in futures if f.done() and f.exception()]
+                    if crashed and all(f.done() for f in futures) and events.empty():
+                        print(f"❌ {len(crashed)} 个工作进程异常退出: {crashed[0].exception()}")
+                        break
+                    continue
+                
+                track(event)
+                if event["type"] == "started":
+                    print(f"▶️ [worker {event['worker']}] 开始处理 {event['account']}")
+                elif event["type"] == "result":
+                    results.append(event)
+                    print(f"📬 [worker {event['worker']}] {event['account']}: {event['status']}"
+                          f"（{event['duration']}秒，已完成 {len(results)}/{len(accounts)}）")
+                elif event["type"] == "worker_done":
+                    worker_metrics.append(event)
+                    if event["error"]:
+                        print(f"❌ [worker {event['worker']}] 工作进程出错: {event['error']}")
+    
+    elapsed = time.monotonic() - start
+    prune_artifacts()
+    
+    # 记录各账号的2FA触发情况（只由协调者写入统计文件；未尝试登录的运行不计入）
+    emails = [r.pop("email") for r in results]
+    attempted = [r for r in results if r["login_attempted"]]
+    stats = record_account_runs([{
+        "email": email,
+        "label": r["account"],
+        "twofa_triggered": r["twofa_triggered"],
+        "status": r["status"],
+        "profile": r["profile_loaded"],
+    } for email, r in zip(emails, results) if r["login_attempted"]])
+    pacing = pacing_signature()
+    
+    summary = {
+        "accounts": len(accounts),
+        "completed": len(results),
+        "workers": len(shards),
+        "contexts_per_worker": contexts,
+        "elapsed": round(elapsed, 2),
+        "throughput_per_min": round(len(results) / elapsed * 60, 2) if elapsed else None,
+        "status_counts": {
+            status: sum(1 for r in results if r["status"] == status)
+            for status in sorted({r["status"] for r in results})
+        },
+        "worker_metrics": sorted(worker_metrics, key=lambda m: m["worker"]),
+        "pacing": pacing,
+        "login_attempts": len(attempted),
+        "twofa_triggered": sum(1 for r in attempted if r["twofa_triggered"]),
+        "twofa_skipped": sum(1 for r in attempted if not r["twofa_triggered"]),
+        "asset_cache": {
+            key: sum((m["asset_cache"] or {}).get(key, 0) for m in worker_metrics)
+            for key in ("hit", "revalidated", "miss", "uncacheable", "error")
+        },
+        "profiles_loaded": sum(1 for r in attempted if r["profile_loaded"]),
+    }
+    write_fleet_report(results, summary)
+    
+    print(f"🏁 多账号运行完成: {summary['completed']}/{summary['accounts']} 个账号，"
+          f"耗时 {summary['elapsed']}秒，吞吐 {summary['throughput_per_min']} 个/分钟")
+    print(f"📊 状态分布: {summary['status_counts']}")
+    print(f"🔐 本次2FA触发: {summary['twofa_triggered']}/{len(attempted)}（{pacing}）")
+    print(f"🗂️ 本次2FA跳过: {summary['twofa_skipped']}/{len(attempted)}（加载档案 {summary['profiles_loaded']} 个）")
+    cache = summary["asset_cache"]
+    cacheable = cache["hit"] + cache["revalidated"] + cache["miss"]
+    if cacheable:
+        print(f"📦 资源缓存命中率: {(cache['hit'] + cache['revalidated']) / cacheable:.0%}（{cache}）")
+    for entry in stats.values():
+        overall, current = twofa_rate(entry), twofa_rate(entry, pacing)
+        if overall is not None:
+            current_text = f"{current:.0%}" if current is not None else "-"
+            print(f"   {entry['label']}: 累计 {overall:.0%}，当前配置下 {current_text}，最近跳过 {twofa_skip_rate(entry):.0%}")
+    return results, summary
+
+
+# =====================================================================
+#                       多节点工作队列模块
+# =====================================================================
+
+QUEUE_CONCURRENCY = int(os.getenv("QUEUE_CONCURRENCY", "0")) or FLEET_CONTEXTS_PER_WORKER  # 每个节点的并发上下文数
+QUEUE_POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", "5"))          # 任务都被其他节点租出时的轮询间隔
+
+
+def queue_jobs(accounts):
+    """将账号列表转换为队列任务（队列中只保存邮箱、账号哈希和脱敏标识）"""
+    return [{"email": a["email"], "key": account_key(a["email"]), "label": status_label(a["email"])} for a in accounts]
+
+
+async def run_queue_node(work_queue, owner, concurrency=QUEUE_CONCURRENCY):
+    """工作节点：一个浏览器、最多 concurrency 个并发上下文，持续领取任务直到队列中没有未结束的任务"""
+    accounts = {account["email"]: account for account in load_accounts()}
+    limiter = RateLimiter()
+    asset_cache = AssetCache() if ASSET_CACHE_DIR else None
+    results = []
+    print(f"🛰️ 工作节点 {owner} 启动: 队列 {work_queue.path}，{concurrency} 个并发上下文")
+    
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch(**launch_options())
+    
+    async def process(job):
+        account = accounts.get(job["email"])
+        if not account:
+            print(f"❌ 本节点的账号列表中没有 {job['label']}")
+            await asyncio.to_thread(work_queue.ack, job["id"], owner, False, {"error": "unknown_account"})
+            return
+        
+        print(f"📤 领取任务 {job['label']}（第 {job['attempts']} 次）")
+        auto_login = XServerAutoLogin(
+            email=account["email"],
+            password=account["password"],
+            cloud_mail_config={**CLOUD_MAIL_CONFIG, **account.get("cloud_mail", {})},
+            shared_browser=browser,
+            rate_limiter=limiter,
+            write_report=False,
+            asset_cache=asset_cache,
+        )
+        
+        async def run(check_lease):
+            auto_login.lease_guard = check_lease
+            try:
+                return await auto_login.run()
+            except Exception as e:
+                print(f"❌ 账号 {job['label']} 运行出错: {e}")
+                auto_login._record_failure("run", e)
+                return False
+        
+        start = time.monotonic()
+        ok, lease_held = await run_with_lease(work_queue, job, owner, run)
+        if not lease_held:
+            # 任务已由其他节点接管：关闭被取消运行的上下文，不确认结果
+            await auto_login.cleanup()
+            print(f"⚠️ 任务 {job['label']} 已被其他节点接管，本节点放弃")
+            return
+        
+        result = auto_login.build_report_result()
+        result.update({
+            "account": job["label"],
+            "ok": ok,
+            "node": owner,
+            "attempt": job["attempts"],
+            "duration": round(time.monotonic() - start, 2),
+        })
+        if not await asyncio.to_thread(work_queue.ack, job["id"], owner, ok, result):
+            print(f"⚠️ 任务 {job['label']} 的结果未被接受（租约已被其他节点接管）")
+        results.append(result)
+        RUN_STATUS.account_done(job["label"], result)
+        RUN_STATUS.update(queue=await asyncio.to_thread(work_queue.counts))
+    
+    async def slot():
+        while True:
+            job = await asyncio.to_thread(work_queue.lease, owner)
+            if job:
+                await process(job)
+                continue
+            # 其他节点（或本节点的其他上下文）仍持有租约：等待完成或租约过期
+            if not await asyncio.to_thread(work_queue.outstanding):
+                return
+            await asyncio.sleep(QUEUE_POLL_SECONDS)
+    
+    try:
+        await asyncio.gather(*(slot() for _ in range(concurrency)))
+    finally:
+        await browser.close()
+        await playwright.stop()
+        if asset_cache:
+            asset_cache.report()
+            asset_cache.save()
+        prune_artifacts()
     
+    succeeded = sum(1 for r in results if r["ok"])
+    print(f"🏁 工作节点 {owner} 完成: {succeeded}/{len(results)} 个任务成功，队列状态 {work_queue.counts()}")
+    return results
+
+
+def queue_node(db_path=QUEUE_DB, owner=None, concurrency=QUEUE_CONCURRENCY):
+    """工作节点的同步入口（模块级函数，可作为子进程目标，基准测试用它模拟多台机器）"""
+    return asyncio.run(run_queue_node(WorkQueue(db_path), owner or queue_owner(), concurrency))
+
+
+# =====================================================================
+#                          常驻调度模块
+# =====================================================================
+
+DAEMON_CONFIG = os.getenv("DAEMON_CONFIG", "daemon_config.json")         # 常驻模式的配置文件（修改后自动生效）
+DAEMON_POLL_SECONDS = float(os.getenv("DAEMON_POLL_SECONDS", "5"))       # 检查配置文件修改时间和到期账号的间隔
+DAEMON_INTERVAL_HOURS = 6   # 每个账号的运行间隔（配置文件 interval_hours 可覆盖）
+DAEMON_RETRY_MINUTES = 30   # 运行失败后的重试间隔（配置文件 retry_minutes 可覆盖）
+
+
+def credential_signature(*values):
+    """凭据指纹：只用于比较是否变更，不保存明文"""
+    return hashlib.sha256(json.dumps(values, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+class RenewalDaemon:
+    """常驻续期进程：账号和 Cloudmail 配置来自被监视的配置文件，共享浏览器始终不重启
+
+    配置文件格式:
+        {"cloud_mail": {...}, "accounts": [{"email", "password", "cloud_mail": {...}}],
+         "interval_hours": 6, "retry_minutes": 30, "contexts": 3}
+
+    按修改时间轮询配置文件，变化时增量应用：新账号错峰排入调度；被删除的账号
+    不再调度，正在运行的等待其完成后移除；密码变更只删除该账号的浏览器档案
+    （旧会话），Cloudmail 凭据变更只让对应的缓存Token失效。
+    """
+
+    def __init__(self, config_path=DAEMON_CONFIG):
+        self.config_path = config_path
+        self.config_mtime = None
+        self.slots = {}              # 邮箱 -> 调度槽位（账号配置、凭据指纹、下次运行时间、运行中的任务）
+        self.tokens = {}             # Cloudmail 凭据指纹 -> 缓存的Token，跨运行复用
+        self.interval = DAEMON_INTERVAL_HOURS * 3600
+        self.retry_delay = DAEMON_RETRY_MINUTES * 60
+        self.contexts = FLEET_CONTEXTS_PER_WORKER
+        self.profiles = ProfileStore()
+        self.limiter = RateLimiter()
+        self.asset_cache = AssetCache() if ASSET_CACHE_DIR else None
+        self.playwright = None
+        self.browser = None
+        self.wakeup = asyncio.Event()
+        self.stopping = asyncio.Event()
+
+    def read_config(self):
+        """读取配置文件；文件未变化或内容无效时返回 None（无效时保留当前配置）"""
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except OSError as e:
+            if self.config_mtime is None:
+                print(f"❌ 无法读取配置文件 {self.config_path}: {e}")
+            return None
+        if mtime == self.config_mtime:
+            return None
+        self.config_mtime = mtime
+        try:
+            with open(self.config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            if not isinstance(config.get("accounts", []), list):
+                raise ValueError("accounts 必须是列表")
+            return config
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 配置文件无效，继续使用当前配置: {e}")
+            return None
+
+    def apply(self, config):
+        """增量应用新配置，返回变更摘要"""
+        interval = float(config.get("interval_hours", DAEMON_INTERVAL_HOURS)) * 3600
+        retry_delay = float(config.get("retry_minutes", DAEMON_RETRY_MINUTES)) * 60
+        timing_changed = (interval, retry_delay) != (self.interval, self.retry_delay)
+        self.interval, self.retry_delay = interval, retry_delay
+        self.contexts = int(config.get("contexts", FLEET_CONTEXTS_PER_WORKER))
+        cloud_mail = config.get("cloud_mail") or CLOUD_MAIL_CONFIG
+        accounts = {a["email"]: a for a in config.get("accounts", []) if a.get("email") and a.get("password")}
+        changes = {"added": 0, "removed": 0, "rotated": 0, "mail_rotated": 0, "rescheduled": 0}
+        
+        if timing_changed:
+            # 运行间隔变化：空闲账号按上次运行时刻和新间隔重新计算，只提前不推迟
+            for slot in self.slots.values():
+                if slot["task"] or slot.get("last_run") is None:
+                    continue
+                next_run = slot["last_run"] + (self.interval if slot["last_ok"] else self.retry_delay)
+                if next_run < slot["next_run"]:
+                    slot["next_run"] = next_run
+                    changes["rescheduled"] += 1
+        
+        for email, slot in self.slots.items():
+            if email not in accounts and not slot["removed"]:
+                slot["removed"] = True
+                changes["removed"] += 1
+                print(f"➖ 账号 {status_label(email)} 已从配置中删除{'，等待当前运行完成' if slot['task'] else ''}")
+        
+        added = [email for email in accounts if email not in self.slots or self.slots[email]["removed"]]
+        offsets = dict(zip(added, stagger_offsets(len(added))))
+        for email, account in accounts.items():
+            mail_config = {**cloud_mail, **account.get("cloud_mail", {})}
+            login_signature = credential_signature(account["password"])
+            mail_signature = credential_signature(
+                mail_config.get("API_BASE_URL"), mail_config.get("EMAIL"),
+                mail_config.get("PASSWORD"), mail_config.get("JWT_SECRET"),
+            )
+            slot = self.slots.get(email)
+            if slot is None:
+                slot = self.slots[email] = {"task": None, "stale_session": False,
+                                            "next_run": time.time() + offsets[email]}
+                changes["added"] += 1
+                print(f"➕ 新账号 {status_label(email)} 已加入调度")
+            else:
+                if slot["removed"]:
+                    print(f"↩️ 账号 {status_label(email)} 重新加入调度")
+                if slot["login_signature"] != login_signature:
+                    # 密码变更：该账号的旧会话在下次运行前删除（正在运行的不受影响）
+                    slot["stale_session"] = True
+                    changes["rotated"] += 1
+                    print(f"🔁 账号 {status_label(email)} 的密码已变更，下次运行前清除旧会话")
+                if slot["mail_signature"] != mail_signature:
+                    changes["mail_rotated"] += 1
+            slot.update(account=account, mail_config=mail_config, removed=False,
+                        login_signature=login_signature, mail_signature=mail_signature)
+        
+        # 不再被任何账号使用的 Cloudmail 凭据对应的Token随之失效
+        in_use = {slot["mail_signature"] for slot in self.slots.values() if not slot["removed"]}
+        for signature in [s for s in self.tokens if s not in in_use]:
+            del self.tokens[signature]
+        
+        # 被删除且未在运行的账号立即移除
+        for email in [e for e, slot in self.slots.items() if slot["removed"] and not slot["task"]]:
+            del self.slots[email]
+        return changes
+
+    def reload(self):
+        """配置文件变化时重新加载"""
+        config = self.read_config()
+        if config is None:
+            return False
+        changes = self.apply(config)
+        print(f"🔄 配置已加载: {len(self.active_slots())} 个账号，每 {self.interval / 3600:g} 小时运行一次，"
+              f"{self.contexts} 个并发上下文（{changes}）")
+        self.wakeup.set()
+        return True
+
+    def active_slots(self):
+        return {email: slot for email, slot in self.slots.items() if not slot["removed"]}
+
+    async def ensure_browser(self):
+        """启动共享浏览器；只在浏览器意外断开时重新启动，配置变化不会触发重启"""
+        if self.browser and self.browser.is_connected():
+            return
+        if self.browser:
+            print("⚠️ 共享浏览器已断开，重新启动")
+        if not self.playwright:
+            self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(**launch_options())
+
+    async def run_account(self, email):
+        """运行单个账号的完整续期流程，结束后安排下一次运行"""
+        slot = self.slots[email]
+        account, mail_signature = slot["account"], slot["mail_signature"]
+        ok = False
+        try:
+            if slot["stale_session"]:
+                slot["stale_session"] = False
+                if self.profiles.discard(email):
+                    print(f"🗑️ 已清除账号 {status_label(email)} 的旧会话")
+            
+            await self.ensure_browser()
+            auto_login = XServerAutoLogin(
+                email=email,
+                password=account["password"],
+                cloud_mail_config=slot["mail_config"],
+                shared_browser=self.browser,
+                rate_limiter=self.limiter,
+                write_report=False,
+                asset_cache=self.asset_cache,
+            )
+            auto_login.cloudmail_token = self.tokens.get(mail_signature)
+            try:
+                ok = await auto_login.run()
+            except Exception as e:
+                print(f"❌ 账号 {status_label(email)} 运行出错: {e}")
+                auto_login._record_failure("run", e)
+            
+            # 运行期间凭据未变更时才缓存Token
+            if auto_login.cloudmail_token and slot["mail_signature"] == mail_signature:
+                self.tokens[mail_signature] = auto_login.cloudmail_token
+            RUN_STATUS.account_done(status_label(email), {**auto_login.build_report_result(),
+                                                          "account": status_label(email), "ok": ok})
+        except Exception as e:
+            print(f"❌ 账号 {status_label(email)} 调度出错: {e}")
+        finally:
+            slot["task"] = None
+            slot["last_run"], slot["last_ok"] = time.time(), ok
+            slot["next_run"] = slot["last_run"] + (self.interval if ok else self.retry_delay)
+            if slot["removed"]:
+                del self.slots[email]
+                print(f"✅ 账号 {status_label(email)} 已完成最后一次运行并移除")
+            if not any(other["task"] for other in self.slots.values()):
+                prune_artifacts()
+            self.wakeup.set()
+
+    def schedule_due(self):
+        """启动已到期的账号，不超过并发上下文数"""
+        now = time.time()
+        running = sum(1 for slot in self.slots.values() if slot["task"])
+        due = sorted((slot["next_run"], email) for email, slot in self.active_slots().items()
+                     if not slot["task"] and slot["next_run"] <= now)
+        started = due[:max(0, self.contexts - running)]
+        for _, email in started:
+            self.slots[email]["task"] = asyncio.ensure_future(self.run_account(email))
+        
+        waiting = [slot["next_run"] for slot in self.active_slots().values() if not slot["task"]]
+        RUN_STATUS.update(
+            pool={"workers": 1, "contexts_per_worker": self.contexts,
+                  "active": sum(1 for slot in self.slots.values() if slot["task"])},
+            queue={"pending": len(due) - len(started), "total": len(self.active_slots())},
+            next_run=min(waiting, default=None),
+        )
+
+    def stop(self):
+        print("🛑 收到停止信号，等待正在运行的账号完成...")
+        self.stopping.set()
+        self.wakeup.set()
+
+    async def run(self):
+        """主循环：轮询配置文件并启动到期账号，收到停止信号后等待运行中的账号完成"""
+        if not self.reload():
+            return False
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        
+        try:
+            await self.ensure_browser()
+            while not self.stopping.is_set():
+                self.wakeup.clear()
+                self.reload()
+                self.schedule_due()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), DAEMON_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            
+            running = [slot["task"] for slot in self.slots.values() if slot["task"]]
+            if running:
+                await asyncio.gather(*running)
         finally:
-            await self.cleanup()
+            if self.browser:
+                await self.browser.close()
+            if self.playwright:
+                await self.playwright.stop()
+            if self.asset_cache:
+                self.asset_cache.report()
+                self.asset_cache.save()
+        return True
 
 
 # =====================================================================
@@ -1178,12 +4173,66 @@ async def main():
     print("=" * 60)
     print()
     
+    # 多账号模式：按进程分片并行运行
+    if RUN_MODE == "fleet":
+        accounts = load_accounts()
+        if not accounts:
+            print("❌ 未找到可用账号，请设置 ACCOUNTS 或 ACCOUNTS_FILE")
+            exit(1)
+        import_profiles()
+        status_server = await start_status_server()
+        try:
+            results, _ = await asyncio.to_thread(run_fleet, accounts)
+        finally:
+            if status_server:
+                await status_server.stop()
+        export_profiles()
+        exit(0 if results and all(r["ok"] for r in results) else 1)
+    
+    # 共享任务队列：enqueue 写入本窗口的账号，worker 领取并续期（可在多台机器上同时运行）
+    if RUN_MODE == "enqueue":
+        accounts = load_accounts()
+        if not accounts:
+            print("❌ 未找到可用账号，请设置 ACCOUNTS 或 ACCOUNTS_FILE")
+            exit(1)
+        work_queue = WorkQueue()
+        window = renewal_window_id()
+        added = work_queue.enqueue(queue_jobs(accounts), window)
+        print(f"📥 已入队 {added}/{len(accounts)} 个账号（窗口 {window}，其余已在本窗口入队过）")
+        print(f"📊 队列状态: {work_queue.counts()}")
+        exit(0)
+    
+    if RUN_MODE == "worker":
+        import_profiles()
+        status_server = await start_status_server()
+        try:
+            results = await run_queue_node(WorkQueue(), queue_owner())
+        finally:
+            if status_server:
+                await status_server.stop()
+        export_profiles()
+        exit(0 if all(r["ok"] for r in results) else 1)
+    
+    # 常驻模式：配置文件热更新，共享浏览器常驻
+    if RUN_MODE == "daemon":
+        import_profiles()
+        status_server = await start_status_server()
+        try:
+            success = await RenewalDaemon().run()
+        finally:
+            if status_server:
+                await status_server.stop()
+        export_profiles()
+        exit(0 if success else 1)
+    
     # 显示当前配置
     print("📋 当前配置:")
     print(f"   XServer邮箱: {LOGIN_EMAIL}")
     print(f"   XServer密码: {'*' * len(LOGIN_PASSWORD)}")
     print(f"   目标网站: {TARGET_URL}")
-    print(f"   无头模式: {USE_HEADLESS}")
+    print(f"   无头模式: {launch_options()['headless']}")
+    print(f"   启动配置: {BROWSER_PROFILE}（截图{'开启' if ENABLE_SCREENSHOTS else '关闭'}）")
+    print(f"   运行模式: {RUN_MODE}")
     print()
     
     # 显示邮箱配置
@@ -1214,9 +4263,27 @@ async def main():
     print("🚀 配置验证通过，自动开始登录...")
     
     # 创建并运行自动登录器
-    auto_login = XServerAutoLogin()
+    import_profiles()
+    webhook_server, code_webhook = await start_code_webhook()
+    status_server = await start_status_server()
+    auto_login = XServerAutoLogin(code_webhook=code_webhook)
+    profiler = RunProfiler().start(asyncio.get_running_loop()) if PROFILING else None
     
-    success = await auto_login.run()
+    try:
+        if RUN_MODE == "probe":
+            success = await auto_login.probe()
+        elif RUN_MODE == "standby":
+            success = await auto_login.standby()
+        else:
+            success = await auto_login.run()
+        RUN_STATUS.account_done(status_label(auto_login.email), auto_login.build_report_result())
+    finally:
+        if profiler:
+            profiler.stop()
+        for server in (webhook_server, status_server):
+            if server:
+                await server.stop()
+    export_profiles()
     
     if success:
         print("✅ 登录流程执行成功！")
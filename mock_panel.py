@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XServer GAME 本地模拟面板
+
+模拟登录、新环境验证（2FA）、游戏管理和期限延长页面，以及 Cloudmail 的
+genToken / emailList 接口，用于在本地压测和长时间运行测试 main.py，
+不会访问真实的 XServer 和 Cloudmail。
+
+用法:
+    python mock_panel.py --port 8765 --remaining-hours 20 --require-2fa
+
+然后以如下环境变量运行 main.py:
+    XSERVER_BASE_URL=http://127.0.0.1:8765
+    CLOUD_MAIL='{"API_BASE_URL": "http://127.0.0.1:8765", "SUBJECT": "【XServer】認証コードのお知らせ", ...}'
+"""
+
+# =====================================================================
+#                          导入依赖
+# =====================================================================
+
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+import urllib.request
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote
+
+# =====================================================================
+#                          配置区域
+# =====================================================================
+
+MOCK_SUBJECT = "【XServer】認証コードのお知らせ"
+MOCK_SENDER = "support@xserver.ne.jp"
+RESTRICTION_TEXT = "残り契約時間が24時間を切るまで、期限の延長は行えません。"
+EXTEND_HOURS = 48  # 每次续期增加的小时数
+
+# =====================================================================
+#                          模拟面板状态
+# =====================================================================
+
+
+class MockPanelState:
+    """模拟面板的内存状态：账号剩余时间、会话、验证码和邮箱"""
+
+    def __init__(self, remaining_hours=20.0, require_2fa=False, fixed_remaining=False, latency_ms=0,
+                 webhook_url=None, webhook_token=None, servers=1):
+        self.remaining_hours = remaining_hours
+        self.servers = servers              # 每个账号下的游戏服务器数
+        self.require_2fa = require_2fa
+        self.fixed_remaining = fixed_remaining
+        self.latency_ms = latency_ms
+        self.webhook_url = webhook_url      # 新邮件推送地址（模拟 Cloudmail 转发钩子）
+        self.webhook_token = webhook_token
+        self.lock = threading.Lock()
+        self.accounts = {}   # (email, 服务器ID) -> 剩余分钟数
+        self.codes = {}      # email -> 待验证的验证码
+        self.mails = []      # Cloudmail 邮件（按时间先后）
+        self.stats = {"logins": 0, "2fa_sent": 0, "extensions": 0, "requests": 0, "webhook_pushes": 0}
+
+    def remaining_minutes(self, email, server="1"):
+        with self.lock:
+            return self.accounts.setdefault((email, server), int(self.remaining_hours * 60))
+
+    def extend(self, email, server="1"):
+        with self.lock:
+            self.stats["extensions"] += 1
+            if not self.fixed_remaining:
+                self.accounts[(email, server)] = self.accounts.get((email, server), 0) + EXTEND_HOURS * 60
+
+    def send_code(self, email):
+        code = f"{random.randint(0, 99999):05d}"
+        with self.lock:
+            self.codes[email] = code
+            self.stats["2fa_sent"] += 1
+            self.mails.append({
+                "emailId": len(self.mails) + 1,
+                "sendEmail": MOCK_SENDER,
+                "toEmail": email,
+                "subject": MOCK_SUBJECT,
+                "text": f"認証コードをお知らせします。\n【認証コード】　　　　　　　： {code}\n",
+                "createTime": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            mail = self.mails[-1]
+        if self.webhook_url:
+            threading.Thread(target=self.push_mail, args=(mail,), daemon=True).start()
+        return code
+
+    def push_mail(self, mail):
+        """将新邮件 POST 到 webhook 地址（失败时忽略，由轮询兜底）"""
+        request = urllib.request.Request(
+            self.webhook_url,
+            data=json.dumps(mail, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json", "X-Webhook-Token": self.webhook_token or ""},
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+            with self.lock:
+                self.stats["webhook_pushes"] += 1
+        except Exception:
+            pass
+
+    def list_mails(self, to_email=None, send_email=None, subject=None, num=1, size=20):
+        with self.lock:
+            mails = [
+                m for m in reversed(self.mails)
+                if (not to_email or m["toEmail"] == to_email)
+                and (not send_email or m["sendEmail"] == send_email)
+                and (not subject or m["subject"] == subject)
+            ]
+        start = (max(1, num) - 1) * size
+        return mails[start:start + size]
+
+
+# =====================================================================
+#                          HTTP 请求处理
+# =====================================================================
+
+
+def _page(title, body):
+    return (f"<!DOCTYPE html><html lang='ja'><head><meta charset='utf-8'><title>{title}</title>"
+            f"<link rel='stylesheet' href='/static/panel.css'><script src='/static/panel.js'></script>"
+            f"</head><body>{body}</body></html>")
+
+
+def _expiry_date(minutes):
+    expiry = datetime.datetime.now() + datetime.timedelta(minutes=minutes)
+    return expiry.strftime("%Y-%m-%d")
+
+
+class MockPanelHandler(BaseHTTPRequestHandler):
+    """模拟面板的请求处理器（state 由 make_handler 注入）"""
+
+    state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ------------------------------ 工具方法 ------------------------------
+
+    def _cookies(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        return {key: morsel.value for key, morsel in cookie.items()}
+
+    def _current_server(self):
+        return self._cookies().get("mock_server", "1")
+
+    def _session_email(self):
+        value = self._cookies().get("mock_session")
+        return unquote(value) if value else None
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _form(self):
+        return {k: v[0] for k, v in parse_qs(self._read_body().decode("utf-8")).items()}
+
+    def _send(self, status, body="", content_type="text/html; charset=utf-8", headers=None):
+        if self.state.latency_ms:
+            time.sleep(self.state.latency_ms / 1000)
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            if isinstance(value, list):
+                for item in value:
+                    self.send_header(key, item)
+            else:
+                self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _redirect(self, location, cookies=None):
+        headers = {"Location": location}
+        if cookies:
+            headers["Set-Cookie"] = cookies
+        self._send(302, "", headers=headers)
+
+    def _json(self, payload):
+        self._send(200, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+
+    def _require_session(self):
+        email = self._session_email()
+        if not email:
+            self._redirect("/xapanel/login/xmgame")
+        return email
+
+    # ------------------------------ 路由 ------------------------------
+
+    def do_GET(self):
+        self.state.stats["requests"] += 1
+        path = self.path.split("?", 1)[0]
+
+        if path.startswith("/static/"):
+            # 静态资源：带 ETag 和缓存头，便于测试资源缓存
+            content_type = "text/css" if path.endswith(".css") else "application/javascript"
+            body = "/* mock panel asset */\n" * 200
+            etag = f'"{hash(path) & 0xffffffff:x}"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, "", headers={"ETag": etag})
+                return
+            self._send(200, body, content_type, headers={"ETag": etag, "Cache-Control": "max-age=3600"})
+            return
+
+        if path == "/xapanel/login/xmgame":
+            self._send(200, _page("ログイン", (
+                "<form method='post' action='/xapanel/login/xmgame'>"
+                "<input type='text' name='memberid'>"
+                "<input type='password' name='user_password'>"
+                "<input type='submit' value='ログインする'>"
+                "</form>")))
+            return
+
+        if path == "/xapanel/xmgame/loginauth/index":
+            self._send(200, _page("新しい環境からのログイン", (
+                "<form method='post' action='/xapanel/xmgame/loginauth/smssend'>"
+                "<input type='submit' value='認証コードを送信する'>"
+                "</form>")))
+            return
+
+        email = self._require_session()
+        if not email:
+            return
+        server = self._current_server()
+        minutes = self.state.remaining_minutes(email, server)
+
+        if path == "/xapanel/xmgame/index":
+            rows = "".join(
+                f"<tr><td>game-server-{i}</td>"
+                f"<td><a href='/xapanel/xmgame/jumpvps/?id={i}'>ゲーム管理</a></td></tr>"
+                for i in range(1, self.state.servers + 1)
+            )
+            self._send(200, _page("XServer GAME", f"<table>{rows}</table>"))
+        elif path == "/xapanel/xmgame/jumpvps/":
+            # 切换当前服务器后进入游戏管理页面
+            server_id = parse_qs(self.path.partition("?")[2]).get("id", ["1"])[0]
+            self._redirect("/xmgame/game/index", cookies=[f"mock_server={server_id}; Path=/"])
+        elif path == "/xmgame/game/index":
+            self._send(200, _page("ゲーム管理", (
+                f"<div><span class='remaining'>残り{minutes // 60}時間{minutes % 60}分 ({_expiry_date(minutes)}まで)</span></div>"
+                "<a href='/xmgame/game/freeplan/extend/index'>アップグレード・期限延長</a>")))
+        elif path == "/xmgame/game/freeplan/extend/index":
+            if minutes >= 24 * 60:
+                body = f"<p class='restriction'>{RESTRICTION_TEXT}</p>"
+            else:
+                body = "<a href='/xmgame/game/freeplan/extend/input'>期限を延長する</a>"
+            self._send(200, _page("アップグレード・期限延長", body))
+        elif path == "/xmgame/game/freeplan/extend/input":
+            if minutes >= 24 * 60:
+                self._redirect("/xmgame/game/freeplan/extend/index")
+                return
+            self._send(200, _page("期限延長", (
+                "<form method='post' action='/xmgame/game/freeplan/extend/conf'>"
+                "<button type='submit'>確認画面に進む</button></form>")))
+        else:
+            self._send(404, _page("Not Found", "<p>404</p>"))
+
+    def do_POST(self):
+        self.state.stats["requests"] += 1
+        path = self.path.split("?", 1)[0]
+
+        if path.startswith("/api/public/"):
+            self._handle_cloudmail(path)
+            return
+
+        if path == "/xapanel/login/xmgame":
+            form = self._form()
+            email = form.get("memberid", "")
+            if not email or not form.get("user_password"):
+                self._redirect("/xapanel/login/xmgame")
+                return
+            self.state.stats["logins"] += 1
+            cookie_email = quote(email)
+            trusted = self._cookies().get("mock_device") == cookie_email
+            if self.state.require_2fa and not trusted:
+                self._redirect("/xapanel/xmgame/loginauth/index",
+                               cookies=[f"mock_pending={cookie_email}; Path=/"])
+                return
+            self._redirect("/xapanel/xmgame/index", cookies=[f"mock_session={cookie_email}; Path=/"])
+            return
+
+        if path == "/xapanel/xmgame/loginauth/smssend":
+            email = unquote(self._cookies().get("mock_pending", ""))
+            self.state.send_code(email)
+            self._send(200, _page("認証コード入力", (
+                "<form method='post' action='/xapanel/xmgame/loginauth/auth'>"
+                "<input type='text' id='auth_code' name='auth_code'>"
+                "<input type='submit' value='ログイン'>"
+                "</form>")))
+            return
+
+        if path == "/xapanel/xmgame/loginauth/auth":
+            email = unquote(self._cookies().get("mock_pending", ""))
+            code = self._form().get("auth_code")
+            if not email or code != self.state.codes.get(email):
+                self._redirect("/xapanel/xmgame/loginauth/index")
+                return
+            cookie_email = quote(email)
+            self._redirect("/xapanel/xmgame/index", cookies=[
+                f"mock_session={cookie_email}; Path=/",
+                f"mock_device={cookie_email}; Path=/; Max-Age=31536000",
+            ])
+            return
+
+        email = self._require_session()
+        if not email:
+            return
+        server = self._current_server()
+        minutes = self.state.remaining_minutes(email, server)
+
+        if path == "/xmgame/game/freeplan/extend/conf":
+            self._read_body()
+            self._send(200, _page("確認", (
+                f"<table><tr><th>延長後の期限</th><td>{_expiry_date(minutes + EXTEND_HOURS * 60)}</td></tr></table>"
+                "<form method='post' action='/xmgame/game/freeplan/extend/do'>"
+                "<button type='submit'>期限を延長する</button></form>")))
+        elif path == "/xmgame/game/freeplan/extend/do":
+            self._read_body()
+            self.state.extend(email, server)
+            self._send(200, _page("完了", "<p>期限を延長しました。</p>"))
+        else:
+            self._send(404, _page("Not Found", "<p>404</p>"))
+
+    def _handle_cloudmail(self, path):
+        try:
+            payload = json.loads(self._read_body() or b"{}")
+        except ValueError:
+            payload = {}
+
+        if path == "/api/public/genToken":
+            self._json({"code": 200, "data": {"token": "mock-token"}})
+        elif path == "/api/public/emailList":
+            mails = self.state.list_mails(
+                to_email=payload.get("toEmail"),
+                send_email=payload.get("sendEmail"),
+                subject=payload.get("subject"),
+                num=int(payload.get("num", 1)),
+                size=int(payload.get("size", 20)),
+            )
+            fields = payload.get("fields")
+            if fields:
+                mails = [{k: v for k, v in m.items() if k in fields} for m in mails]
+            self._json({"code": 200, "data": mails})
+        else:
+            self._json({"code": 404, "message": "not found"})
+
+
+# =====================================================================
+#                          启动入口
+# =====================================================================
+
+
+def start_mock_panel(port=0, **options):
+    """在后台线程中启动模拟面板，返回 (server, base_url, state)"""
+    state = MockPanelState(**options)
+    handler = type("BoundMockPanelHandler", (MockPanelHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, base_url, state
+
+
+def mock_cloud_mail_config(base_url, to_email=None):
+    """生成指向模拟面板的 CLOUD_MAIL 配置"""
+    return {
+        "API_BASE_URL": base_url,
+        "EMAIL": "admin@mock.local",
+        "PASSWORD": "mock",
+        "JWT_SECRET": "mock-secret",
+        "SEND_EMAIL": MOCK_SENDER,
+        "TO_EMAIL": to_email,
+        "SUBJECT": MOCK_SUBJECT,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XServer GAME 本地模拟面板")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--remaining-hours", type=float, default=20.0, help="新账号的初始剩余小时数")
+    parser.add_argument("--require-2fa", action="store_true", help="未信任的设备登录时要求邮箱验证码")
+    parser.add_argument("--fixed-remaining", action="store_true", help="续期后不改变剩余时间（可反复续期）")
+    parser.add_argument("--latency-ms", type=int, default=0, help="每个响应的模拟延迟")
+    parser.add_argument("--servers", type=int, default=1, help="每个账号下的游戏服务器数")
+    parser.add_argument("--webhook-url", help="新验证码邮件的推送地址（main.py 的 CODE_WEBHOOK）")
+    parser.add_argument("--webhook-token", help="推送时携带的 X-Webhook-Token")
+    args = parser.parse_args()
+
+    server, base_url, state = start_mock_panel(
+        port=args.port,
+        remaining_hours=args.remaining_hours,
+        require_2fa=args.require_2fa,
+        fixed_remaining=args.fixed_remaining,
+        latency_ms=args.latency_ms,
+        webhook_url=args.webhook_url,
+        webhook_token=args.webhook_token,
+        servers=args.servers,
+    )
+    print(f"🧪 模拟面板已启动: {base_url}")
+    print(f"   CLOUD_MAIL='{json.dumps(mock_cloud_mail_config(base_url), ensure_ascii=False)}'")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"📊 {state.stats}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
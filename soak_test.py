@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XServer GAME 自动续期脚本 - 长时间运行（浸泡）测试
+
+在同一进程内针对 mock_panel.py 的本地模拟面板反复运行完整流程，定期采样
+Python 堆内存（tracemalloc）、打开的文件描述符、Chromium 子进程数和吞吐，
+任何一项随运行次数持续上升（吞吐持续下降）超过阈值即以非零状态退出。
+
+用法:
+    python soak_test.py --iterations 2000 --sample-every 50
+    python soak_test.py --iterations 500 --shared-browser --require-2fa
+"""
+
+# =====================================================================
+#                          导入依赖
+# =====================================================================
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmark import descendant_pids, prepare_environment
+from mock_panel import start_mock_panel
+
+# =====================================================================
+#                          指标采样
+# =====================================================================
+
+# 不计入堆增长的文件：模拟面板的会话/邮箱状态和 tracemalloc 自身
+HEAP_EXCLUDE = ("*mock_panel.py", tracemalloc.__file__)
+
+
+def heap_kb():
+    """当前被追踪的 Python 堆内存（KB，排除模拟面板自身的状态）"""
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, pattern) for pattern in HEAP_EXCLUDE]
+    )
+    return sum(stat.size for stat in snapshot.statistics("filename")) / 1024, snapshot
+
+
+def open_fds():
+    """当前进程打开的文件描述符数（依赖 Linux 的 /proc）"""
+    return len(os.listdir("/proc/self/fd"))
+
+
+def chromium_children():
+    """当前进程下仍存活的 Chromium 进程数（不含 Playwright 驱动）"""
+    count = 0
+    for pid in descendant_pids(os.getpid())[1:]:
+        try:
+            with open(f"/proc/{pid}/comm", "r") as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if "chrom" in name or "headless_shell" in name:
+            count += 1
+    return count
+
+
+def trend(samples, key):
+    """按最小二乘拟合指标随运行次数的变化，返回整个采样区间内的拟合增量"""
+    if len(samples) < 3:
+        return 0.0
+    xs = [sample["iteration"] for sample in samples]
+    ys = [sample[key] for sample in samples]
+    if len(set(ys)) == 1:
+        return 0.0
+    slope, _ = statistics.linear_regression(xs, ys)
+    return slope * (xs[-1] - xs[0])
+
+
+# =====================================================================
+#                          浸泡运行
+# =====================================================================
+
+
+async def soak(main, args):
+    """反复运行完整流程并定期采样，返回 (采样列表, 失败次数)"""
+    from playwright.async_api import async_playwright
+
+    samples = []
+    failures = 0
+    playwright = browser = None
+    if args.shared_browser:
+        # 模拟多账号/常驻模式：浏览器只启动一次，每次运行只创建上下文
+        playwright = await async_playwright().start()
+        browser = await playwright.chromium.launch(**main.launch_options())
+
+    try:
+        window_start = time.monotonic()
+        for iteration in range(1, args.iterations + 1):
+            auto_login = main.XServerAutoLogin(shared_browser=browser, write_report=False)
+            try:
+                ok = await auto_login.run()
+            except Exception as e:
+                print(f"❌ 第 {iteration} 次运行出错: {e}")
+                ok = False
+            failures += 0 if ok else 1
+            del auto_login
+
+            if iteration % args.sample_every == 0:
+                elapsed = time.monotonic() - window_start
+                gc.collect()
+                heap, _ = heap_kb()
+                sample = {
+                    "iteration": iteration,
+                    "heap_kb": round(heap, 1),
+                    "fds": open_fds(),
+                    "chromium": chromium_children(),
+                    "throughput_per_min": round(args.sample_every / elapsed * 60, 2),
+                    "failures": failures,
+                }
+                samples.append(sample)
+                print(f"🧪 #{iteration}: 堆 {sample['heap_kb']:.0f}KB | 文件描述符 {sample['fds']} | "
+                      f"Chromium 进程 {sample['chromium']} | 吞吐 {sample['throughput_per_min']}/分钟 | 失败 {failures}")
+                window_start = time.monotonic()
+    finally:
+        if browser:
+            await browser.close()
+        if playwright:
+            await playwright.stop()
+    return samples, failures
+
+
+def evaluate(samples, failures, args):
+    """检查各指标的趋势，返回超出阈值的问题列表"""
+    measured = samples[args.warmup_samples:]
+    checks = [
+        ("heap_kb", "Python 堆内存", "KB", args.max_heap_growth_kb),
+        ("fds", "文件描述符", "个", args.max_fd_growth),
+        ("chromium", "Chromium 进程", "个", args.max_chromium_growth),
+    ]
+    problems = []
+    print()
+    print(f"📊 浸泡测试趋势（{len(measured)} 个采样点，已跳过前 {args.warmup_samples} 个预热采样）:")
+    for key, label, unit, limit in checks:
+        growth = trend(measured, key)
+        verdict = "✅" if growth <= limit else "❌"
+        print(f"   {verdict} {label}: 拟合增长 {growth:+.1f}{unit}（上限 {limit}{unit}）")
+        if growth > limit:
+            problems.append(f"{label}持续增长 {growth:+.1f}{unit}")
+
+    if measured:
+        baseline = measured[0]["throughput_per_min"]
+        drop = -trend(measured, "throughput_per_min") / baseline if baseline else 0.0
+        verdict = "✅" if drop <= args.max_throughput_drop else "❌"
+        print(f"   {verdict} 吞吐: 拟合下降 {drop:.1%}（上限 {args.max_throughput_drop:.0%}）")
+        if drop > args.max_throughput_drop:
+            problems.append(f"吞吐持续下降 {drop:.1%}")
+
+    failure_rate = failures / args.iterations if args.iterations else 0.0
+    verdict = "✅" if failure_rate <= args.max_failure_rate else "❌"
+    print(f"   {verdict} 失败率: {failure_rate:.2%}（上限 {args.max_failure_rate:.0%}）")
+    if failure_rate > args.max_failure_rate:
+        problems.append(f"失败率 {failure_rate:.2%}")
+    return problems
+
+
+def print_heap_growth(baseline, limit=10):
+    """输出相对起始快照增长最多的代码位置，便于定位泄漏"""
+    _, snapshot = heap_kb()
+    print(f"🔍 堆内存增长最多的 {limit} 处:")
+    for stat in snapshot.compare_to(baseline, "lineno")[:limit]:
+        print(f"   {stat}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XServer GAME 自动续期脚本浸泡测试")
+    parser.add_argument("--iterations", type=int, default=1000, help="完整流程的运行次数")
+    parser.add_argument("--sample-every", type=int, default=50, help="每运行多少次采样一次")
+    parser.add_argument("--warmup-samples", type=int, default=2, help="不参与趋势判断的预热采样数")
+    parser.add_argument("--shared-browser", action="store_true", help="所有运行共用一个浏览器（多账号/常驻模式）")
+    parser.add_argument("--delay-scale", type=float, default=0.0, help="固定等待的缩放系数")
+    parser.add_argument("--latency-ms", type=int, default=0, help="模拟面板的响应延迟")
+    parser.add_argument("--remaining-hours", type=float, default=20.0)
+    parser.add_argument("--require-2fa", action="store_true")
+    parser.add_argument("--max-heap-growth-kb", type=float, default=2048)
+    parser.add_argument("--max-fd-growth", type=float, default=5)
+    parser.add_argument("--max-chromium-growth", type=float, default=1)
+    parser.add_argument("--max-throughput-drop", type=float, default=0.2, help="允许的吞吐下降比例")
+    parser.add_argument("--max-failure-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="将采样结果写入JSON文件")
+    args = parser.parse_args()
+
+    server, base_url, state = start_mock_panel(
+        remaining_hours=args.remaining_hours,
+        require_2fa=args.require_2fa,
+        fixed_remaining=True,
+        latency_ms=args.latency_ms,
+    )
+    output = os.path.abspath(args.output) if args.output else None
+    prepare_environment(base_url, args.delay_scale)
+    os.environ.update({
+        "RATE_LIMIT_LOGIN": "0",
+        "RATE_LIMIT_2FA_SEND": "0",
+        "RATE_LIMIT_CLOUDMAIL": "0",
+        "ENABLE_SCREENSHOTS": "false",
+    })
+
+    import main as main_module
+
+    tracemalloc.start()
+    _, baseline = heap_kb()
+    start = time.monotonic()
+    samples, failures = asyncio.run(soak(main_module, args))
+    print(f"⏱️ 共运行 {args.iterations} 次，耗时 {time.monotonic() - start:.1f}秒")
+
+    problems = evaluate(samples, failures, args)
+    if problems:
+        print_heap_growth(baseline)
+    tracemalloc.stop()
+    server.shutdown()
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"samples": samples, "failures": failures, "problems": problems}, f,
+                      ensure_ascii=False, indent=2)
+
+    if problems:
+        print(f"❌ 浸泡测试未通过: {'；'.join(problems)}")
+        sys.exit(1)
+    print("✅ 浸泡测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XServer GAME 自动续期脚本 - 任务依赖图
+
+按依赖关系并发执行一次运行中的各个步骤，并统计决定总耗时的关键路径。
+"""
+
+# =====================================================================
+#                          导入依赖
+# =====================================================================
+
+import asyncio
+import time
+
+# =====================================================================
+#                         任务依赖图
+# =====================================================================
+
+class TaskGraph:
+    """按依赖关系并发执行异步任务，并统计决定总耗时的关键路径
+
+    节点返回真值表示成功；依赖未全部成功的节点会被跳过，
+    除非声明 always=True（如清理和报告节点）。
+    """
+
+    def __init__(self, on_error=None, on_start=None):
+        self.on_error = on_error  # 节点抛出异常时的回调 on_error(name, error)
+        self.on_start = on_start  # 节点开始执行时的回调 on_start(name)
+        self.nodes = {}    # name -> (func, deps, always)
+        self.waits = {}    # name -> 运行中通过 wait() 等待的节点（不阻塞启动，但计入关键路径）
+        self.timings = {}  # name -> (开始时间, 结束时间)
+        self.results = {}  # name -> 返回值（跳过的节点为 None）
+        self.tasks = {}
+        self.started_at = None
+
+    def add(self, name, func, deps=(), always=False):
+        """添加节点；func 为协程函数或普通函数（普通函数在线程中执行）"""
+        for dep in deps:
+            if dep not in self.nodes:
+                raise ValueError(f"节点 {name} 的依赖 {dep} 尚未添加")
+        self.nodes[name] = (func, tuple(deps), always)
+
+    async def wait(self, name):
+        """等待某个节点完成并返回其结果（供运行中的节点获取并发任务的产出）
+
+        调用方节点到被等待节点的边会被记录下来，与 deps 一样计入关键路径；
+        未调用 wait() 的运行不会产生这条边（如会话复用时登录不等待邮箱预取）。
+        """
+        current = asyncio.current_task()
+        for waiter, task in self.tasks.items():
+            if task is current and waiter != name:
+                self.waits.setdefault(waiter, set()).add(name)
+        return await asyncio.shield(self.tasks[name])
+
+    def _predecessors(self, name):
+        """节点实际运行过的前驱：跳过的依赖继续向上追溯到它们的前驱"""
+        found, stack, seen = set(), [*self.nodes[name][1], *self.waits.get(name, ())], set()
+        while stack:
+            dep = stack.pop()
+            if dep in seen:
+                continue
+            seen.add(dep)
+            if dep in self.timings:
+                found.add(dep)
+            else:
+                stack.extend((*self.nodes[dep][1], *self.waits.get(dep, ())))
+        return found
+
+    async def _run_node(self, name):
+        func, deps, always = self.nodes[name]
+        dep_results = await asyncio.gather(*(self.tasks[dep] for dep in deps))
+        if not always and not all(dep_results):
+            self.results[name] = None
+            return None
+
+        start = time.monotonic()
+        if self.on_start:
+            self.on_start(name)
+        try:
+            if asyncio.iscoroutinefunction(func):
+                result = await func()
+            else:
+                result = await asyncio.to_thread(func)
+        except Exception as e:
+            print(f"❌ 任务 {name} 出错: {e}")
+            if self.on_error:
+                self.on_error(name, e)
+            result = False
+        self.timings[name] = (start - self.started_at, time.monotonic() - self.started_at)
+        self.results[name] = result
+        return result
+
+    async def run(self):
+        """并发执行所有节点，返回各节点结果"""
+        self.started_at = time.monotonic()
+        for name in self.nodes:
+            self.tasks[name] = asyncio.ensure_future(self._run_node(name))
+        await asyncio.gather(*self.tasks.values())
+        return self.results
+
+    def critical_path(self):
+        """从最后结束的节点沿"最晚完成的依赖"回溯，得到关键路径"""
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = [name]
+        while True:
+            deps = self._predecessors(name)
+            if not deps:
+                break
+            name = max(deps, key=lambda n: self.timings[n][1])
+            path.append(name)
+        return list(reversed(path))
+
+    def report(self):
+        """输出各任务耗时和关键路径"""
+        if not self.timings:
+            return
+        total = max(end for _, end in self.timings.values())
+        print(f"⏱️ 任务耗时（总计 {total:.1f}秒）:")
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            print(f"   {name}: {start:6.1f}s → {end:6.1f}s（{end - start:.1f}秒）")
+        skipped = [name for name in self.nodes if name not in self.timings]
+        if skipped:
+            print(f"   已跳过: {', '.join(skipped)}")
+        path = self.critical_path()
+        print(f"🧭 关键路径: {' → '.join(f'{n}({self.timings[n][1] - self.timings[n][0]:.1f}s)' for n in path)}")
@@ -0,0 +1,36 @@
+import os
+import time
+
+import main
+
+
+def make_entry(root, name, size, age_minutes):
+    path = root / name
+    path.mkdir()
+    (path / "shot.png").write_bytes(b"x" * size)
+    mtime = time.time() - age_minutes * 60
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_prune_keeps_entries_of_runs_still_in_progress(tmp_path):
+    old = make_entry(tmp_path, "old", 600_000, age_minutes=120)
+    sibling = make_entry(tmp_path, "sibling", 600_000, age_minutes=1)
+    store = main.ArtifactStore(str(tmp_path), label="self")
+
+    removed = store.prune(max_mb=0.5, max_age_days=7, active_minutes=30)
+    assert removed == 1
+    assert not old.exists() and sibling.exists()
+
+
+def test_prune_removes_expired_entries(tmp_path):
+    expired = make_entry(tmp_path, "expired", 10, age_minutes=8 * 24 * 60)
+    recent = make_entry(tmp_path, "recent", 10, age_minutes=60)
+    assert main.ArtifactStore(str(tmp_path)).prune(max_mb=100, max_age_days=7, active_minutes=30) == 1
+    assert not expired.exists() and recent.exists()
+
+
+def test_finalize_without_prune_leaves_siblings(tmp_path):
+    old = make_entry(tmp_path, "old", 600_000, age_minutes=120)
+    main.ArtifactStore(str(tmp_path)).finalize(prune=False)
+    assert old.exists()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+import main
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type="script", method="GET"):
+        self.url = url
+        self.resource_type = resource_type
+        self.method = method
+        self.headers = {"accept": "*/*"}
+
+
+class FakeResponse:
+    def __init__(self, status, headers, body=b""):
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    async def body(self):
+        return self._body
+
+
+class FakeRoute:
+    def __init__(self, response=None):
+        self.response = response
+        self.fetched_headers = None
+        self.fulfilled = None
+        self.continued = False
+
+    async def fetch(self, headers=None):
+        self.fetched_headers = headers
+        return self.response
+
+    async def fulfill(self, status=None, headers=None, body=None, response=None):
+        self.fulfilled = {"status": status or response.status, "body": body}
+
+    async def continue_(self):
+        self.continued = True
+
+
+def handle(cache, route, request):
+    asyncio.run(cache.handle(route, request))
+    return route
+
+
+def test_max_age_parsing():
+    assert main.AssetCache.max_age({"cache-control": "public, max-age=600"}) == 600
+    assert main.AssetCache.max_age({"cache-control": "no-store"}) is None
+    assert main.AssetCache.max_age({"cache-control": "private, max-age=60"}) is None
+    assert main.AssetCache.max_age({}) == main.ASSET_CACHE_DEFAULT_TTL
+
+
+def test_miss_then_fresh_hit_without_network(tmp_path):
+    cache = main.AssetCache(str(tmp_path))
+    url = "https://example.com/app.js"
+    response = FakeResponse(200, {"cache-control": "max-age=600", "etag": '"v1"', "content-length": "3"}, b"js!")
+    handle(cache, FakeRoute(response), FakeRequest(url))
+
+    route = handle(cache, FakeRoute(), FakeRequest(url))
+    assert route.fetched_headers is None
+    assert route.fulfilled == {"status": 200, "body": b"js!"}
+    assert cache.stats["miss"] == 1 and cache.stats["hit"] == 1
+    assert "content-length" not in cache.index[cache.cache_key(url)]["headers"]
+
+
+def test_stale_entry_is_revalidated_with_etag(tmp_path):
+    cache = main.AssetCache(str(tmp_path))
+    url = "https://example.com/app.css"
+    handle(cache, FakeRoute(FakeResponse(200, {"cache-control": "max-age=0", "etag": '"v1"'}, b"css")),
+           FakeRequest(url, "stylesheet"))
+
+    route = handle(cache, FakeRoute(FakeResponse(304, {"cache-control": "max-age=600"})), FakeRequest(url, "stylesheet"))
+    assert route.fetched_headers["if-none-match"] == '"v1"'
+    assert route.fulfilled == {"status": 200, "body": b"css"}
+    assert cache.stats["revalidated"] == 1
+
+
+def test_non_static_requests_pass_through(tmp_path):
+    cache = main.AssetCache(str(tmp_path))
+    assert handle(cache, FakeRoute(), FakeRequest("https://example.com/", "document")).continued
+    assert handle(cache, FakeRoute(), FakeRequest("https://example.com/a.js", method="POST")).continued
+    assert cache.index == {}
+
+
+def test_save_merges_processes_and_evicts_least_recently_used(tmp_path):
+    first = main.AssetCache(str(tmp_path), max_mb=2.5 / 1024)  # 上限 2.5KB
+    second = main.AssetCache(str(tmp_path), max_mb=2.5 / 1024)
+    for cache, name, last_used in ((first, "old", 1), (first, "mid", 2), (second, "new", 3)):
+        cache._store(name, f"https://example.com/{name}", {}, b"x" * 1024, 600)
+        cache.index[name]["last_used"] = last_used
+    first.save()
+    second.save()
+
+    assert sorted(second.index) == ["mid", "new"]
+    assert not os.path.exists(second._body_path("old"))
+    assert sorted(main.AssetCache(str(tmp_path)).index) == ["mid", "new"]
@@ -0,0 +1,74 @@
+import asyncio
+
+import main
+
+SUBJECT = "【XServer】新環境からのログイン"
+
+
+def make_login(mails):
+    login = main.XServerAutoLogin(email="user@example.com", password="x", cloud_mail_config={
+        "API_BASE_URL": "http://cloudmail.invalid", "TO_EMAIL": "user@example.com", "SUBJECT": SUBJECT,
+    })
+    login.cloudmail_token = "token"
+    calls = []
+
+    def get_mail_list(token, target_email, sender_email=None, subject=None, page=1):
+        calls.append(subject)
+        found = [m for m in mails if subject is None or m["subject"] == subject]
+        return {"code": 200, "data": found}
+
+    login._get_mail_list = get_mail_list
+    return login, calls
+
+
+def poll(login):
+    try:
+        return asyncio.run(login._fetch_verification_code_once())
+    except main.StepError as e:
+        return e.category
+
+
+def test_unfiltered_check_runs_once_per_run(monkeypatch):
+    monkeypatch.setattr(main, "CLOUDMAIL_UNFILTERED_CHECK_AFTER", 0)
+    login, calls = make_login([])
+    login.code_sent_at = main.time.time()
+    for _ in range(4):
+        assert poll(login) == "mail_pending"
+    assert calls == [SUBJECT, None, SUBJECT, SUBJECT, SUBJECT]
+
+
+def test_unfiltered_check_waits_for_mail_delivery(monkeypatch):
+    monkeypatch.setattr(main, "CLOUDMAIL_UNFILTERED_CHECK_AFTER", 60)
+    login, calls = make_login([])
+    login.code_sent_at = main.time.time()
+    assert poll(login) == "mail_pending"
+    assert calls == [SUBJECT]
+    assert not login.unfiltered_checked
+
+
+def test_scan_reaches_new_mail_when_server_time_is_not_utc():
+    # createTime 为UTC-5时间，按UTC解析会让新邮件看起来早于发送时刻
+    sent_at = main.time.time()
+    created = main.datetime.datetime.fromtimestamp(sent_at + 10, main.timezone(main.timedelta(hours=-5)))
+    created = created.strftime("%Y-%m-%d %H:%M:%S")
+    mails = [
+        {"emailId": 2, "subject": "広告", "createTime": created},
+        {"emailId": 3, "subject": SUBJECT, "createTime": created, "text": "認証コード: 123456"},
+        {"emailId": 1, "subject": SUBJECT, "createTime": "2020-01-01 00:00:00"},
+    ]
+    login, _ = make_login(mails)
+    login.code_sent_at = sent_at
+    login.mail_baseline_ids = {1}
+    assert asyncio.run(login.find_code_mail("token", api_filter=False))["emailId"] == 3
+
+
+def test_scan_stops_at_baseline_mail():
+    mails = [{"emailId": 1, "subject": SUBJECT}, {"emailId": 0, "subject": SUBJECT}]
+    login, _ = make_login(mails)
+    login.code_sent_at = main.time.time()
+    login.mail_baseline_ids = {1}
+
+    async def collect():
+        return [mail async for mail in login.iter_mails("token")]
+
+    assert asyncio.run(collect()) == []
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+import main
+from http_server import CodeWebhook
+
+SUBJECT = "【XServer】新環境からのログイン"
+TO_EMAIL = "user@example.com"
+
+
+class FakeServer:
+    def route(self, method, path, handler):
+        self.handler = handler
+
+
+def make_login(**extra):
+    config = {"TO_EMAIL": TO_EMAIL, "SUBJECT": SUBJECT, **extra}
+    return main.XServerAutoLogin(email="user@example.com", password="x", cloud_mail_config=config)
+
+
+def push(webhook, payload, token="secret"):
+    request = {"headers": {"x-webhook-token": token}, "query": {}, "body": json.dumps(payload).encode()}
+    return webhook.receive(request)
+
+
+def test_pushed_code_requires_recipient_subject_and_new_id():
+    login = make_login()
+    login.mail_baseline_ids = {"old"}
+    mail = {"toEmail": TO_EMAIL, "subject": SUBJECT, "code": "12345", "emailId": "new"}
+    assert login._code_from_pushed_mail(mail) == "12345"
+    assert login._code_from_pushed_mail({**mail, "toEmail": "other@example.com"}) is None
+    assert login._code_from_pushed_mail({**mail, "toEmail": None}) is None
+    assert login._code_from_pushed_mail({**mail, "subject": "広告"}) is None
+    assert login._code_from_pushed_mail({**mail, "emailId": "old"}) is None
+
+
+def test_webhook_delivers_only_matching_mail():
+    login = make_login()
+
+    async def scenario():
+        webhook = CodeWebhook(FakeServer(), token="secret")
+        future = webhook.expect(TO_EMAIL, login._code_from_pushed_mail)
+        assert (await push(webhook, {"toEmail": TO_EMAIL, "code": "99999"}))[1]["delivered"] == 0
+        assert (await push(webhook, {"toEmail": TO_EMAIL, "subject": SUBJECT, "code": "1"}, token="bad"))[0] == 401
+        status, body = await push(webhook, {"toEmail": TO_EMAIL, "subject": SUBJECT, "code": "24680"})
+        assert status == 202 and body["delivered"] == 1
+        return await future
+
+    assert asyncio.run(scenario()) == "24680"
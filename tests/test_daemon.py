@@ -0,0 +1,41 @@
+import time
+
+import main
+
+
+def config(interval_hours, accounts=("a@example.com",)):
+    return {"interval_hours": interval_hours, "retry_minutes": 30,
+            "accounts": [{"email": email, "password": "x"} for email in accounts]}
+
+
+def finish_run(daemon, email, ok, ago):
+    slot = daemon.slots[email]
+    slot["last_run"], slot["last_ok"] = time.time() - ago, ok
+    slot["next_run"] = slot["last_run"] + (daemon.interval if ok else daemon.retry_delay)
+
+
+def test_lowering_interval_reschedules_idle_slots(tmp_path):
+    daemon = main.RenewalDaemon(str(tmp_path / "daemon.json"))
+    daemon.apply(config(24))
+    finish_run(daemon, "a@example.com", ok=True, ago=2 * 3600)
+
+    changes = daemon.apply(config(1))
+    assert changes["rescheduled"] == 1
+    assert daemon.slots["a@example.com"]["next_run"] <= time.time()
+
+
+def test_raising_interval_does_not_delay_scheduled_runs(tmp_path):
+    daemon = main.RenewalDaemon(str(tmp_path / "daemon.json"))
+    daemon.apply(config(1))
+    finish_run(daemon, "a@example.com", ok=True, ago=0)
+    next_run = daemon.slots["a@example.com"]["next_run"]
+
+    assert daemon.apply(config(24))["rescheduled"] == 0
+    assert daemon.slots["a@example.com"]["next_run"] == next_run
+
+
+def test_unchanged_interval_keeps_schedule(tmp_path):
+    daemon = main.RenewalDaemon(str(tmp_path / "daemon.json"))
+    daemon.apply(config(6))
+    finish_run(daemon, "a@example.com", ok=False, ago=0)
+    assert daemon.apply(config(6, accounts=("a@example.com", "b@example.com")))["rescheduled"] == 0
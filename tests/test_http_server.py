@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import http_server
+from http_server import MiniHttpServer
+
+
+async def echo(request):
+    return 200, {"path": request["path"], "query": request["query"], "body": request["body"].decode()}
+
+
+async def send(server, raw):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(raw)
+    writer.write_eof()
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+def exchange(raw, handler=echo):
+    async def scenario():
+        server = MiniHttpServer("127.0.0.1", 0)
+        server.route("POST", "/hook", handler)
+        await server.start()
+        try:
+            return await send(server, raw)
+        finally:
+            await server.stop()
+    return asyncio.run(scenario())
+
+
+def test_routes_request_with_query_and_body():
+    status, body = exchange(b"POST /hook?token=abc&x=1&x=2 HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello")
+    assert status == 200
+    assert json.loads(body) == {"path": "/hook", "query": {"token": "abc", "x": "2"}, "body": "hello"}
+
+
+def test_unknown_path_and_wrong_method():
+    assert exchange(b"GET /missing HTTP/1.1\r\n\r\n")[0] == 404
+    assert exchange(b"GET /hook HTTP/1.1\r\n\r\n")[0] == 405
+
+
+def test_malformed_requests_get_400():
+    assert exchange(b"NONSENSE\r\n\r\n")[0] == 400
+    assert exchange(b"POST /hook HTTP/1.1\r\nContent-Length: abc\r\n\r\n")[0] == 400
+    # 请求体比 Content-Length 短（客户端已关闭写入端）
+    assert exchange(b"POST /hook HTTP/1.1\r\nContent-Length: 10\r\n\r\nshort")[0] == 400
+
+
+def test_oversized_body_gets_413():
+    raw = f"POST /hook HTTP/1.1\r\nContent-Length: {http_server.HTTP_MAX_BODY + 1}\r\n\r\n".encode()
+    assert exchange(raw)[0] == 413
+
+
+def test_handler_errors_become_500():
+    async def broken(request):
+        raise RuntimeError("broken")
+
+    status, body = exchange(b"POST /hook HTTP/1.1\r\n\r\n", handler=broken)
+    assert status == 500 and json.loads(body) == {"error": "broken"}
@@ -0,0 +1,49 @@
+import asyncio
+
+import main
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_reservations_queue_up(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(main.time, "time", clock)
+    limiter = main.RateLimiter(buckets={"login": (6, 2)})  # 每10秒一个令牌，突发2个
+
+    assert [limiter._reserve("login") for _ in range(4)] == [0, 0, 10, 20]
+    clock.now += 30
+    # 30秒补充3个令牌，抵消两次预约后还剩1个
+    assert limiter._reserve("login") == 0
+    assert limiter._reserve("login") == 10
+
+
+def test_tokens_never_exceed_capacity(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(main.time, "time", clock)
+    limiter = main.RateLimiter(buckets={"mail": (60, 3)})
+    limiter._reserve("mail")
+    clock.now += 3600
+    assert [limiter._reserve("mail") for _ in range(4)] == [0, 0, 0, 1]
+
+
+def test_limiters_sharing_state_share_the_bucket(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(main.time, "time", clock)
+    state = {}
+    first = main.RateLimiter(state=state, buckets={"login": (6, 1)})
+    second = main.RateLimiter(state=state, buckets={"login": (6, 1)})
+    assert first._reserve("login") == 0
+    assert second._reserve("login") == 10
+
+
+def test_disabled_bucket_does_not_wait():
+    limiter = main.RateLimiter(buckets={"login": (0, 1)})
+    asyncio.run(asyncio.wait_for(limiter.acquire("login"), 1))
+    asyncio.run(asyncio.wait_for(limiter.acquire("unknown"), 1))
+    assert limiter.state == {}
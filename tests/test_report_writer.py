@@ -0,0 +1,52 @@
+import json
+import os
+
+import main
+
+
+def result(status="Unexpired", run_time="2026-01-01 08:00:00", **extra):
+    return {"run_time": run_time, "server": "game-1", "status": status,
+            "old_expiry": "2026-01-03", "new_expiry": None, "failure": None, **extra}
+
+
+def make_writer(tmp_path, history_limit=30):
+    return main.ReportWriter(str(tmp_path), formats="markdown,json,badge", history_limit=history_limit)
+
+
+def test_first_run_writes_every_format(tmp_path):
+    written = make_writer(tmp_path).write(result())
+    assert sorted(os.path.basename(path) for path in written) == sorted(main.REPORT_FILES.values())
+    badge = json.loads((tmp_path / main.REPORT_FILES["badge"]).read_text(encoding="utf-8"))
+    assert badge["message"] == "Unexpired · 2026-01-03"
+    assert "🖥️服务器：`game-1`" in (tmp_path / main.REPORT_FILES["markdown"]).read_text(encoding="utf-8")
+
+
+def test_unchanged_result_skips_files_but_records_history(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.write(result())
+    assert writer.write(result(run_time="2026-01-02 08:00:00")) == []
+    assert len(writer.load_history()) == 2
+
+
+def test_changed_result_rewrites_files(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.write(result())
+    written = writer.write(result(status="Success", new_expiry="2026-01-05"))
+    assert len(written) == len(main.REPORT_FILES)
+    status = json.loads((tmp_path / main.REPORT_FILES["json"]).read_text(encoding="utf-8"))
+    assert status["status"] == "Success"
+
+
+def test_missing_file_is_restored_even_when_unchanged(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.write(result())
+    (tmp_path / main.REPORT_FILES["badge"]).unlink()
+    assert [os.path.basename(p) for p in writer.write(result())] == [main.REPORT_FILES["badge"]]
+
+
+def test_history_is_trimmed_to_limit(tmp_path):
+    writer = make_writer(tmp_path, history_limit=3)
+    for day in range(5):
+        writer.write(result(run_time=f"2026-01-0{day + 1} 08:00:00"))
+    history = writer.load_history()
+    assert [entry["run_time"][:10] for entry in history] == ["2026-01-03", "2026-01-04", "2026-01-05"]
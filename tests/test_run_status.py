@@ -0,0 +1,28 @@
+import threading
+
+import main
+
+
+def test_adjust_active_is_atomic():
+    status = main.RunStatus()
+    status.update(pool={"workers": 2, "contexts_per_worker": 4})
+
+    def churn():
+        for _ in range(2000):
+            status.adjust_active(1)
+            status.adjust_active(-1)
+        status.adjust_active(1)
+
+    threads = [threading.Thread(target=churn) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert status.snapshot()["pool"]["active"] == 8
+    assert status.snapshot()["pool"]["utilization"] == 1.0
+
+
+def test_adjust_active_never_goes_negative():
+    status = main.RunStatus()
+    status.adjust_active(-1)
+    assert status.pool["active"] == 0
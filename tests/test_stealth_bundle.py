@@ -0,0 +1,15 @@
+import main
+
+
+def test_each_evasion_is_isolated():
+    scripts = list(main.stealth_config([]).enabled_scripts)
+    _, script = main.stealth_bundle(disabled=())
+    shared, evasions = scripts[:main.STEALTH_SHARED_SCRIPTS], scripts[main.STEALTH_SHARED_SCRIPTS:]
+    # opts/utils 等共享定义留在外层作用域，每项伪装各自包在 try 中
+    assert all(f"try {{\n{s}" not in script and s in script for s in shared)
+    assert all(f"try {{\n{s}\n}} catch (e) {{}}" in script for s in evasions)
+
+
+def test_bundle_is_cached_per_configuration():
+    assert main.stealth_bundle(disabled=("webdriver",)) is main.stealth_bundle(disabled=("webdriver",))
+    assert main.stealth_bundle(disabled=())[0] != main.stealth_bundle(disabled=("webdriver",))[0]
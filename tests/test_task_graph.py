@@ -0,0 +1,97 @@
+import asyncio
+
+from task_graph import TaskGraph
+
+
+def run(graph):
+    return asyncio.run(graph.run())
+
+
+def test_dependencies_run_in_order_and_independent_nodes_overlap():
+    events = []
+
+    def step(name, delay=0.05, result=True):
+        async def func():
+            events.append(f"{name}:start")
+            await asyncio.sleep(delay)
+            events.append(f"{name}:end")
+            return result
+        return func
+
+    graph = TaskGraph()
+    graph.add("a", step("a"))
+    graph.add("b", step("b"))
+    graph.add("c", step("c"), deps=("a", "b"))
+    results = run(graph)
+
+    assert results == {"a": True, "b": True, "c": True}
+    assert events.index("b:start") < events.index("a:end")
+    assert events.index("c:start") > max(events.index("a:end"), events.index("b:end"))
+
+
+def test_failed_dependency_skips_node_unless_always():
+    errors = []
+
+    async def boom():
+        raise RuntimeError("boom")
+
+    async def ok():
+        return True
+
+    graph = TaskGraph(on_error=lambda name, e: errors.append((name, str(e))))
+    graph.add("a", boom)
+    graph.add("b", ok, deps=("a",))
+    graph.add("cleanup", ok, deps=("b",), always=True)
+    results = run(graph)
+
+    assert results == {"a": False, "b": None, "cleanup": True}
+    assert errors == [("a", "boom")]
+    assert "b" not in graph.timings
+
+
+def test_sync_functions_run_in_threads():
+    graph = TaskGraph()
+    graph.add("sync", lambda: "done")
+    assert run(graph) == {"sync": "done"}
+
+
+def test_critical_path_walks_through_skipped_nodes():
+    async def slow():
+        await asyncio.sleep(0.1)
+        return True
+
+    async def fail():
+        return False
+
+    async def ok():
+        return True
+
+    graph = TaskGraph()
+    graph.add("fast", ok)
+    graph.add("slow", slow)
+    graph.add("skipped", fail, deps=("slow",))
+    graph.add("never", ok, deps=("skipped",))
+    graph.add("report", ok, deps=("never", "fast"), always=True)
+    run(graph)
+
+    assert "never" not in graph.timings
+    assert graph.critical_path() == ["slow", "skipped", "report"]
+
+
+def test_wait_records_an_edge_for_the_critical_path():
+    graph = TaskGraph()
+
+    async def prefetch():
+        await asyncio.sleep(0.1)
+        return "token"
+
+    async def login():
+        return await graph.wait("prefetch")
+
+    graph.add("prefetch", prefetch)
+    graph.add("login", login)
+    results = run(graph)
+
+    assert results["login"] == "token"
+    assert graph.waits == {"login": {"prefetch"}}
+    assert graph.critical_path() == ["prefetch", "login"]
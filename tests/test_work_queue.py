@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+from work_queue import WorkQueue, run_with_lease
+
+
+def job(email):
+    return {"email": email, "key": email.split("@")[0], "label": email}
+
+
+def make_queue(tmp_path, lease_seconds=0.2, max_attempts=3):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=lease_seconds, max_attempts=max_attempts)
+    queue.enqueue([job("a@example.com")], "2026-01-01")
+    return queue
+
+
+def test_enqueue_is_idempotent_per_window(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue([job("a@example.com")], "2026-01-01") == 0
+    assert queue.enqueue([job("a@example.com")], "2026-01-02") == 1
+    assert queue.enqueue([job("b@example.com")], "2026-01-01") == 1
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue = make_queue(tmp_path)
+    job = queue.lease("node-a")
+    assert queue.lease("node-b") is None
+
+    time.sleep(0.3)
+    taken = queue.lease("node-b")
+    assert taken["id"] == job["id"] and taken["attempts"] == 2
+    assert not queue.heartbeat(job["id"], "node-a")
+    assert not queue.ack(job["id"], "node-a", True, {})
+    assert queue.ack(job["id"], "node-b", True, {})
+    assert queue.counts()["done"] == 1
+
+
+def test_attempts_exhausted_marks_failed(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=1)
+    job = queue.lease("node-a")
+    assert queue.ack(job["id"], "node-a", False, {})
+    assert queue.lease("node-b") is None
+    assert queue.counts()["failed"] == 1
+
+
+def test_run_cancelled_when_lease_taken_over(tmp_path):
+    queue = make_queue(tmp_path)
+    job = queue.lease("node-a")
+    submitted = []
+
+    async def run(check_lease):
+        # 第一个节点仍在运行时租约过期并被第二个节点接管
+        await asyncio.sleep(0.3)
+        assert queue.lease("node-b") is not None
+        await asyncio.sleep(1)
+        submitted.append("node-a")
+        return True
+
+    ok, held = asyncio.run(run_with_lease(queue, job, "node-a", run, heartbeat_seconds=0.5))
+    assert (ok, held) == (False, False)
+    assert submitted == []
+    assert queue.ack(job["id"], "node-b", True, {})
+
+
+def test_check_lease_blocks_submit_after_takeover(tmp_path):
+    queue = make_queue(tmp_path)
+    job = queue.lease("node-a")
+    submitted = []
+
+    async def run(check_lease):
+        await asyncio.sleep(0.3)
+        queue.lease("node-b")
+        # 心跳尚未触发，但提交前的确认能发现租约已丢失
+        if await check_lease():
+            submitted.append("node-a")
+        return False
+
+    ok, held = asyncio.run(run_with_lease(queue, job, "node-a", run, heartbeat_seconds=60))
+    assert (ok, held) == (False, False)
+    assert submitted == []
+
+
+def test_heartbeat_keeps_lease_while_running(tmp_path):
+    queue = make_queue(tmp_path)
+    job = queue.lease("node-a")
+
+    async def run(check_lease):
+        await asyncio.sleep(0.5)
+        assert queue.lease("node-b") is None
+        return True
+
+    ok, held = asyncio.run(run_with_lease(queue, job, "node-a", run, heartbeat_seconds=0.05))
+    assert (ok, held) == (True, True)
+    assert queue.ack(job["id"], "node-a", ok, {})
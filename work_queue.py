@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XServer GAME 自动续期脚本 - 多节点工作队列
+
+基于SQLite的共享任务队列（租约、心跳续约、可见性超时和幂等键），
+以及在租约保护下执行单个任务的辅助函数。
+"""
+
+# =====================================================================
+#                          导入依赖
+# =====================================================================
+
+import asyncio
+import datetime
+import json
+import os
+import socket
+import sqlite3
+import time
+from datetime import timezone, timedelta
+
+# =====================================================================
+#                          配置区域
+# =====================================================================
+
+QUEUE_DB = os.getenv("QUEUE_DB", "work_queue.db")                         # 共享的SQLite队列文件（多台机器时放在共享存储上）
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", "300"))     # 租约时长（可见性超时），过期未续约的任务可被重新领取
+QUEUE_HEARTBEAT_SECONDS = float(os.getenv("QUEUE_HEARTBEAT_SECONDS", "0")) or QUEUE_LEASE_SECONDS / 3  # 续约间隔
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))            # 每个任务最多被领取的次数
+QUEUE_WINDOW = os.getenv("QUEUE_WINDOW")  # 续期窗口标识（幂等键的一部分），默认为当天日期（北京时间）
+
+
+# =====================================================================
+#                          任务队列
+# =====================================================================
+
+def renewal_window_id():
+    """当前续期窗口的标识：同一账号在同一窗口内只入队一次"""
+    return QUEUE_WINDOW or datetime.datetime.now(timezone(timedelta(hours=8))).strftime("%Y-%m-%d")
+
+
+def queue_owner():
+    """节点标识（主机名-进程号），写入租约以便续约和确认时校验"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """基于SQLite的共享任务队列：租约、心跳续约、可见性超时和幂等键
+
+    每个账号在每个续期窗口只入队一次（幂等键 = 账号哈希:窗口，INSERT OR IGNORE）。
+    领取在 BEGIN IMMEDIATE 事务内完成，多个节点不会领到同一任务；运行期间定期
+    续约，节点崩溃后租约过期，任务会被其他节点重新领取，领取次数达到上限后
+    标记为失败。队列中只保存邮箱等标识，密码由各节点从自己的 ACCOUNTS 中查找。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            email TEXT NOT NULL,
+            label TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            enqueued_at REAL NOT NULL,
+            finished_at REAL,
+            result TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+    """
+
+    def __init__(self, path=QUEUE_DB, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        db = sqlite3.connect(path, timeout=30)
+        try:
+            db.executescript(self.SCHEMA)
+        finally:
+            db.close()
+
+    def _transaction(self, operation):
+        """在一个写事务内执行 operation(db) 并返回其结果"""
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            result = operation(db)
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def enqueue(self, jobs, window):
+        """将任务写入队列，已在本窗口入队过的账号被忽略，返回新入队的数量
+
+        jobs 为 {"email", "key", "label"} 列表，key 为账号的稳定哈希（幂等键的前半部分）。
+        """
+        def operation(db):
+            added = 0
+            for job in jobs:
+                added += db.execute(
+                    "INSERT OR IGNORE INTO jobs (idempotency_key, email, label, enqueued_at) VALUES (?, ?, ?, ?)",
+                    (f"{job['key']}:{window}", job["email"], job["label"], time.time()),
+                ).rowcount
+            return added
+        return self._transaction(operation)
+
+    def lease(self, owner):
+        """领取一个待处理或租约已过期的任务，没有可领取的任务时返回 None"""
+        def operation(db):
+            now = time.time()
+            # 租约过期且已用完领取次数的任务不再重试
+            db.execute(
+                "UPDATE jobs SET state = 'failed', finished_at = ?, result = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, json.dumps({"error": "lease_expired"}), now, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT * FROM jobs WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                "AND attempts < ? ORDER BY id LIMIT 1",
+                (now, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (owner, now + self.lease_seconds, row["id"]),
+            )
+            return {**dict(row), "attempts": row["attempts"] + 1, "lease_owner": owner}
+        return self._transaction(operation)
+
+    def heartbeat(self, job_id, owner):
+        """续约，返回租约是否仍由 owner 持有"""
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+            (time.time() + self.lease_seconds, job_id, owner),
+        ).rowcount == 1)
+
+    def ack(self, job_id, owner, ok, result):
+        """确认任务结果：成功为 done，失败时未用完领取次数则放回队列，否则为 failed
+
+        租约已不属于 owner（过期后被其他节点领取）时不修改，返回 False。
+        """
+        def operation(db):
+            row = db.execute("SELECT attempts FROM jobs WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                             (job_id, owner)).fetchone()
+            if row is None:
+                return False
+            state = "done" if ok else ("pending" if row["attempts"] < self.max_attempts else "failed")
+            db.execute(
+                "UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires = NULL, finished_at = ?, result = ? "
+                "WHERE id = ?",
+                (state, time.time(), json.dumps(result, ensure_ascii=False, default=str), job_id),
+            )
+            return True
+        return self._transaction(operation)
+
+    def counts(self):
+        """各状态的任务数"""
+        rows = self._transaction(lambda db: db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {"pending": 0, "leased": 0, "done": 0, "failed": 0, **{state: count for state, count in rows}}
+
+    def outstanding(self):
+        """尚未结束（待处理或租出中）的任务数"""
+        counts = self.counts()
+        return counts["pending"] + counts["leased"]
+
+
+async def run_with_lease(work_queue, job, owner, run, heartbeat_seconds=None):
+    """在任务租约保护下执行 run(check_lease)，返回 (运行结果, 租约是否仍由本节点持有)
+
+    运行期间定期续约；续约失败说明租约已过期并被其他节点领取，此时立即取消
+    运行，避免两个节点重复续期同一账号。check_lease 续约一次并返回租约是否
+    仍有效，供运行方在不可重复的操作前确认。租约丢失时调用方不应确认任务。
+    """
+    heartbeat_seconds = heartbeat_seconds or QUEUE_HEARTBEAT_SECONDS
+    lost = asyncio.Event()
+    
+    async def check_lease():
+        if not lost.is_set() and not await asyncio.to_thread(work_queue.heartbeat, job["id"], owner):
+            print(f"⚠️ 任务 {job['label']} 的租约已丢失，停止运行")
+            lost.set()
+        return not lost.is_set()
+    
+    async def keep_lease():
+        while True:
+            await asyncio.sleep(heartbeat_seconds)
+            if not await check_lease():
+                task.cancel()
+                return
+    
+    task = asyncio.ensure_future(run(check_lease))
+    heartbeat = asyncio.ensure_future(keep_lease())
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        # 外部取消（而非租约丢失）继续向上传递
+        if not lost.is_set():
+            raise
+        result = False
+    finally:
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+    return result, not lost.is_set()